@@ -0,0 +1,106 @@
+### IMPORTS ###
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+src_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, src_path)
+
+from matplotlib import cm
+from utils import abstractmapwriter as amw
+from utils import heatmapwritersvg as hmws
+from utils import strandlinkageplotwriter as slpw
+
+
+### PARAMETERS ###
+def_n_events = 10000
+def_colourmap = "plasma"
+
+
+### ARGUMENT PARSING ###
+parser = argparse.ArgumentParser(description="Compares per-event colour calculation with the colourmap lookup tables used by the SVG map writers")
+parser.add_argument("-n", "--n_events", type=int, default=def_n_events, help="Number of events in the synthetic map")
+parser.add_argument("-r", "--repeats", type=int, default=5, help="Number of times to repeat each measurement (the fastest is reported)")
+parser.add_argument("-c", "--colourmap", type=str, default=def_colourmap, help="Matplotlib colourmap to use")
+
+
+def get_cmap_colours(norm_counts, colourmap):
+    # Previous approach; the heatmap writer calls the colourmap for each event fill and inverted label colour, while
+    # the strand linkage plot writer also fetched the colourmap for every event
+    colours = []
+    for norm_count in norm_counts:
+        rgba = cm.get_cmap(colourmap)(norm_count)
+        colours.append("rgb(%i,%i,%i)" % (rgba[0]*255,rgba[1]*255,rgba[2]*255))
+        colours.append("rgb(%i,%i,%i)" % (255-(rgba[0]*255),255-(rgba[1]*255),255-(rgba[2]*255)))
+
+    return colours
+
+def get_lut_colours(norm_counts, colourmap):
+    # Lookup tables are built once per render (this is included in the timing)
+    cmap = cm.get_cmap(colourmap)
+    lut = amw.get_colour_strings(cmap)
+    inverted_lut = amw.get_colour_strings(cmap, invert=True)
+
+    colours = []
+    for norm_count in norm_counts:
+        idx = amw.get_colour_index(norm_count)
+        colours.append(lut[idx])
+        colours.append(inverted_lut[idx])
+
+    return colours
+
+def get_freq(n_events):
+    # Random events within a square region, so the maps aren't dominated by empty cells
+    random.seed(0)
+    dim = int(n_events**0.5)*2
+    freq = {}
+    while len(freq) < n_events:
+        freq[(random.randint(0, dim), random.randint(0, dim), False)] = random.randint(1, 1000)
+
+    return freq
+
+def get_min_time(func, repeats):
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+def main():
+    args = parser.parse_args()
+
+    random.seed(0)
+    norm_counts = [random.random() for i in range(args.n_events)]
+
+    if get_cmap_colours(norm_counts, args.colourmap) != get_lut_colours(norm_counts, args.colourmap):
+        print("FAILED: Lookup table colours differ from colourmap colours")
+        sys.exit(1)
+
+    cmap_time = get_min_time(lambda: get_cmap_colours(norm_counts, args.colourmap), args.repeats)
+    lut_time = get_min_time(lambda: get_lut_colours(norm_counts, args.colourmap), args.repeats)
+
+    print("Colour calculation for %i events (best of %i)" % (args.n_events, args.repeats))
+    print("    Colourmap per event:   %.4fs" % cmap_time)
+    print("    Lookup table:          %.4fs (%.1fx faster)" % (lut_time, cmap_time/lut_time))
+
+    # Rendering complete maps, for context
+    freq = get_freq(args.n_events)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        heatmap_writer = hmws.HeatMapWriterSVG(event_label_opts=(True,10,"invert",1,False), event_colourmap=args.colourmap)
+        heatmap_time = get_min_time(lambda: heatmap_writer.write_map(os.path.join(temp_dir, "heatmap.svg"), freq, None, None, False), args.repeats)
+
+        strandlinkageplot_writer = slpw.StrandLinkagePlotWriter(hist_opts=(False, 0, 100, 2, "darkgray", 0.16, 0.07, 20, 0))
+        strandlinkageplot_time = get_min_time(lambda: strandlinkageplot_writer.write_map(os.path.join(temp_dir, "strandlinkageplot.svg"), freq), args.repeats)
+
+    print("Rendering %i-event maps (best of %i)" % (args.n_events, args.repeats))
+    print("    Heatmap (SVG):             %.4fs" % heatmap_time)
+    print("    Strand linkage plot (SVG): %.4fs" % strandlinkageplot_time)
+
+
+if __name__ == "__main__":
+    main()
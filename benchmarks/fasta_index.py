@@ -0,0 +1,135 @@
+### IMPORTS ###
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+src_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, src_path)
+
+from utils import fileutils as fu
+
+
+### PARAMETERS ###
+def_n_records = 20000
+def_line_width = 60
+
+
+### ARGUMENT PARSING ###
+parser = argparse.ArgumentParser(description="Checks reads fetched by header from an indexed FASTA file match those read from the whole file, and compares the time taken to fetch single reads")
+parser.add_argument("-n", "--n_records", type=int, default=def_n_records, help="Number of records in the synthetic FASTA file")
+parser.add_argument("-w", "--line_width", type=int, default=def_line_width, help="Number of bases per sequence line")
+parser.add_argument("-f", "--n_fetches", type=int, default=1000, help="Number of single reads to fetch")
+
+
+def write_fasta(path, n_records, line_width, line_ending="\n"):
+    # Headers follow the consensus file naming, with a description after the name and varying sequence lengths
+    random.seed(0)
+    with open(path, "w", newline="") as file:
+        for i in range(n_records):
+            seq = "".join(random.choice("ACGTacgt") for j in range(random.randint(1, 400)))
+            file.write(">read%i_1.0_%i_%i_0 sample,%i%s" % (i, i, random.randint(1, 50), i, line_ending))
+            for pos in range(0, len(seq), line_width):
+                file.write(seq[pos:pos+line_width] + line_ending)
+
+def check_fetched(path):
+    # Every record read from the whole file should be fetched unchanged, using either the full header or its name
+    records = list(fu.FileReader(verbose=False).iter_sequences(path))
+    reader = fu.FileReader(verbose=False)
+
+    for (seq, header) in records:
+        if reader.fetch_sequence(path, header) != seq or reader.fetch_sequence(path, header.split()[0]) != seq:
+            print("FAILED: Fetched sequence for \"%s\" differs from the file" % header)
+            return (records, False)
+
+    if reader.fetch_sequence(path, "missing") is not None:
+        print("FAILED: Fetching a missing record didn't return None")
+        return (records, False)
+
+    return (records, True)
+
+def check_index_reused(path):
+    # A current index is loaded rather than rebuilt, while one older than the FASTA file is replaced
+    index_path = path + ".fai"
+    if not os.path.exists(index_path):
+        print("FAILED: Index \"%s\" wasn't written" % index_path)
+        return False
+
+    os.utime(index_path, (os.path.getmtime(path) + 10, os.path.getmtime(path) + 10))
+    with open(index_path, "a") as file:
+        file.write("marker\t0\t0\t0\t0\n")
+
+    if fu.FileReader(verbose=False).get_index(path).get_n_records() != sum(1 for line in open(index_path)):
+        print("FAILED: Existing index wasn't reused")
+        return False
+
+    os.utime(index_path, (os.path.getmtime(path) - 10, os.path.getmtime(path) - 10))
+    fu.FileReader(verbose=False).get_index(path)
+    with open(index_path) as file:
+        if "marker" in file.read():
+            print("FAILED: Index older than the FASTA file wasn't rebuilt")
+            return False
+
+    return True
+
+def main():
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Unix and Windows line endings
+        for (name, line_ending) in (("unix.fa", "\n"), ("windows.fa", "\r\n")):
+            path = os.path.join(temp_dir, name)
+            write_fasta(path, 200, args.line_width, line_ending=line_ending)
+            failed = not check_fetched(path)[1] or failed
+
+        # Records without consistent line lengths can't be indexed, so nothing is fetched
+        path = os.path.join(temp_dir, "ragged.fa")
+        with open(path, "w") as file:
+            file.write(">read0_1.0_0_1_0\nACG\nACGT\n")
+
+        if fu.FileReader(verbose=False).fetch_sequence(path, "read0_1.0_0_1_0") is not None:
+            print("FAILED: Sequence fetched from a file which can't be indexed")
+            failed = True
+
+        # Timing single fetches against reading through the file to the same records
+        path = os.path.join(temp_dir, "large.fa")
+        write_fasta(path, args.n_records, args.line_width)
+
+        start = time.perf_counter()
+        reader = fu.FileReader(verbose=False)
+        reader.get_index(path)
+        build_time = time.perf_counter() - start
+
+        (records, passed) = check_fetched(path)
+        failed = not passed or failed
+        failed = not check_index_reused(path) or failed
+
+        random.seed(1)
+        headers = [random.choice(records)[1] for i in range(args.n_fetches)]
+
+        reader = fu.FileReader(verbose=False)
+        reader.get_index(path)
+        start = time.perf_counter()
+        for header in headers:
+            reader.fetch_sequence(path, header)
+        fetch_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for header in headers[:min(20, len(headers))]:
+            next(seq for (seq, record_header) in fu.FileReader(verbose=False).iter_sequences(path) if record_header == header)
+        scan_time = (time.perf_counter() - start)/min(20, len(headers))
+
+    print("Indexed FASTA file with %i records" % args.n_records)
+    print("    Building index:        %.4fs" % build_time)
+    print("    Fetch by header:       %.6fs per read" % (fetch_time/args.n_fetches))
+    print("    Scan to header:        %.6fs per read" % scan_time)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+### IMPORTS ###
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+src_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, src_path)
+
+import numpy as np
+
+from matplotlib import cm
+from PIL import Image
+from utils import abstractmapwriter as amw
+from utils import heatmapwriterpng as hmwp
+
+
+### PARAMETERS ###
+def_n_events = 10000
+def_im_dim = 800
+
+
+### ARGUMENT PARSING ###
+parser = argparse.ArgumentParser(description="Checks PNG heatmaps fit within the image dimension at any reference length and measures the time taken to render them")
+parser.add_argument("-n", "--n_events", type=int, default=def_n_events, help="Number of events in each synthetic map")
+parser.add_argument("-d", "--im_dim", type=int, default=def_im_dim, help="Image dimension passed to the writer")
+parser.add_argument("-l", "--lengths", type=int, nargs="+", default=[100, 799, 800, 2726, 50000], help="Reference lengths (number of positions along each side of the map)")
+parser.add_argument("-mt", "--max_time", type=float, default=1.0, help="Fail if rendering any map takes longer than this (in seconds)")
+
+
+def get_freq(n_events, length):
+    # Events spread over the whole reference, each with the same count, so every one should remain visible
+    random.seed(0)
+    freq = {}
+    while len(freq) < min(n_events, length*length):
+        freq[(random.randrange(length), random.randrange(length), False)] = 1
+
+    return freq
+
+def get_visible_fraction(im, freq, length, im_dim, sum_show):
+    # Fraction of events whose pixel isn't the background (empty cell) colour
+    pixels = np.asarray(im.convert("RGB"))
+    background = amw.get_colourmap_lut(cm.get_cmap("plasma"))[0]
+    n_sum = 1 if sum_show else 0
+    event_dim = max(1, im_dim//(length+n_sum))
+    block_dim = -(-length//max(1, im_dim-n_sum)) if length+n_sum > im_dim else 1
+
+    visible = 0
+    for (t, b, split) in freq.keys():
+        if not np.array_equal(pixels[(b//block_dim)*event_dim, (t//block_dim)*event_dim], background):
+            visible = visible + 1
+
+    return visible/len(freq)
+
+def main():
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_path = os.path.join(temp_dir, "heatmap.png")
+        for length in args.lengths:
+            freq = get_freq(args.n_events, length)
+            pos_range = (0, length-1, 0, length-1)
+
+            for sum_show in (False, True):
+                writer = hmwp.HeatMapWriterPNG(im_dim=args.im_dim, grid_opts=(False,1,"gray",1), event_colourmap="plasma", sum_show=sum_show)
+
+                start = time.perf_counter()
+                writer.write_map(out_path, freq, None, pos_range, False)
+                render_time = time.perf_counter() - start
+
+                with Image.open(out_path) as im:
+                    im.load()
+
+                visible = get_visible_fraction(im, freq, length, args.im_dim, sum_show)
+                print("Reference length %i (sums %s): %ix%i pixels, %.4fs, %.1f%% of events visible" % (length, "shown" if sum_show else "hidden", im.width, im.height, render_time, 100*visible))
+
+                if im.width > args.im_dim or im.height > args.im_dim:
+                    print("FAILED: Image is larger than %i pixels" % args.im_dim)
+                    failed = True
+
+                if visible < 1:
+                    print("FAILED: Some events aren't visible")
+                    failed = True
+
+                if render_time > args.max_time:
+                    print("FAILED: Rendering took longer than %.2fs" % args.max_time)
+                    failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
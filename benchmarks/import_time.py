@@ -0,0 +1,59 @@
+### IMPORTS ###
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+### PARAMETERS ###
+# Modules which should only be imported when plots or SVG files are requested
+heavy_modules = ("matplotlib", "seaborn", "pandas")
+
+src_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+### ARGUMENT PARSING ###
+parser = argparse.ArgumentParser(description="Measures the time taken to import csi.py and checks plotting libraries aren't imported with it")
+parser.add_argument("-n", "--repeats", type=int, default=10, help="Number of times to import csi.py (each in a new interpreter)")
+parser.add_argument("-mt", "--max_time", type=float, default=None, help="Fail if the median import time (in seconds) exceeds this value")
+
+
+def get_import_time():
+    # Each import runs in a new interpreter, so nothing is already cached in sys.modules
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import csi"], cwd=src_path, check=True)
+
+    return time.perf_counter() - start
+
+def get_heavy_modules():
+    code = "import sys, csi; print(','.join(m for m in %r if m in sys.modules))" % (heavy_modules,)
+    output = subprocess.run([sys.executable, "-c", code], cwd=src_path, check=True, capture_output=True, text=True).stdout.strip()
+
+    return output.split(",") if output != "" else []
+
+def main():
+    args = parser.parse_args()
+
+    times = [get_import_time() for i in range(args.repeats)]
+    median_time = statistics.median(times)
+
+    print("Import time for csi.py (median of %i): %.3fs (min %.3fs, max %.3fs)" % (args.repeats, median_time, min(times), max(times)))
+
+    failed = False
+
+    imported = get_heavy_modules()
+    if len(imported) > 0:
+        print("FAILED: Importing csi.py also imports %s" % ", ".join(imported))
+        failed = True
+
+    if args.max_time is not None and median_time > args.max_time:
+        print("FAILED: Median import time exceeds %.3fs" % args.max_time)
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+### IMPORTS ###
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+src_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+### PARAMETERS ###
+# Outputs which should be identical whether or not the run was interrupted
+output_suffixes = ("_individual.csv", "_summary.csv", "_output.txt")
+
+# The reference cache starts empty when resuming, so its hits and misses are split differently
+ignored_prefixes = ("Reference cache hits:", "Reference cache misses:")
+
+# Interrupts the run once the given number of sequences have been added to the results, with progress saved after every
+# sequence
+interrupt_code = """
+import sys
+sys.path.insert(0, %r)
+import csi
+from utils import resultstore as rs
+
+csi.checkpoint_interval = 0
+add_result = rs.ResultStore.add_result
+def interrupting_add_result(self, iteration, result):
+    add_result(self, iteration, result)
+    if self.get_n_sequences() >= %i:
+        raise KeyboardInterrupt
+
+rs.ResultStore.add_result = interrupting_add_result
+sys.argv = ["csi.py"] + sys.argv[1:]
+csi.main()
+"""
+
+
+### ARGUMENT PARSING ###
+parser = argparse.ArgumentParser(description="Checks a run interrupted part way through and resumed with --resume gives the same outputs as an uninterrupted run")
+parser.add_argument("-n", "--n_sequences", type=int, nargs="+", default=[2, 1200, 1999], help="Number of sequences processed before each interruption")
+parser.add_argument("-r", "--repeats", type=int, default=2, help="Number of copies of the example consensus sequences, so sequences from before the interruption are repeated after it")
+parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes")
+
+
+def run_csi(folder, extra_args, interrupt_after=None):
+    args = ["-r", os.path.join(folder, "ex_reference.fa"), "-ca", os.path.join(folder, "ex_cassette.fa"), "-co", os.path.join(folder, "ex_consensus.fa"), "-wi", "-ws", "-pr", "-wo"] + extra_args
+    if interrupt_after is None:
+        command = [sys.executable, os.path.join(src_path, "csi.py")] + args
+    else:
+        command = [sys.executable, "-c", interrupt_code % (src_path, interrupt_after)] + args
+
+    return subprocess.run(command, capture_output=True, text=True)
+
+def read_output(folder, suffix):
+    lines = []
+    with open(glob.glob(os.path.join(folder, "ex_consensus%s" % suffix))[0], encoding="utf-8") as file:
+        for line in file:
+            # Progress lines and the folder name differ between runs
+            if "it/s" in line or line.strip().startswith(ignored_prefixes):
+                continue
+            lines.append(line.replace(folder, ""))
+
+    return lines
+
+def make_folder(temp_dir, name, repeats):
+    folder = os.path.join(temp_dir, name)
+    os.makedirs(folder)
+    for path in glob.glob(os.path.join(data_path, "*.fa")):
+        shutil.copy(path, folder)
+
+    # The example file doesn't end with a line break, which is needed before the next copy
+    with open(os.path.join(data_path, "ex_consensus.fa")) as file:
+        consensus = file.read().rstrip("\n") + "\n"
+
+    with open(os.path.join(folder, "ex_consensus.fa"), "w") as file:
+        file.write(consensus*repeats)
+
+    return folder
+
+def main():
+    args = parser.parse_args()
+    extra_args = ["-j", str(args.jobs)]
+
+    failed = False
+    with tempfile.TemporaryDirectory() as temp_dir:
+        full_folder = make_folder(temp_dir, "full", args.repeats)
+        start = time.perf_counter()
+        run_csi(full_folder, extra_args)
+        full_time = time.perf_counter() - start
+
+        for n_sequences in args.n_sequences:
+            folder = make_folder(temp_dir, "resumed_%i" % n_sequences, args.repeats)
+            run_csi(folder, extra_args, interrupt_after=n_sequences)
+            if not os.path.exists(os.path.join(folder, "ex_consensus_checkpoint.pkl")):
+                print("FAILED: No checkpoint written before interrupting after %i sequence(s)" % n_sequences)
+                failed = True
+                continue
+
+            start = time.perf_counter()
+            run_csi(folder, extra_args + ["-re"])
+            resumed_time = time.perf_counter() - start
+
+            for suffix in output_suffixes:
+                if read_output(folder, suffix) != read_output(full_folder, suffix):
+                    print("FAILED: ex_consensus%s differs after resuming from %i sequence(s)" % (suffix, n_sequences))
+                    failed = True
+
+            print("Resumed after %i sequence(s):  %.2fs (uninterrupted run %.2fs)" % (n_sequences, resumed_time, full_time))
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
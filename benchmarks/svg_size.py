@@ -0,0 +1,112 @@
+### IMPORTS ###
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+src_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, src_path)
+
+import svgwrite
+
+from utils import strandlinkageplotwriter as slpw
+from utils import svgstreamwriter as ssw
+
+
+### PARAMETERS ###
+def_n_events = [40, 2000]
+def_ref_len = 10000
+
+
+### ARGUMENT PARSING ###
+parser = argparse.ArgumentParser(description="Checks strand linkage plots written with shared CSS classes are smaller than the same plots written with svgwrite")
+parser.add_argument("-n", "--n_events", type=int, nargs="+", default=def_n_events, help="Number of events in each synthetic plot (few events leave the histogram as most of the plot)")
+parser.add_argument("-l", "--ref_len", type=int, default=def_ref_len, help="Reference length (number of positions along each strand)")
+
+
+class SVGWriteWriter():
+    # Previous approach; the same elements built as an svgwrite document, with every style written on each element
+    def __init__(self, path, size, styles={}, **attribs):
+        self._styles = styles
+        self._dwg = svgwrite.Drawing(path, size=size, debug=False, **attribs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._dwg.save()
+
+    def add_line(self, start, end, **attribs):
+        self._dwg.add(self._dwg.line(start, end, **self._get_attribs(attribs, False)))
+
+    def add_rect(self, insert, size, **attribs):
+        self._dwg.add(self._dwg.rect(insert=insert, size=size, **self._get_attribs(attribs, False)))
+
+    def add_text(self, text, insert, **attribs):
+        self._dwg.add(self._dwg.text(text, insert=insert, **self._get_attribs(attribs, True)))
+
+    def _get_attribs(self, attribs, as_style):
+        # Classes are replaced by their declarations, written as a style for text and as attributes for shapes
+        if "class_" not in attribs:
+            return attribs
+
+        attribs = dict(attribs)
+        decls = [decl for name in attribs.pop("class_").split() for decl in self._styles[name].split(";")]
+        if as_style:
+            attribs["style"] = ";".join(decls)
+        else:
+            for decl in decls:
+                (name, value) = decl.split(":")
+                attribs[name.replace("-", "_")] = value
+
+        return attribs
+
+def get_freq(n_events, ref_len):
+    # Random events spread along the reference, with some split across the ends
+    random.seed(0)
+    freq = {}
+    while len(freq) < n_events:
+        freq[(random.randint(1, ref_len), random.randint(1, ref_len), random.random() < 0.1)] = random.randint(1, 1000)
+
+    return freq
+
+def write_plot(writer_class, path, freq, ref_len, end_label_position):
+    # Swapping the writer used for the plot, so both receive the same elements
+    stream_writer_class = ssw.SVGStreamWriter
+    ssw.SVGStreamWriter = writer_class
+    try:
+        writer = slpw.StrandLinkagePlotWriter(end_label_opts=(True, 20, "black", 0.01, end_label_position), hist_opts=(True, 0, 100, 2, "darkgray", 0.16, 0.07, 20, 0))
+        start = time.perf_counter()
+        writer.write_map(path, freq, pos_range=(1, ref_len))
+        render_time = time.perf_counter() - start
+    finally:
+        ssw.SVGStreamWriter = stream_writer_class
+
+    return (os.path.getsize(path), render_time)
+
+def main():
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for (n_events, end_label_position) in [(n_events, position) for n_events in args.n_events for position in slpw.VPOS]:
+            freq = get_freq(n_events, args.ref_len)
+            (stream_size, stream_time) = write_plot(ssw.SVGStreamWriter, os.path.join(temp_dir, "stream.svg"), freq, args.ref_len, end_label_position)
+            (svgwrite_size, svgwrite_time) = write_plot(SVGWriteWriter, os.path.join(temp_dir, "svgwrite.svg"), freq, args.ref_len, end_label_position)
+
+            print("Strand linkage plot with %i events (end labels %s)" % (n_events, end_label_position))
+            print("    svgwrite:              %i bytes, %.4fs" % (svgwrite_size, svgwrite_time))
+            print("    SVGStreamWriter:       %i bytes, %.4fs" % (stream_size, stream_time))
+
+            if stream_size >= svgwrite_size:
+                print("FAILED: Plot isn't smaller than the svgwrite output")
+                failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
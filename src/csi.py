@@ -1,21 +1,29 @@
 ### IMPORTS ###
 import argparse
+import glob
+import multiprocessing as mp
 import os
 import sys
 
 from argparse import RawTextHelpFormatter
-from Bio import Align
+from Bio.Seq import Seq
 from tqdm import tqdm
 
+from utils import checkpointstore as cs
 from utils import csvutils as cu
-from utils import errorstore as es
+from utils import dedupstore as ds
 from utils import fileutils as fu
-from utils import plotutils as pu
+from utils import filterutils as flu
+from utils import parallelutils as pa
 from utils import reportutils as ru
+from utils import resultcache as rc
+from utils import resultstore as rs
 from utils import sequenceutils as su
-from utils import strandlinkageplotwriter as slpw
-from utils import heatmapwritercsv as hmwc
-from utils import heatmapwritersvg as hmws
+from utils import statsstore as ss
+
+# Plotting and map writer modules (plotutils, strandlinkageplotwriter, heatmapwritercsv, heatmapwriterpng and
+# heatmapwritersvg) are imported where they're used, since matplotlib, seaborn and pandas are slow to load and
+# most runs don't need them
 
 ### Parameters ###
 ### DEFAULT PARAMETERS ###
@@ -31,10 +39,26 @@ def_min_quality = 1.0 # Minimum match quality ("1" is perfect)
 
 def_num_bases = 20 # Number of bases to match
 
+def_jobs = 1 # Number of worker processes used to search consensus sequences
+
+def_cache_size = 10000 # Number of reference search results kept for reuse
+
+def_dedup_size = 100000 # Number of distinct consensus sequence results kept for reuse by identical sequences
+
+def_result_cache = "" # Folder storing results between runs (disabled if empty)
+
+def_append = "" # Summary or state file from an earlier run, which new results are added to (disabled if empty)
+
 
 # HARDCODED PARAMETERS
 csv_double_line_mode = True # Output CSV files should use double line format
 
+parallel_chunk_size = 50 # Number of consensus sequences sent to a worker process at a time
+
+parallel_range_size = 1 << 16 # Number of bytes of a consensus file read by a worker process at a time
+
+checkpoint_interval = 60 # Minimum number of seconds between saving progress, so interrupted runs can be resumed
+
 
 ### ARGUMENT PARSING ###
 # Creating ArgumentParser
@@ -50,12 +74,12 @@ required.add_argument("-ca", "--cassette_path", type=str, required=True, help="P
 
 required.add_argument("-r", "--reference_path", type=str, required=True, help="Path to reference sequence file.  This is the sequence which has been digested.\n\n")
 
-required.add_argument("-co", "--consensus_path", type=str, required=True, help= "Path to consensus sequence file.  This is the sequence of the cleaved sample with cassette inserted.\n\n")
+required.add_argument("-co", "--consensus_path", type=str, nargs="+", required=True, help= "Path to consensus sequence file.  This is the sequence of the cleaved sample with cassette inserted.  Multiple paths and glob patterns (e.g. \"plate1/*.fa\") can be given to process files in batch, sharing the loaded reference and cassette.  A manifest file listing one path (or glob pattern) per line can be given as \"@manifest.txt\" (the \"@\" prefix is only recognised here).\n\n")
 
 # Reinserting optional arguments and defining new values
 parser._action_groups.append(optional)
 
-optional.add_argument("-rf", "--repeat_filter", type=str, default=def_repeat_filter, help="Expression defining filter for accepted number of repeats.  Uses standard Python math notation, where 'x' is the number of repeats (e.g. 'x>=3′ will process all sequences with at least 3 repeats).\n\n")
+optional.add_argument("-rf", "--repeat_filter", type=str, default=def_repeat_filter, help="Expression defining filter for accepted number of repeats.  Uses standard Python math notation, where 'x' is the number of repeats (e.g. 'x>=3′ will process all sequences with at least 3 repeats).  Supports numbers, arithmetic (+, -, *, /, // and %%), comparisons and 'and'/'or'/'not' (e.g. 'x>=3 and x<10').\n\n")
 
 optional.add_argument("-lr", "--local_r", type=int, default=def_local_r, help="Half width of the local sequences to be extracted at restriction sites.\n\n")
 
@@ -65,6 +89,18 @@ optional.add_argument("-mq", "--min_quality", type=float, default=def_min_qualit
 
 optional.add_argument("-nb", "--num_bases", type=int, default=def_num_bases, help="Number of bases to match.\n\n")
 
+optional.add_argument("-j", "--jobs", type=int, default=def_jobs, help="Number of worker processes used to search consensus sequences.  Results are identical to a single process run.  When processing multiple consensus files, this is instead the number of files processed at once, with each file searched by a single process (starting with the largest).\n\n")
+
+optional.add_argument("-cs", "--cache_size", type=int, default=def_cache_size, help="Number of reference search results kept for reuse by consensus sequences sharing the same cassette-adjacent sequence.  Larger values use more memory.  Set to 0 to disable.\n\n")
+
+optional.add_argument("-ds", "--dedup_size", type=int, default=def_dedup_size, help="Number of distinct consensus sequence results kept for reuse by identical sequences.  Once this is reached, the least recently used results are dropped and any further repeats of those sequences are searched again.  Larger values use more memory.  Set to 0 to disable.\n\n")
+
+optional.add_argument("-rc", "--result_cache", type=str, default=def_result_cache, help="Folder in which to store the result for each consensus sequence, so later runs with the same reference, cassette and search parameters (-nb, -mq and -mg) can skip searching them again.  Results are only reused when all of these match.  Disabled if not specified.\n\n")
+
+optional.add_argument("-re", "--resume", action='store_true', help="Resume an interrupted run from its checkpoint file (stored in consensus file folder with the suffix '_checkpoint').  Sequences processed before the interruption are skipped and the final outputs are identical to an uninterrupted run (except that the reference cache starts empty, so its hits and misses printed with --print_results are split differently).  Checkpoints are only used if the input files and parameters are unchanged.\n\n")
+
+optional.add_argument("-ap", "--append", type=str, default=def_append, help="Add the results for the consensus file to those of an earlier run, so only the new sequences are processed.  Takes either a summary file from the earlier run (written with --write_summary) or a state file (written with --write_state).  Individual results (--write_individual) only include the new sequences.  Summary files only record the number of each event and error, so error categories also only include the new sequences.  With state files, all other outputs are identical to processing all sequences in a single run.  Only one consensus file can be given.\n\n")
+
 optional.add_argument("-pr", "--print_results", action='store_true',  help="Prints results in terminal as they are generated.\n\n")
 
 optional.add_argument("-en", "--extra_nt", type=int, default=def_extra_nt, help="Number of additional nucleotides to be displayed either side of the cleavage site.\n\n")
@@ -77,6 +113,10 @@ optional.add_argument("-whsa", "--write_heatmap_svg_auto", action='store_true',
 
 optional.add_argument("-whsf", "--write_heatmap_svg_full", action='store_true', help="Write heatmap image (spanning full range of reference sequence) to SVG file.  Output file will be stored in consensus file folder with same name as the consensus file, but with the suffix '_heatmap'.\n\n")
 
+optional.add_argument("-whpa", "--write_heatmap_png_auto", action='store_true', help="Write heatmap image (only spanning range of identified event positions) to PNG file.  Output file will be stored in consensus file folder with same name as the consensus file, but with the suffix '_heatmap'.\n\n")
+
+optional.add_argument("-whpf", "--write_heatmap_png_full", action='store_true', help="Write heatmap image (spanning full range of reference sequence) to PNG file.  PNG heatmaps remain small for long reference sequences, where SVG heatmaps can become very large.  Output file will be stored in consensus file folder with same name as the consensus file, but with the suffix '_heatmap'.\n\n")
+
 optional.add_argument("-whca", "--write_heatmap_csv_auto", action='store_true', help="Write heatmap image (only spanning range of identified event positions) to CSV file.  Output file will be stored in consensus file folder with same name as the consensus file, but with the suffix '_heatmap'.\n\n")
 
 optional.add_argument("-whcf", "--write_heatmap_csv_full", action='store_true', help="Write heatmap image (spanning full range of reference sequence) to CSV file.  Output file will be stored in consensus file folder with same name as the consensus file, but with the suffix '_heatmap'.\n\n")
@@ -85,192 +125,491 @@ optional.add_argument("-wi", "--write_individual", action='store_true', help="Wr
 
 optional.add_argument("-ws", "--write_summary", action='store_true', help="Write summary of results to CSV file.  Output file will be stored in consensus file folder with same name as the consensus file, but with the suffix '_summary'.\n\n")
 
+optional.add_argument("-wst", "--write_state", action='store_true', help="Write the full state of the run to file, so later runs can add to it with --append.  Output file will be stored in consensus file folder with same name as the consensus file, but with the suffix '_state'.  State files (like checkpoint files) are Python pickles, so should only be loaded from trusted sources.\n\n")
+
 optional.add_argument("-wo", "--write_output", action='store_true', help="Write all content displayed in console to a text file.  Output file will be stored in consensus file folder with same name as the consensus file, but with the suffix '_output'.\n\n")
 
 optional.add_argument("-ad", "--append_datetime", action='store_true', help="Append time and date to all output filenames (prevents accidental file overwriting).\n\n")
 
 optional.add_argument("-v", "--verbose", action='store_true', help="Display detailed messages during execution.\n\n")
 
-args = parser.parse_args()
-
-# Required arguments
-cassette_path = args.cassette_path  # The cassette sequence
-reference_path = args.reference_path  # The sequence for the plasmid into which the cassette has been inserted
-consensus_path = args.consensus_path  # The sequencing result
-
-# Optional arguments
-repeat_filter = args.repeat_filter # Expression for filtering sequences by number of repeats
-extra_nt = args.extra_nt  # Number of additional nucleotides to be displayed either side of the cleavage site
-local_r = args.local_r  # Half width of the local sequences to be extracted at restriction sites
-max_gap = args.max_gap  # Maximum number of bp between 3′ and 5′ restriction sites
-min_quality = args.min_quality  # Minimum match quality ("1" is perfect)
-num_bases = args.num_bases  # Number of bases to match
-print_results = args.print_results  # Display results in terminal as they are generated
-show_plots = args.show_plots  # Display plots in pyplot windows as they are generated
-append_dt = args.append_datetime # Append time and date to all output filenames
-write_strandlinkageplot = args.write_strandlinkageplot # Write strand linkage plot image to SVG file
-write_heatmap_svg_auto = args.write_heatmap_svg_auto # Write heatmap to SVG file for identified event range
-write_heatmap_svg_full = args.write_heatmap_svg_full # Write heatmap to SVG file for full reference range
-write_heatmap_csv_auto = args.write_heatmap_csv_auto # Write heatmap to CSV file for identified event range
-write_heatmap_csv_full = args.write_heatmap_csv_full # Write heatmap to CSV file for full reference range
-write_individual = args.write_individual # Write cleavage results to CSV file
-write_summary = args.write_summary # Write summary of results to CSV file
-write_output = args.write_output # Write console output to text file
-verbose = args.verbose  # Display messages during execution
-
-# Getting the root filename
-root_name = os.path.splitext(consensus_path)[0]
-
-# If necessary, redirecting the output stream to file
-new_out = None
-if write_output:
-    new_out = ru.StdOut(root_name)
-    sys.stdout = new_out
-
-# If not showing full messages, just display the current file name
-if not verbose:
-    print("Processing: %s" % consensus_path)
-
-### Processing ###
-# Creating FileHandler object
-filereader = fu.FileReader(verbose=verbose)
-
-# Loading reference, cassette and consensus sequences
-if verbose:
-    print("INPUT: Loading sequences from file")
-reference = filereader.read_sequence(reference_path)[0][0][0]
-cassette = filereader.read_sequence(cassette_path)[0][0][0]
-
-(tests,n_acc,n_rej) = filereader.read_sequence(consensus_path,repeat_filter=repeat_filter)
-if verbose:
-    print("        Accepted = %i (%.2f%%), rejected = %i (%.2f%%)" % (n_acc, (100*n_acc/(n_acc+n_rej)), n_rej, (100*n_rej/(n_acc+n_rej))))
-
-if verbose:
-    print("\r")
-
-# Creating the PairwiseAligner and SequenceSearcher objects
-aligner = Align.PairwiseAligner()
-aligner.mode = 'local'
-aligner.match_score = 1.0
-# aligner.mismatch_score = -1.0
-aligner.gap_score = -1.0
-searcher = su.SequenceSearcher(aligner, max_gap=max_gap, min_quality=min_quality, num_bases=num_bases, verbose=verbose)
-
-# Dict to store results as dual cleavage site tuple
-results = {}
-error_store = es.ErrorStore()
-error_count = 0
-
-if verbose:
-    print("PROCESSING: %i sequence(s)" % len(tests))
-
-for iteration, test in enumerate(tqdm(tests, disable=verbose, smoothing=0.1)):
+def main():
+    args = parser.parse_args()
+
+    # Required arguments
+    consensus_paths = get_consensus_paths(args.consensus_path)  # The sequencing results
+
+    # Optional arguments
+    repeat_filter = args.repeat_filter # Expression for filtering sequences by number of repeats
+
+    # Checking the repeat filter can be parsed before any files are read
+    try:
+        flu.compile_repeat_filter(repeat_filter)
+    except ValueError as e:
+        parser.error("argument -rf/--repeat_filter: %s" % e)
+
+    if len(consensus_paths) == 0:
+        parser.error("argument -co/--consensus_path: no consensus files found")
+
+    if args.append != "" and len(consensus_paths) > 1:
+        parser.error("argument -ap/--append: only one consensus file can be added to an earlier run")
+
+    # Filters which fail for a particular sequence (e.g. dividing by a number of repeats which can be zero) are reported
+    # in the same way as filters which can't be parsed
+    try:
+        process_files(consensus_paths, args)
+    except flu.RepeatFilterError as e:
+        parser.error("argument -rf/--repeat_filter: %s" % e)
+
+def process_files(consensus_paths, args):
+    # Required arguments
+    cassette_path = args.cassette_path  # The cassette sequence
+    reference_path = args.reference_path  # The sequence for the plasmid into which the cassette has been inserted
+
+    # Optional arguments
+    jobs = args.jobs  # Number of worker processes used to search consensus sequences
+    verbose = args.verbose  # Display messages during execution
+
+    # A single file is processed as before, with its sequences searched in parallel if requested
+    if len(consensus_paths) == 1:
+        process_file(consensus_paths[0], args, jobs=jobs)
+        return
+
+    # Loading the reference and cassette sequences once for all files
+    filereader = fu.FileReader(verbose=verbose)
     if verbose:
-        if test[1] != "":
-            print("    Processing consensus sequence %i (%s)" % (iteration + 1,test[1]))
+        print("INPUT: Loading sequences from file")
+    reference = filereader.read_sequence(reference_path)[0][0][0]
+    cassette = filereader.read_sequence(cassette_path)[0][0][0]
+
+    if verbose:
+        print("\r")
+
+    # Processing the largest files first, so a long file isn't left running on its own at the end
+    consensus_paths = sorted(consensus_paths, key=os.path.getsize, reverse=True)
+
+    if jobs > 1:
+        initargs = (reference, cassette, args)
+        with mp.Pool(processes=min(jobs, len(consensus_paths)), initializer=_init_batch_worker, initargs=initargs) as pool:
+            for consensus_path in tqdm(pool.imap_unordered(_process_batch_file, consensus_paths), total=len(consensus_paths), disable=verbose):
+                pass
+
+    else:
+        searcher = get_searcher(args)
+        for consensus_path in consensus_paths:
+            process_file(consensus_path, args, reference=reference, cassette=cassette, searcher=searcher)
+
+def process_file(consensus_path, args, reference=None, cassette=None, searcher=None, jobs=1, show_progress=True):
+    # Required arguments
+    cassette_path = args.cassette_path  # The cassette sequence
+    reference_path = args.reference_path  # The sequence for the plasmid into which the cassette has been inserted
+
+    # Optional arguments
+    repeat_filter = args.repeat_filter # Expression for filtering sequences by number of repeats
+    extra_nt = args.extra_nt  # Number of additional nucleotides to be displayed either side of the cleavage site
+    local_r = args.local_r  # Half width of the local sequences to be extracted at restriction sites
+    print_results = args.print_results  # Display results in terminal as they are generated
+    show_plots = args.show_plots  # Display plots in pyplot windows as they are generated
+    append_dt = args.append_datetime # Append time and date to all output filenames
+    write_strandlinkageplot = args.write_strandlinkageplot # Write strand linkage plot image to SVG file
+    write_heatmap_svg_auto = args.write_heatmap_svg_auto # Write heatmap to SVG file for identified event range
+    write_heatmap_svg_full = args.write_heatmap_svg_full # Write heatmap to SVG file for full reference range
+    write_heatmap_png_auto = args.write_heatmap_png_auto # Write heatmap to PNG file for identified event range
+    write_heatmap_png_full = args.write_heatmap_png_full # Write heatmap to PNG file for full reference range
+    write_heatmap_csv_auto = args.write_heatmap_csv_auto # Write heatmap to CSV file for identified event range
+    write_heatmap_csv_full = args.write_heatmap_csv_full # Write heatmap to CSV file for full reference range
+    write_individual = args.write_individual # Write cleavage results to CSV file
+    write_summary = args.write_summary # Write summary of results to CSV file
+    write_state = args.write_state # Write state of the run to file
+    write_output = args.write_output # Write console output to text file
+    verbose = args.verbose  # Display messages during execution
+
+    # Getting the root filename
+    root_name = fu.get_root_name(consensus_path)
+
+    # If necessary, redirecting the output stream to file
+    new_out = None
+    if write_output:
+        new_out = ru.StdOut(root_name)
+        sys.stdout = new_out
+
+    # If not showing full messages, just display the current file name
+    if not verbose:
+        print("Processing: %s" % consensus_path)
+
+    ### Processing ###
+    # Creating FileHandler object
+    filereader = fu.FileReader(verbose=verbose)
+
+    # Loading reference, cassette and consensus sequences (the reference and cassette are shared when processing
+    # files in batch)
+    if verbose:
+        print("INPUT: Loading sequences from file")
+    if reference is None:
+        reference = filereader.read_sequence(reference_path)[0][0][0]
+    if cassette is None:
+        cassette = filereader.read_sequence(cassette_path)[0][0][0]
+
+    # Consensus sequences are streamed from file, so only the headers are counted up front (compressed files
+    # aren't counted)
+    tests = filereader.iter_sequences(consensus_path,repeat_filter=repeat_filter)
+    n_tests = fu.count_sequences(consensus_path,repeat_filter=repeat_filter)
+
+    # Worker processes can read sequences from file themselves, rather than having them read and sent over
+    consensus_ranges = filereader.get_ranges(consensus_path, repeat_filter=repeat_filter, range_size=parallel_range_size) if jobs > 1 else None
+
+    if verbose:
+        print("\r")
+
+    if verbose:
+        if n_tests is not None:
+            print("PROCESSING: %i sequence(s)" % n_tests)
         else:
-            print("    Processing consensus sequence %i" % (iteration + 1))
+            print("PROCESSING: sequences from compressed file")
+
+    # Opening the result cache, if results are being kept between runs
+    result_cache = None
+    if args.result_cache != "":
+        result_cache = rc.ResultCache(args.result_cache, reference, cassette, args.num_bases, args.min_quality, args.max_gap)
+
+    # Loading the results of an earlier run, which the new sequences are added to
+    state = get_appended_results(args.append, reference, cassette, args)
+
+    # Creating the CSVWriter object.  Individual results are written as they're found, so they don't need to be held in
+    # memory.
+    csv_writer = cu.CSVWriter(extra_nt=extra_nt,local_r=local_r,append_dt=append_dt,double_line_mode=csv_double_line_mode)
+    individual_writer = csv_writer.get_individual_writer(root_name, reference) if write_individual else None
+
+    # Progress is saved periodically, so the run can be resumed if interrupted
+    checkpoint = cs.CheckpointStore(root_name+'_checkpoint.pkl', get_signature(consensus_path, reference, cassette, args), interval=checkpoint_interval)
+    if not args.resume and os.path.exists(checkpoint.get_path()):
+        print("WARNING: Found checkpoint \"%s\" from an earlier run, which will be replaced (use --resume to continue from it)" % checkpoint.get_path())
+
+    # Searching the consensus sequences (the SequenceSearcher is shared when processing files in batch)
+    csi_results = run_csi(reference, cassette, tests, local_r=local_r, extra_nt=extra_nt, max_gap=args.max_gap, min_quality=args.min_quality, num_bases=args.num_bases, cache_size=args.cache_size, dedup_size=args.dedup_size, jobs=jobs, searcher=searcher, ranges=consensus_ranges, result_cache=result_cache, checkpoint=checkpoint, resume=args.resume, state=state, keep_results=False, individual_writer=individual_writer, n_tests=n_tests, show_progress=show_progress, verbose=verbose)
+
+    if result_cache is not None:
+        result_cache.close()
 
-    (cleavage_site_t,cleavage_site_b,split) = searcher.get_cleavage_positions(reference, cassette, test[0], error_store=error_store)
-    
-    (local_seq_t, local_seq_b) = su.get_local_sequences(reference,cleavage_site_t,cleavage_site_b,local_r=local_r)
+    freq_full = csi_results.get_freq_full()
+    freq_local = csi_results.get_freq_local()
+    freq_5p = csi_results.get_freq_5p()
+    freq_3p = csi_results.get_freq_3p()
+    error_store = csi_results.get_error_store()
+    error_count = csi_results.get_error_count()
+    dedup_counts = csi_results.get_dedup_counts()
 
-    if cleavage_site_t == None:
-        error_count = error_count + 1
-        continue
+    # Accepted and rejected counts are only final once all sequences have been read (by the worker processes, if
+    # they read the file themselves)
+    counter = consensus_ranges if consensus_ranges is not None else filereader
+    n_acc = counter.get_n_accepted()
+    n_rej = counter.get_n_rejected()
 
-    results[iteration] = (cleavage_site_t, cleavage_site_b, split, local_seq_t, local_seq_b, test[1])
+    # Sequences from an earlier run are included in the error rate
+    n_total = csi_results.get_n_sequences()
 
     if verbose:
-        print("        Result:")
-        ru.print_position(cleavage_site_t, cleavage_site_b, split, offset="        ")
-        ru.print_type(cleavage_site_t, cleavage_site_b, split, offset="        ")
-        ru.print_sequence(reference,cleavage_site_t,cleavage_site_b, split,extra_nt=extra_nt,offset="        ")
-
-# Reporting full sequence frequency
-freq_full = ru.get_full_sequence_frequency(results)
-freq_local = ru.get_local_sequence_frequency(results, ru.StrandMode.BOTH, ru.LocalMode.BOTH, local_r)
-freq_5p = ru.get_local_sequence_frequency(results, ru.StrandMode.BOTH, ru.LocalMode.FIVE_P, local_r)
-freq_3p = ru.get_local_sequence_frequency(results, ru.StrandMode.BOTH, ru.LocalMode.THREE_P, local_r)
-
-# Keeping track of whether any output was created
-output = False
-
-if print_results:
-    output = True
-    print("\rRESULTS:")
-    print("    Full sequence frequency:\n")
-    ru.print_full_sequence_frequency(reference, freq_full, extra_nt=extra_nt, include_seqs=True, offset="    ")
-
-    print("    Local dinucleotide frequencies:\n")
-    ru.print_local_sequence_frequency(freq_local, nonzero_only=False, offset="    ")
-
-    print("    Local 5′ nucleotide frequencies:\n")
-    ru.print_local_sequence_frequency(freq_5p, nonzero_only=False, offset="    ")
-
-    print("    Local 3′ nucleotide frequencies:\n")
-    ru.print_local_sequence_frequency(freq_3p, nonzero_only=False, offset="    ")
-
-    # Reporting number of errors
-    print("    Summary of errors:\n")
-    error_store.print_counts(offset="        ")
-    ru.print_error_rate(error_count, len(tests), offset="        ")
-
-# Plotting sequence distributions
-if show_plots and len(results) > 0:
-    output = True
-    pu.plotFrequency1D(freq_local, freq_5p, freq_3p, show_percentages=True)
-
-    # Reporting top and bottom sequence co-occurrence
-    (labels, freq2D) = ru.get_sequence_cooccurrence(results, local_r)
-    pu.plotFrequency2D(labels, freq2D, show_percentages=True)
-
-if write_strandlinkageplot:
-    output = True
-    # Showing cleavage event distribution
-    strandlinkageplot_writer = slpw.StrandLinkagePlotWriter()
-    strandlinkageplot_writer.write_map(root_name+'_strandlinkageplot.svg', freq_full, ref=reference, append_dt=append_dt)
-
-if write_heatmap_svg_auto:
-    output = True
-    # Showing events as heatmap
-    heatmap_writer = hmws.HeatMapWriterSVG(grid_opts=(False,1,"gray",1), grid_label_opts=(True,12,"gray",100,10), event_label_opts=(False,10,"invert",1,True), sum_show=False)
-    heatmap_writer.write_map(root_name+'_autoheatmap.svg', freq_full, None, None, append_dt)
-
-if write_heatmap_svg_full:
-    output = True
-    # Showing events as heatmap
-    heatmap_writer = hmws.HeatMapWriterSVG(grid_opts=(False,1,"gray",1), grid_label_opts=(True,12,"gray",100,10), event_label_opts=(False,10,"invert",1,True), sum_show=False)
-    heatmap_writer.write_map(root_name+'_fullheatmap.svg', freq_full, reference, None, append_dt)
-
-if write_heatmap_csv_auto:
-    output = True
-    # Showing events as heatmap
-    heatmap_writer = hmwc.HeatMapWriterCSV(sum_show=False)
-    heatmap_writer.write_map(root_name+'_autoheatmap.csv', freq_full, None, None, append_dt)
-
-if write_heatmap_csv_full:
-    output = True
-    # Showing events as heatmap
-    heatmap_writer = hmwc.HeatMapWriterCSV(sum_show=False)
-    heatmap_writer.write_map(root_name+'_fullheatmap.csv', freq_full, reference, None, append_dt=append_dt)
-
-# Creating the CSVWriter object
-csv_writer = cu.CSVWriter(extra_nt=extra_nt,local_r=local_r,append_dt=append_dt,double_line_mode=csv_double_line_mode)
-if write_individual:
-    output = True
-    csv_writer.write_individual(root_name, results, reference)
-
-if write_summary:
-    output = True
-    csv_writer.write_summary(root_name, freq_full, reference, error_count)
-
-# If no other output is generated by the code (i.e. only three arguments were provided) the full sequence frequencies are shown
-if not output:
-    print("\rRESULTS:")
-    print("    Full sequence frequency:\n")
-    ru.print_full_sequence_frequency(reference, freq_full, extra_nt=extra_nt, include_seqs=False, offset="    ")
-
-# If writing output, shut down file and print redirection
-if write_output:
-    new_out.shutdown()
+        print("\rINPUT STATISTICS:")
+        print("    Accepted = %i (%.2f%%), rejected = %i (%.2f%%)" % (n_acc, (100*n_acc/(n_acc+n_rej)), n_rej, (100*n_rej/(n_acc+n_rej))))
+        print("\n")
+
+    if verbose:
+        print("\rSEARCH STATISTICS:")
+        csi_results.get_stats().print_counts(offset="    ")
+
+    # Only shown while running verbosely, since repeats of sequences from before a resumed run are searched again, so
+    # these counts can differ from an uninterrupted run
+    if verbose:
+        print("\rDUPLICATE SEQUENCES:")
+        ds.print_counts(dedup_counts, offset="    ")
+
+    if verbose and result_cache is not None:
+        print("\rRESULT CACHE:")
+        result_cache.print_counts(offset="    ")
+
+    # Keeping track of whether any output was created
+    output = False
+
+    if print_results:
+        output = True
+        print("\rRESULTS:")
+        print("    Full sequence frequency:\n")
+        ru.print_full_sequence_frequency(reference, freq_full, extra_nt=extra_nt, include_seqs=True, offset="    ")
+
+        print("    Local dinucleotide frequencies:\n")
+        ru.print_local_sequence_frequency(freq_local, nonzero_only=False, offset="    ")
+
+        print("    Local 5′ nucleotide frequencies:\n")
+        ru.print_local_sequence_frequency(freq_5p, nonzero_only=False, offset="    ")
+
+        print("    Local 3′ nucleotide frequencies:\n")
+        ru.print_local_sequence_frequency(freq_3p, nonzero_only=False, offset="    ")
+
+        # Reporting number of errors
+        print("    Summary of errors:\n")
+        error_store.print_counts(offset="        ")
+        ru.print_error_rate(error_count, n_total, offset="        ")
+
+        # Reporting how often reference searches were reused from the cache
+        print("    Summary of reference cache:\n")
+        csi_results.get_stats().print_cache_counts(offset="        ")
+
+    # Plotting sequence distributions
+    if show_plots and len(freq_full) > 0:
+        output = True
+        from utils import plotutils as pu
+        # Beyond dinucleotides most possible local sequences aren't observed, so only those which were are shown
+        pu.plotFrequency1D(freq_local, freq_5p, freq_3p, show_percentages=True, nonzero_only=local_r > 1)
+
+        # Reporting top and bottom sequence co-occurrence
+        pu.plotFrequency2D(csi_results.get_cooccurrence(), show_percentages=True, nonzero_only=local_r > 1)
+
+    # All maps are drawn from the same events, so these are only summarised once
+    if write_strandlinkageplot or write_heatmap_svg_auto or write_heatmap_svg_full or write_heatmap_png_auto or write_heatmap_png_full or write_heatmap_csv_auto or write_heatmap_csv_full:
+        from utils import abstractmapwriter as amw
+        event_matrix = amw.EventMatrix(freq_full)
+
+    if write_strandlinkageplot:
+        output = True
+        from utils import strandlinkageplotwriter as slpw
+
+        # Showing cleavage event distribution
+        strandlinkageplot_writer = slpw.StrandLinkagePlotWriter()
+        strandlinkageplot_writer.write_map(root_name+'_strandlinkageplot.svg', event_matrix, ref=reference, append_dt=append_dt)
+
+    if write_heatmap_svg_auto:
+        output = True
+        from utils import heatmapwritersvg as hmws
+
+        # Showing events as heatmap
+        heatmap_writer = hmws.HeatMapWriterSVG(grid_opts=(False,1,"gray",1), grid_label_opts=(True,12,"gray",100,10), event_label_opts=(False,10,"invert",1,True), sum_show=False)
+        heatmap_writer.write_map(root_name+'_autoheatmap.svg', event_matrix, None, None, append_dt)
+
+    if write_heatmap_svg_full:
+        output = True
+        from utils import heatmapwritersvg as hmws
+
+        # Showing events as heatmap
+        heatmap_writer = hmws.HeatMapWriterSVG(grid_opts=(False,1,"gray",1), grid_label_opts=(True,12,"gray",100,10), event_label_opts=(False,10,"invert",1,True), sum_show=False)
+        heatmap_writer.write_map(root_name+'_fullheatmap.svg', event_matrix, reference, None, append_dt)
+
+    if write_heatmap_png_auto:
+        output = True
+        from utils import heatmapwriterpng as hmwp
+
+        # Showing events as heatmap
+        heatmap_writer = hmwp.HeatMapWriterPNG(grid_opts=(False,1,"gray",1), sum_show=False)
+        heatmap_writer.write_map(root_name+'_autoheatmap.png', event_matrix, None, None, append_dt)
+
+    if write_heatmap_png_full:
+        output = True
+        from utils import heatmapwriterpng as hmwp
+
+        # Showing events as heatmap
+        heatmap_writer = hmwp.HeatMapWriterPNG(grid_opts=(False,1,"gray",1), sum_show=False)
+        heatmap_writer.write_map(root_name+'_fullheatmap.png', event_matrix, reference, None, append_dt)
+
+    if write_heatmap_csv_auto:
+        output = True
+        from utils import heatmapwritercsv as hmwc
+
+        # Showing events as heatmap
+        heatmap_writer = hmwc.HeatMapWriterCSV(sum_show=False)
+        heatmap_writer.write_map(root_name+'_autoheatmap.csv', event_matrix, None, None, append_dt)
+
+    if write_heatmap_csv_full:
+        output = True
+        from utils import heatmapwritercsv as hmwc
+
+        # Showing events as heatmap
+        heatmap_writer = hmwc.HeatMapWriterCSV(sum_show=False)
+        heatmap_writer.write_map(root_name+'_fullheatmap.csv', event_matrix, reference, None, append_dt=append_dt)
+
+    # Individual results have already been written
+    if write_individual:
+        output = True
+
+    if write_summary:
+        output = True
+        csv_writer.write_summary(root_name, freq_full, reference, error_count)
+
+    if write_state:
+        output = True
+        state_store = cs.CheckpointStore(root_name+'_state.pkl', get_state_signature(reference, cassette, args))
+        state_store.save(csi_results)
+
+    # If no other output is generated by the code (i.e. only three arguments were provided) the full sequence frequencies are shown
+    if not output:
+        print("\rRESULTS:")
+        print("    Full sequence frequency:\n")
+        ru.print_full_sequence_frequency(reference, freq_full, extra_nt=extra_nt, include_seqs=False, offset="    ")
+
+    # If writing output, shut down file and print redirection
+    if write_output:
+        new_out.shutdown()
+
+def run_csi(reference, cassette, consensus_iterable, local_r=def_local_r, extra_nt=def_extra_nt, max_gap=def_max_gap, min_quality=def_min_quality, num_bases=def_num_bases, cache_size=def_cache_size, dedup_size=def_dedup_size, jobs=def_jobs, searcher=None, ranges=None, result_cache=None, checkpoint=None, resume=False, state=None, keep_results=True, individual_writer=None, n_tests=None, show_progress=False, verbose=False):
+    # Sequences can be given as strings, and consensus sequences without headers
+    if isinstance(reference, str):
+        reference = Seq(reference)
+    if isinstance(cassette, str):
+        cassette = Seq(cassette)
+    tests = (_get_test(test) for test in consensus_iterable)
+
+    # Creating the PairwiseAligner and SequenceSearcher objects, unless a searcher is being reused (statistics are
+    # always reported for this run only)
+    if searcher is None:
+        searcher = su.SequenceSearcher(su.get_aligner(), max_gap=max_gap, min_quality=min_quality, num_bases=num_bases, cache_size=cache_size, verbose=verbose)
+    searcher.set_stats(ss.StatsStore())
+
+    # Results are added to an earlier ResultStore if continuing from an earlier run, with the new sequences numbered
+    # after its sequences
+    result_store = state if state is not None else rs.ResultStore(reference, local_r, keep_results=keep_results)
+    first_index = result_store.get_n_sequences()
+    individual_position = None
+
+    # Restoring the state of an interrupted run, so only the remaining sequences are processed
+    checkpoint_state = checkpoint.load() if checkpoint is not None and resume else None
+    if checkpoint_state is not None:
+        (result_store, individual_position) = checkpoint_state
+
+        # Statistics continue from the interrupted run (the caches start empty, so hits and misses can differ slightly)
+        if result_store.get_stats() is not None:
+            searcher.get_stats().merge(result_store.get_stats())
+        if verbose:
+            print("    Resuming from checkpoint after %i sequence(s)" % (result_store.get_n_sequences() - first_index))
+
+    # Identical sequences are only searched once.  The stored results are only kept for this run, with just the counts
+    # added to the ResultStore (and so checkpoints and state files).
+    dedup_store = ds.DedupStore(max_size=dedup_size, counts=result_store.get_dedup_counts())
+
+    # Individual results are written as they're found (continuing from where an interrupted run got to)
+    if individual_writer is not None:
+        individual_writer.open(position=individual_position)
+
+    n_skipped = result_store.get_n_sequences() - first_index
+    positions = pa.iter_cleavage_positions(searcher, reference, cassette, tests, jobs=jobs, chunk_size=parallel_chunk_size, error_store=result_store.get_error_store(), dedup_store=dedup_store, ranges=ranges, result_cache=result_cache, start=n_skipped)
+    for (iteration, test, (cleavage_site_t,cleavage_site_b,split)) in tqdm(positions, total=n_tests, initial=n_skipped, disable=verbose or not show_progress, smoothing=0.1):
+        (local_seq_t, local_seq_b) = su.get_local_sequences(reference,cleavage_site_t,cleavage_site_b,local_r=local_r)
+
+        if cleavage_site_t == None:
+            result_store.add_error()
+
+        else:
+            result = (cleavage_site_t, cleavage_site_b, split, local_seq_t, local_seq_b, test[1])
+            result_store.add_result(first_index + iteration, result)
+
+            if individual_writer is not None:
+                individual_writer.add_result(result)
+
+            if verbose:
+                print("        Result:")
+                ru.print_position(cleavage_site_t, cleavage_site_b, split, offset="        ")
+                ru.print_type(cleavage_site_t, cleavage_site_b, split, offset="        ")
+                ru.print_sequence(reference,cleavage_site_t,cleavage_site_b, split,extra_nt=extra_nt,offset="        ")
+
+        # Saving progress periodically, once this sequence has been fully accounted for
+        if checkpoint is not None and checkpoint.is_due():
+            result_store.set_dedup_counts(dedup_store.get_counts())
+            result_store.set_stats(searcher.get_stats())
+            checkpoint.save((result_store, individual_writer.get_position() if individual_writer is not None else None))
+
+    if individual_writer is not None:
+        individual_writer.close()
+
+    # A completed run doesn't need resuming
+    if checkpoint is not None:
+        checkpoint.remove()
+
+    result_store.set_dedup_counts(dedup_store.get_counts())
+    result_store.set_stats(searcher.get_stats())
+
+    return result_store
+
+def _get_test(test):
+    (seq, header) = test if isinstance(test, tuple) else (test, "")
+
+    return (Seq(seq) if isinstance(seq, str) else seq, header)
+
+def get_consensus_paths(consensus_args):
+    # Expanding any manifest files and glob patterns, while keeping explicitly listed files in the order given
+    consensus_paths = []
+    for consensus_arg in consensus_args:
+        consensus_arg = consensus_arg.strip()
+        if consensus_arg == "" or consensus_arg.startswith("#"):
+            continue
+
+        # Manifest files list one path or glob pattern per line
+        if consensus_arg.startswith("@"):
+            if not os.path.isfile(consensus_arg[1:]):
+                parser.error("argument -co/--consensus_path: manifest file \"%s\" not found" % consensus_arg[1:])
+
+            with open(consensus_arg[1:]) as file:
+                consensus_paths.extend(get_consensus_paths(file.read().splitlines()))
+
+        elif any(char in consensus_arg for char in "*?["):
+            consensus_paths.extend(sorted(glob.glob(consensus_arg)))
+        else:
+            consensus_paths.append(consensus_arg)
+
+    # Removing repeated paths, so no file is processed twice
+    return list(dict.fromkeys(consensus_paths))
+
+def get_signature(consensus_path, reference, cassette, args):
+    # Everything which affects the results, so a checkpoint from a different run is never resumed
+    values = (os.path.abspath(consensus_path), os.path.getsize(consensus_path), os.path.getmtime(consensus_path), args.repeat_filter, args.append, args.write_individual, get_state_signature(reference, cassette, args))
+
+    return "\n".join(str(value) for value in values)
+
+def get_state_signature(reference, cassette, args):
+    # Results can only be added together if they were found in the same way
+    values = (str(reference), str(cassette), args.local_r, args.num_bases, args.min_quality, args.max_gap)
+
+    return "\n".join(str(value) for value in values)
+
+def get_appended_results(append_path, reference, cassette, args):
+    # Returns the ResultStore from a state file, or one holding the event counts and number of errors from a summary file
+    if append_path == "":
+        return None
+
+    if not os.path.exists(append_path):
+        parser.error("argument -ap/--append: \"%s\" not found" % append_path)
+
+    if fu.get_extension(append_path)[1] == ".csv":
+        if cu.get_file_type(append_path) is not cu.FileTypes.SUMMARY:
+            parser.error("argument -ap/--append: \"%s\" isn't a summary file" % append_path)
+
+        csv_reader = cu.CSVReader()
+        result_store = rs.ResultStore(reference, args.local_r, keep_results=False)
+        result_store.add_frequency(csv_reader.read_summary(append_path), csv_reader.read_error_count(append_path))
+
+        return result_store
+
+    try:
+        return cs.CheckpointStore(append_path, get_state_signature(reference, cassette, args)).load(ignore_mismatch=False)
+    except ValueError:
+        parser.error("argument -ap/--append: \"%s\" was created with a different reference, cassette, search parameters (-lr, -nb, -mq and -mg) or version" % append_path)
+
+def get_searcher(args):
+    # Creating the PairwiseAligner and SequenceSearcher objects
+    aligner = su.get_aligner()
+
+    return su.SequenceSearcher(aligner, max_gap=args.max_gap, min_quality=args.min_quality, num_bases=args.num_bases, cache_size=args.cache_size, verbose=args.verbose)
+
+# Each batch worker process keeps its own searcher, so the reference index and cache are reused between files
+_batch_state = {}
+
+def _init_batch_worker(reference, cassette, args):
+    _batch_state['reference'] = reference
+    _batch_state['cassette'] = cassette
+    _batch_state['args'] = args
+    _batch_state['searcher'] = get_searcher(args)
+
+def _process_batch_file(consensus_path):
+    process_file(consensus_path, _batch_state['args'], reference=_batch_state['reference'], cassette=_batch_state['cassette'], searcher=_batch_state['searcher'], show_progress=False)
+
+    return consensus_path
+
+
+if __name__ == "__main__":
+    main()
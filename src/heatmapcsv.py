@@ -18,6 +18,7 @@ class SHOWHIDE(Enum):
 def_event_label_decimal_places = 1
 def_sum_vis = SHOWHIDE.SHOW
 def_count_vis = SHOWHIDE.SHOW
+def_format = hmw.FORMAT.WIDE
 
 
 ### ARGUMENT PARSING ###
@@ -49,11 +50,13 @@ optional.add_argument("-sv", "--sum_vis", type=SHOWHIDE, default=def_sum_vis, ch
 
 optional.add_argument("-cv", "--count_vis", type=SHOWHIDE, default=def_count_vis, choices=list(SHOWHIDE), help="Controls whether the total number of events is displayed underneath the map.  Must be either \"show\" or \"hide\" (e.g. -cv \"show\").  Default: \"%s\".\n\n" % def_sum_vis)
 
+optional.add_argument("-fmt", "--format", type=hmw.FORMAT, default=def_format, choices=list(hmw.FORMAT), help="Layout of the output CSV file.  \"wide\" writes the full grid of top strand (columns) and bottom strand (rows) positions.  \"long\" writes one row per event (top position, bottom position, split, count and percentage), omitting positions without events, which is much smaller for sparse data.  Sum rows and columns are only written in the wide layout.  Must be either \"wide\" or \"long\" (e.g. -fmt \"long\").  Default: \"%s\".\n\n" % def_format)
+
 args = parser.parse_args()
 
 sum_show = args.sum_vis is SHOWHIDE.SHOW
 count_show = args.count_vis is SHOWHIDE.SHOW
 pos_range = tuple(args.pos_range) if args.pos_range != [0,0,0,0] else None
 
-writer = hmw.HeatMapWriterCSV(event_label_decimal_places = args.event_label_decimal_places, sum_show=sum_show, count_show=count_show)
+writer = hmw.HeatMapWriterCSV(event_label_decimal_places = args.event_label_decimal_places, sum_show=sum_show, count_show=count_show, format=args.format)
 writer.write_map_from_file(args.data_path, args.out_path, ref_path=args.ref_path, pos_range=pos_range, append_dt=args.append_datetime)
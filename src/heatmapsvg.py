@@ -2,6 +2,7 @@ import argparse
 
 from argparse import RawTextHelpFormatter
 from enum import Enum
+from utils import heatmapwriterpng as hmwp
 from utils import heatmapwritersvg as hmw
 
 
@@ -13,8 +14,17 @@ class SHOWHIDE(Enum):
     def __str__(self):
         return str(self.value)
 
+class FORMAT(Enum):
+    PNG = 'png'
+    SVG = 'svg'
+
+    def __str__(self):
+        return str(self.value)
+
 
 ### DEFAULT PARAMETER VALUES ###
+def_format = FORMAT.SVG
+
 def_im_dim = 800
 
 def_font = "Arial"
@@ -77,6 +87,8 @@ optional.add_argument("-ad", "--append_datetime", action='store_true', help="App
 
 optional.add_argument("-pr", "--pos_range", type=int, default=[0,0,0,0], nargs=4, help="Minimum and maximum top and bottom strand positions within the reference sequence to display.  Specified as a pair of integer numbers in the order minimum_top maximum_top minimum_bottom maximum_bottom (e.g. -pr 100 200 400 500).  If unspecified, the full reference range will be used.\n\n")
 
+optional.add_argument("-fmt", "--format", type=FORMAT, default=def_format, choices=list(FORMAT), help="Output image format.  PNG images are rendered with one or more pixels per cell, so remain small and quick to render for large position ranges.  Only the position range, image size, grid line, event colourmap and sum options apply to PNG images (labels and borders aren't rendered).  Must be either \"svg\" or \"png\" (e.g. -fmt \"png\").  Default: \"%s\".\n\n" % def_format)
+
 optional.add_argument("-id", "--im_dim", type=int, default=def_im_dim, help="Pixel dimensions of the output .svg image.  Strand linkage plot image is square, so specified as a single integer number.  Default: \"%i\".\n\n" % def_im_dim)
 
 optional.add_argument("-f", "--font", type=str, default=def_font, help="Font to use for all text.  Can be any font currently installed on this computer.  Default: \"%s\".\n\n" % def_font)
@@ -149,5 +161,8 @@ grid_label_opts = (grid_label_show,args.grid_label_size,args.grid_label_colour,a
 event_colourmap = args.event_colourmap
 event_label_opts = (event_label_show,args.event_label_size,args.event_label_colour,args.event_label_decimal_places,args.event_label_zeros_vis)
 
-writer = hmw.HeatMapWriterSVG(im_dim=im_dim, font=args.font, rel_pos=rel_pos, border_opts=border_opts, axis_label_opts=axis_label_opts, grid_opts=grid_opts, grid_label_opts=grid_label_opts, event_colourmap=event_colourmap,event_label_opts=event_label_opts, sum_show=sum_show)
+if args.format is FORMAT.PNG:
+    writer = hmwp.HeatMapWriterPNG(im_dim=im_dim, grid_opts=grid_opts, event_colourmap=event_colourmap, sum_show=sum_show)
+else:
+    writer = hmw.HeatMapWriterSVG(im_dim=im_dim, font=args.font, rel_pos=rel_pos, border_opts=border_opts, axis_label_opts=axis_label_opts, grid_opts=grid_opts, grid_label_opts=grid_label_opts, event_colourmap=event_colourmap,event_label_opts=event_label_opts, sum_show=sum_show)
 writer.write_map_from_file(args.data_path, args.out_path, ref_path=args.ref_path, pos_range=pos_range, append_dt=args.append_datetime)
@@ -1,4 +1,5 @@
 import math
+import numpy as np
 import sys
 
 from abc import abstractmethod
@@ -7,6 +8,134 @@ from utils import fileutils as fu
 from utils import reportutils as ru
 
 
+class EventMatrix():
+    # Events from a full sequence frequency dict, stored as NumPy arrays sorted by top strand position.  Totals,
+    # marginals and maxima are only calculated once for each position range, then reused by all maps using that range.
+    def __init__(self, freq):
+        self._freq = freq
+
+        t = np.array([key[0] for key in freq.keys()], dtype=np.int64)
+        b = np.array([key[1] for key in freq.keys()], dtype=np.int64)
+        split = np.array([key[2] for key in freq.keys()], dtype=bool)
+        count = np.array(list(freq.values()), dtype=np.int64)
+
+        order = np.argsort(t, kind="stable")
+        self._t = t[order]
+        self._b = b[order]
+        self._split = split[order]
+        self._count = count[order]
+
+        self._range_stats = {}
+
+    def get_freq(self):
+        return self._freq
+
+    def get_n_events(self):
+        return len(self._count)
+
+    def get_total(self):
+        return int(self._count.sum())
+
+    def get_min_count(self):
+        return int(self._count.min())
+
+    def get_max_count(self):
+        return int(self._count.max())
+
+    def get_pos_range(self, round=1):
+        if self.get_n_events() == 0:
+            (pos_t_min, pos_t_max, pos_b_min, pos_b_max) = (sys.maxsize, 0, sys.maxsize, 0)
+        else:
+            (pos_t_min, pos_t_max) = (int(self._t[0]), int(self._t[-1]))
+            (pos_b_min, pos_b_max) = (int(self._b.min()), int(self._b.max()))
+
+        if round != 1:
+            pos_t_min = math.floor(pos_t_min/round)*round
+            pos_t_max = math.ceil(pos_t_max/round)*round
+            pos_b_min = math.floor(pos_b_min/round)*round
+            pos_b_max = math.ceil(pos_b_max/round)*round
+
+        return (pos_t_min,pos_t_max,pos_b_min,pos_b_max)
+
+    def get_position_frequency(self):
+        # Number of events at each top and bottom strand position, irrespective of range
+        return (_get_position_sums(self._t, self._count), _get_position_sums(self._b, self._count))
+
+    def get_sum_events(self, pos_range):
+        return self._get_range_stats(pos_range)["sum_events"]
+
+    def get_max_events(self, pos_range, sum_show):
+        stats = self._get_range_stats(pos_range)
+
+        return stats["max_summed_events"] if sum_show else stats["max_events"]
+
+    def get_summed_frequency(self, pos_range):
+        # Number of events at each top and bottom strand position, only counting events within the range
+        stats = self._get_range_stats(pos_range)
+
+        return (stats["freq_t"], stats["freq_b"])
+
+    def get_cell_counts(self, pos_range):
+        # Numbers of split and non-split events for each (top, bottom) position within the range
+        stats = self._get_range_stats(pos_range)
+        if stats["cell_counts"] is None:
+            cell_counts = {}
+            idx = stats["idx"]
+            for (t, b, split, count) in zip(self._t[idx].tolist(), self._b[idx].tolist(), self._split[idx].tolist(), self._count[idx].tolist()):
+                (count_split, count_nonsplit) = cell_counts.get((t,b), (0,0))
+                cell_counts[(t,b)] = (count_split + count, count_nonsplit) if split else (count_split, count_nonsplit + count)
+
+            stats["cell_counts"] = cell_counts
+
+        return stats["cell_counts"]
+
+    def get_event_arrays(self, pos_range):
+        # Top positions, bottom positions, split flags and counts of the events within the range
+        idx = self._get_range_stats(pos_range)["idx"]
+
+        return (self._t[idx], self._b[idx], self._split[idx], self._count[idx])
+
+    def get_cell_arrays(self, pos_range):
+        # Total number of events (split and non-split) for each (top, bottom) position within the range, as arrays of
+        # top positions, bottom positions and counts
+        (t, b, split, count) = self.get_event_arrays(pos_range)
+
+        cells = np.stack((t, b), axis=1)
+        (cells, inverse) = np.unique(cells, axis=0, return_inverse=True)
+        counts = np.zeros(len(cells), dtype=np.int64)
+        np.add.at(counts, inverse.reshape(-1), count)
+
+        return (cells[:,0], cells[:,1], counts)
+
+    def _get_range_stats(self, pos_range):
+        pos_range = tuple(pos_range)
+        if pos_range in self._range_stats:
+            return self._range_stats[pos_range]
+
+        (pos_t_min, pos_t_max, pos_b_min, pos_b_max) = pos_range
+
+        # Events are sorted by top strand position, so only those in the top strand range need checking
+        lo = np.searchsorted(self._t, pos_t_min, side="left")
+        hi = np.searchsorted(self._t, pos_t_max, side="right")
+        idx = np.arange(lo, hi)
+        idx = idx[(self._b[idx] >= pos_b_min) & (self._b[idx] <= pos_b_max)]
+
+        freq_t = _get_position_sums(self._t[idx], self._count[idx])
+        freq_b = _get_position_sums(self._b[idx], self._count[idx])
+
+        stats = {}
+        stats["idx"] = idx
+        stats["sum_events"] = int(self._count[idx].sum())
+        stats["max_events"] = int(self._count[idx].max()) if len(idx) > 0 else 0
+        stats["max_summed_events"] = max(list(freq_t.values()) + list(freq_b.values()) + [0])
+        stats["freq_t"] = freq_t
+        stats["freq_b"] = freq_b
+        stats["cell_counts"] = None
+
+        self._range_stats[pos_range] = stats
+
+        return stats
+
 class AbstractMapWriter():
     ## PUBLIC METHODS
 
@@ -79,72 +208,21 @@ def get_double_pos_range(freq, ref, pos_range):
     return (pos_t_min, pos_t_max, pos_b_min, pos_b_max)
 
 def get_event_pos_range(freq, round=1):
-    pos_t_min = sys.maxsize
-    pos_t_max = 0
-    pos_b_min = sys.maxsize
-    pos_b_max = 0
-
-    for (cleavage_site_t, cleavage_site_b,split) in freq.keys():
-        pos_t_min = min(pos_t_min,cleavage_site_t)
-        pos_t_max = max(pos_t_max,cleavage_site_t)
-        pos_b_min = min(pos_b_min,cleavage_site_b)
-        pos_b_max = max(pos_b_max,cleavage_site_b)
-
-    if round != 1:
-        pos_t_min = math.floor(pos_t_min/round)*round
-        pos_t_max = math.ceil(pos_t_max/round)*round
-        pos_b_min = math.floor(pos_b_min/round)*round
-        pos_b_max = math.ceil(pos_b_max/round)*round
-    
-    return (pos_t_min,pos_t_max,pos_b_min,pos_b_max)
+    return get_event_matrix(freq).get_pos_range(round=round)
 
 def get_max_events(pos_range, freq, sum_show):
-    (pos_t_min, pos_t_max, pos_b_min, pos_b_max) = pos_range
-
-    max_events = 0
-    if sum_show:
-        (freq_t, freq_b) = get_full_sequence_summed_frequency(freq, pos_range)
-
-        for t in freq_t.keys():
-            if t >= pos_t_min and t <= pos_t_max:
-                max_events = max(max_events,freq_t.get(t))
-
-        for b in freq_b.keys():
-            if b >= pos_b_min and b <= pos_b_max:
-                max_events = max(max_events,freq_b.get(b))
-
-    else:
-        for (t,b,split) in freq.keys():
-            if t >= pos_t_min and t <= pos_t_max and b >= pos_b_min and b <= pos_b_max:
-                max_events = max(max_events,freq.get((t,b,split)))
-
-    return max_events
+    return get_event_matrix(freq).get_max_events(pos_range, sum_show)
 
 def get_sum_events(pos_range, freq):
-    (pos_t_min, pos_t_max, pos_b_min, pos_b_max) = pos_range
-
-    sum_events = 0
-    for (t,b,split) in freq.keys():
-            if t >= pos_t_min and t <= pos_t_max and b >= pos_b_min and b <= pos_b_max:
-                sum_events = sum_events + freq.get((t,b,split))
-
-    return sum_events
+    return get_event_matrix(freq).get_sum_events(pos_range)
 
 def get_full_sequence_summed_frequency(freq_full, pos_range):
-    (pos_t_min, pos_t_max, pos_b_min, pos_b_max) = pos_range
+    return get_event_matrix(freq_full).get_summed_frequency(pos_range)
 
-    freq_t = {}
-    freq_b = {}
-
-    for (t, b, split) in freq_full.keys():        
-        freq = freq_full.get((t, b, split))
-        
-        # Adding this frequency to the relevant elements of freq_t and freq_b
-        if t >= pos_t_min and t <= pos_t_max and b >= pos_b_min and b <= pos_b_max:
-            freq_t[t] = freq_t[t] + freq if t in freq_t else freq
-            freq_b[b] = freq_b[b] + freq if b in freq_b else freq
-
-    return (freq_t, freq_b)
+def get_event_matrix(freq):
+    # Maps can be written from either a frequency dict or an EventMatrix which has already been created from one (e.g.
+    # when writing several maps of the same results)
+    return freq if isinstance(freq, EventMatrix) else EventMatrix(freq)
 
 def get_event_norm_count(key, freq, max_events):
     if key in freq:
@@ -161,3 +239,41 @@ def get_event_pc(key, freq, sum_events):
         event_pc = 0
 
     return event_pc
+
+def get_cell_norm_count(cell_counts, max_events):
+    # Split and non-split events at the same positions are normalised separately, then added
+    return sum(count/max_events if count > 0 else 0 for count in cell_counts)
+
+def get_cell_pc(cell_counts, sum_events):
+    return sum(100*count/sum_events if count > 0 else 0 for count in cell_counts)
+
+def get_colourmap_lut(cmap, n_colours=256):
+    # RGB values (0-255) for each of the colourmap's quantised colours.  Values are truncated in the same way as the
+    # "rgb(%i,%i,%i)" strings used in the SVG writers.
+    return (cmap(np.arange(n_colours)/(n_colours-1))[:,:3]*255).astype(np.uint8)
+
+def get_colour_strings(cmap, n_colours=256, invert=False):
+    # SVG "rgb(r,g,b)" strings for each of the colourmap's quantised colours (or their inverse, as used for labels)
+    rgb = cmap(np.arange(n_colours)/(n_colours-1))[:,:3]*255
+    if invert:
+        rgb = 255-rgb
+
+    return ["rgb(%i,%i,%i)" % (r,g,b) for (r,g,b) in rgb.tolist()]
+
+def get_colour_index(norm_count, n_colours=256):
+    # Equivalent to the colourmap entry matplotlib picks for a normalised count (values outside 0-1 take the end colours)
+    return min(max(int(norm_count*n_colours), 0), n_colours-1)
+
+def get_colourmap_index(counts, max_events, n_colours=256):
+    # Equivalent to the colourmap entry matplotlib picks for a normalised count of counts/max_events
+    if max_events == 0:
+        return np.zeros(np.shape(counts), dtype=np.int64)
+
+    return np.minimum(np.asarray(counts, dtype=np.int64)*n_colours//max_events, n_colours-1)
+
+def _get_position_sums(positions, counts):
+    (positions, inverse) = np.unique(positions, return_inverse=True)
+    sums = np.zeros(len(positions), dtype=np.int64)
+    np.add.at(sums, inverse.reshape(-1), counts)
+
+    return dict(zip(positions.tolist(), sums.tolist()))
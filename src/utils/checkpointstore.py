@@ -0,0 +1,59 @@
+import hashlib
+import os
+import pickle
+import time
+
+
+# Written before the saved state, so files from other inputs, parameters or versions are rejected before unpickling
+header_prefix = b"CSI checkpoint 1 "
+
+class CheckpointStore():
+    def __init__(self, path, signature, interval=60):
+        self._path = path
+        self._interval = interval
+        self._last_save = time.time()
+
+        # Checkpoints are only reused for the same input files and parameters
+        self._signature = hashlib.sha1(signature.encode()).hexdigest()
+
+    def get_path(self):
+        return self._path
+
+    def load(self, ignore_mismatch=True):
+        if not os.path.exists(self._path):
+            return None
+
+        with open(self._path, "rb") as file:
+            # The state is only unpickled once the header matches.  Files without a header (or with a truncated one)
+            # are treated as a mismatch.
+            header = file.readline(len(self._get_header()))
+            if header != self._get_header():
+                if not ignore_mismatch:
+                    raise ValueError("\"%s\" was created with different inputs, parameters or version" % self._path)
+
+                print("WARNING: Checkpoint \"%s\" was created with different inputs, parameters or version, so is being ignored" % self._path)
+                return None
+
+            return pickle.load(file)
+
+    def is_due(self):
+        return time.time() - self._last_save >= self._interval
+
+    def save(self, state):
+        # Writing to a temporary file first, so an interruption mid-write can't corrupt the last checkpoint
+        temp_path = self._path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(self._get_header())
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temp_path, self._path)
+        self._last_save = time.time()
+
+    def remove(self):
+        # Also removing any partially-written checkpoint left by an interruption
+        for path in (self._path, self._path + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _get_header(self):
+        return header_prefix + self._signature.encode() + b"\n"
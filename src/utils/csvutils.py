@@ -49,6 +49,16 @@ class CSVReader():
 
         return freq
 
+    def read_error_count(self, filename):
+        with open(filename, newline='\n') as file:
+            # The number of failed sequences is recorded on the final line of a summary file
+            for row in file:
+                contents = row.split(',')
+                if contents[0] == "Error":
+                    return int(contents[1])
+
+        return 0
+
     def _read_individual_result_line(self, row):
         contents = row.split(',')
         
@@ -74,18 +84,17 @@ class CSVWriter():
         self._double_line_mode = double_line_mode
 
     def write_individual(self, root_name, results, ref):
-        file = fu.open_file(root_name, '_individual', 'csv', append_dt=self._append_dt)
-
-        # Initialising string
-        row = self._get_individual_header_line()
-        file.write(row)
+        individual_writer = self.get_individual_writer(root_name, ref)
+        individual_writer.open()
 
         # Iterating over each result, adding it as a new line
-        for index, result in enumerate(results.values()):
-            row = self._get_individual_result_line(result, index, ref)
-            file.write(row)
+        for result in results.values():
+            individual_writer.add_result(result)
 
-        file.close()
+        individual_writer.close()
+
+    def get_individual_writer(self, root_name, ref):
+        return IndividualWriter(self, root_name, ref)
 
     def _get_individual_header_line(self):
         row = "INDEX,HEADER,TYPE,TOP_POS,BOTTOM_POS,SPLIT_SEQ,TOP_LOCAL_SEQ,BOTTOM_LOCAL_SEQ,"
@@ -202,6 +211,46 @@ class CSVWriter():
     def _get_summary_error_line(self, count):
         return 'Error,' + str(count) + '\n'
 
+class IndividualWriter():
+    # Writes individual results to file as they're found, rather than once they've all been collected
+    def __init__(self, csv_writer, root_name, ref):
+        self._csv_writer = csv_writer
+        self._root_name = root_name
+        self._ref = ref
+        self._file = None
+        self._n_results = 0
+
+    def open(self, position=None):
+        # A file can be continued from a position given by get_position() (e.g. when resuming an interrupted run), with
+        # anything written after that point removed
+        if position is not None:
+            (path, offset, self._n_results) = position
+            self._file = open(path, "r+", encoding="utf-8")
+            self._file.seek(offset)
+            self._file.truncate()
+            return
+
+        self._file = fu.open_file(self._root_name, '_individual', 'csv', append_dt=self._csv_writer._append_dt)
+        self._n_results = 0
+
+        # Initialising string
+        row = self._csv_writer._get_individual_header_line()
+        self._file.write(row)
+
+    def add_result(self, result):
+        row = self._csv_writer._get_individual_result_line(result, self._n_results, self._ref)
+        self._file.write(row)
+
+        self._n_results = self._n_results + 1
+
+    def get_position(self):
+        self._file.flush()
+
+        return (self._file.name, self._file.tell(), self._n_results)
+
+    def close(self):
+        self._file.close()
+
 def get_file_type(filename):
     with open(filename, newline='\n') as file:
         # Getting the headings row
@@ -0,0 +1,71 @@
+import hashlib
+
+from collections import OrderedDict
+
+
+class DedupStore():
+    # Results are stored compactly (cleavage sites and the label of any error), with the least recently used results
+    # removed once max_size is reached.  A repeat of a removed sequence is simply searched again.
+    def __init__(self, max_size=100000, counts=(0, 0)):
+        self._max_size = max_size
+        self._results = OrderedDict()
+
+        # Counts can continue from an earlier run
+        (self._n_total, self._n_reused) = counts
+
+    def get_max_size(self):
+        return self._max_size
+
+    def get_n_total(self):
+        return self._n_total
+
+    def get_n_reused(self):
+        return self._n_reused
+
+    def get_counts(self):
+        return (self._n_total, self._n_reused)
+
+    def get_n_stored(self):
+        return len(self._results)
+
+    def get_result(self, key, count=True):
+        # Every sequence is looked up once, so this also counts the total number of sequences and how many of these
+        # reused an earlier result
+        result = self._results.get(key)
+        if result is not None:
+            self._results.move_to_end(key)
+
+        if count:
+            self._n_total = self._n_total + 1
+            if result is not None:
+                self._n_reused = self._n_reused + 1
+
+        return result
+
+    def add_result(self, key, cleavage_sites, error_label):
+        if self._max_size <= 0:
+            return (cleavage_sites, error_label)
+
+        self._results[key] = (cleavage_sites, error_label)
+        self._results.move_to_end(key)
+
+        if len(self._results) > self._max_size:
+            self._results.popitem(last=False)
+
+        return self._results[key]
+
+    def contains(self, key):
+        return key in self._results
+
+def print_counts(counts, offset=""):
+    (n_total, n_reused) = counts
+    ratio = n_total/(n_total - n_reused) if n_total > n_reused else 1
+
+    print(f"{offset}Sequences processed:  {n_total}")
+    print(f"{offset}Reused results:       {n_reused}")
+    print(f"{offset}Deduplication ratio:  {ratio:.2f}")
+    print("\n")
+
+def get_key(seq):
+    # Storing a digest rather than the sequence keeps memory use independent of read length
+    return hashlib.sha1(str(seq).encode()).digest()
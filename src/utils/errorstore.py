@@ -23,6 +23,21 @@ class ErrorStore():
     def midpoint_not_found(self):
         self._increment_counter('NO_MIDPOINT')
 
+    def add_error(self, label):
+        self._increment_counter(label)
+
+    def get_error_label(self):
+        # Each sequence fails on at most one check, so a per-sequence store has at most one non-zero count
+        for label, count in self._store.items():
+            if count > 0:
+                return label
+
+        return None
+
+    def merge(self, error_store):
+        for label, count in error_store.get_store().items():
+            self._store[label] = self._store[label] + count
+
     def print_counts(self, offset=""):
         print(f"{offset}Cassette not found in consensus:  {self._store['NO_CASS']}")
         print(f"{offset}Cassette ends RC mismatch:   {self._store['CASS_MISMATCH']}")
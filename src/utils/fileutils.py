@@ -1,13 +1,33 @@
 import datetime as dt
+import gzip
+import io
+import mmap
 import os
 import re
+import struct
+import zlib
 
 from Bio.Seq import Seq
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils import filterutils as flu
+
+
+# Creating sequence and header patterns
+nucleotide_pattern = re.compile("[ACGTacgt]*")
+header_pattern = re.compile(">.+_[\\d.]+_\\d+_(\\d+)_\\d+\\n")
+
+# Extensions of compressed files, which are decompressed as they're read
+compressed_exts = (".gz", ".bgz")
 
 
 class FileReader():
     def __init__(self, verbose=True):
         self._verbose = verbose
+        self._n_acc = 0
+        self._n_rej = 0
+        self._indexes = {}
+        self._maps = {}
 
     def read_sequence(self, path, repeat_filter=""):
         name = os.path.basename(path)
@@ -16,7 +36,7 @@ class FileReader():
             print("    Loading file \"%s\"" % name)
 
         # Get extension and run appropriate reader
-        rootname, ext = os.path.splitext(path)
+        rootname, ext = get_extension(path)
 
         if ext == ".ab1":
             return self._read_ab1(path)
@@ -29,6 +49,93 @@ class FileReader():
         elif ext == ".seq":
             return self._read_seq(path)
 
+    def iter_sequences(self, path, repeat_filter=""):
+        # Get extension and run appropriate reader
+        rootname, ext = get_extension(path)
+
+        # Other formats only contain a single sequence, so there's nothing to gain from streaming these
+        if ext != ".fa" and ext != ".fasta":
+            (seqs, self._n_acc, self._n_rej) = self.read_sequence(path, repeat_filter=repeat_filter)
+            return iter(seqs)
+
+        name = os.path.basename(path)
+        if self._verbose:
+            print("    Loading file \"%s\"" % name)
+            print("        Reading as \".fasta\" format (streaming)")
+
+        return self._iter_fasta(path, repeat_filter=repeat_filter)
+
+    def get_ranges(self, path, repeat_filter="", range_size=1 << 16):
+        # Worker processes read byte ranges straight from the file, so only uncompressed FASTA files can be split
+        rootname, ext = get_extension(path)
+        if (ext != ".fa" and ext != ".fasta") or is_compressed(path):
+            return None
+
+        return FastaRanges(path, repeat_filter=repeat_filter, range_size=range_size)
+
+    def get_index(self, path):
+        # Records are read straight from the file, so only uncompressed FASTA files can be indexed
+        rootname, ext = get_extension(path)
+        if (ext != ".fa" and ext != ".fasta") or is_compressed(path):
+            return None
+
+        if path in self._indexes:
+            return self._indexes[path]
+
+        # Reusing an existing index, provided it's not older than the FASTA file
+        index_path = path + ".fai"
+        if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(path):
+            if self._verbose:
+                print("    Loading index \"%s\"" % os.path.basename(index_path))
+
+            index = read_fasta_index(path, index_path)
+
+        else:
+            if self._verbose:
+                print("    Building index \"%s\"" % os.path.basename(index_path))
+
+            index = build_fasta_index(path)
+
+            if index is not None:
+                try:
+                    index.write(index_path)
+                except OSError:
+                    print("WARNING: Unable to write index to \"%s\"" % index_path)
+
+        if index is None and self._verbose:
+            print("        Index not available (records must have consistent line lengths and unique names)")
+
+        self._indexes[path] = index
+
+        return index
+
+    def fetch_sequence(self, path, header):
+        # Records are looked up by name, so either a full header (as returned when reading the file) or just its first
+        # word can be given
+        index = self.get_index(path)
+        name = get_record_name(header)
+        if index is None or name is None or not index.contains(name):
+            return None
+
+        # Each file is only mapped once, after which records can be fetched without reading the rest of the file
+        if path not in self._maps:
+            with open(path, "rb") as file:
+                self._maps[path] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (start, end) = index.get_byte_range(name)
+        seq = self._maps[path][start:end].replace(b"\n", b"").replace(b"\r", b"").decode()
+
+        # Sequences end at the first character which isn't a nucleotide, as when reading the whole file
+        seq = nucleotide_pattern.match(seq).group()
+
+        return Seq(convert_to_upper_case(seq))
+
+    def get_n_accepted(self):
+        return self._n_acc
+
+    def get_n_rejected(self):
+        return self._n_rej
+
     def get_verbose(self):
         return self._verbose
 
@@ -75,53 +182,76 @@ class FileReader():
         if self._verbose:
             print("        Reading as \".fasta\" format")
 
-        # Initialising counters for accepted and rejected sequences based on the number of repeats
-        n_acc = 0
-        n_rej = 0
-
-        # Initialising the sequence list
-        seqs = []
-
-        file = open(path, "r")
-        full_text = file.read()
-
-        pattern = re.compile("(>.+\n)([ACGTacgt\n]+)")
-        instances = pattern.findall(full_text)
-
-        # Creating header pattern
-        header_pattern = re.compile(">.+_[\d.]+_\d+_(\d+)_\d+\n")
-
-        for instance in instances:
-            header = instance[0]
-            seq = instance[1]
-
-            # Checking number of repeats
-            if repeat_filter != "":
-                # Matching C3P0a format in header
-                header_instances = header_pattern.findall(header)
-
-                if len(header_instances) == 1:
-                    repeat_filter_curr = repeat_filter.replace("x", header_instances[0])
-
-                    # If repeat filter fails for current number of repeats, skip this sequence and increase n_rej by 1
-                    if not eval(repeat_filter_curr):                        
-                        n_rej = n_rej + 1
-                        continue
-
-            # Removing linebreaks in header and sequence
-            header = header.replace("\n", "")
-            header = header.replace(">", "")
-            header = header.replace(",", ";")
-            seq = seq.replace("\n", "")
-            seq = convert_to_upper_case(seq)
-            seqs.append((Seq(seq),header))
-
-            n_acc = n_acc + 1
+        seqs = list(self._iter_fasta(path, repeat_filter=repeat_filter))
 
         if self._verbose:
             print("        Loaded %i sequence(s)" % len(seqs))
 
-        return (seqs, n_acc, n_rej)
+        return (seqs, self._n_acc, self._n_rej)
+
+    def _iter_fasta(self, path, repeat_filter=""):
+        # Reading one line at a time, so memory use doesn't depend on the file size
+        with open_sequence_file(path) as file:
+            yield from self._iter_fasta_lines(file, repeat_filter=repeat_filter)
+
+    def _iter_fasta_lines(self, lines, repeat_filter=""):
+        # Initialising counters for accepted and rejected sequences based on the number of repeats
+        self._n_acc = 0
+        self._n_rej = 0
+
+        repeat_predicate = flu.compile_repeat_filter(repeat_filter)
+
+        header = None
+        seq_lines = []
+        has_seq = False
+        in_seq = False
+
+        for line in lines:
+            if line[0:1] == ">":
+                if has_seq:
+                    record = self._get_fasta_record(header, seq_lines, repeat_predicate)
+                    if record is not None:
+                        yield record
+
+                # Headers need at least one character and a line ending before the sequence starts
+                header = line if len(line) > 2 and line[-1] == "\n" else None
+                seq_lines = []
+                has_seq = False
+                in_seq = header is not None
+
+            elif in_seq:
+                # Sequences end at the first character which isn't a nucleotide
+                content = line.rstrip("\n")
+                seq_line = nucleotide_pattern.match(content).group()
+                in_seq = seq_line == content
+
+                # Blank lines still count towards the sequence, provided they're terminated
+                if seq_line != "" or (in_seq and line[-1] == "\n"):
+                    has_seq = True
+
+                seq_lines.append(seq_line)
+
+        if has_seq:
+            record = self._get_fasta_record(header, seq_lines, repeat_predicate)
+            if record is not None:
+                yield record
+
+    def _get_fasta_record(self, header, seq_lines, repeat_predicate):
+        # Checking number of repeats
+        if not passes_repeat_filter(header, repeat_predicate):
+            self._n_rej = self._n_rej + 1
+            return None
+
+        # Removing linebreaks in header and sequence
+        header = header.replace("\n", "")
+        header = header.replace(">", "")
+        header = header.replace(",", ";")
+        seq = "".join(seq_lines)
+        seq = convert_to_upper_case(seq)
+
+        self._n_acc = self._n_acc + 1
+
+        return (Seq(seq),header)
 
     def _read_seq(self, path, repeat_filter=""):
         if repeat_filter != "":
@@ -183,6 +313,148 @@ def convert_to_upper_case(seq_string):
 
     return seq_string
 
+def count_sequences(path, repeat_filter=""):
+    # Only headers are checked, so this is much cheaper than reading the sequences themselves
+    rootname, ext = get_extension(path)
+    if ext != ".fa" and ext != ".fasta":
+        return 1
+
+    # Compressed files would need decompressing twice, so these aren't counted in advance
+    if is_compressed(path):
+        return None
+
+    repeat_predicate = flu.compile_repeat_filter(repeat_filter)
+
+    n_seqs = 0
+    with open(path, "r") as file:
+        for line in file:
+            if line[0:1] == ">" and passes_repeat_filter(line, repeat_predicate):
+                n_seqs = n_seqs + 1
+
+    return n_seqs
+
+def passes_repeat_filter(header, repeat_predicate):
+    if repeat_predicate is None:
+        return True
+
+    # Matching C3P0a format in header
+    header_instances = header_pattern.findall(header)
+
+    # Sequences without a repeat count in the header are always accepted
+    if len(header_instances) != 1:
+        return True
+
+    return repeat_predicate(int(header_instances[0]))
+
+def get_record_name(header):
+    # Records are named by the first word of their header, as in samtools-style .fai indexes
+    words = header.split()
+
+    return words[0] if len(words) > 0 else None
+
+def build_fasta_index(path):
+    entries = []
+    record = None
+    record_ended = False
+    offset = 0
+
+    with open(path, "rb") as file:
+        for line in file:
+            if line[0:1] == b">":
+                if record is not None:
+                    entries.append(tuple(record))
+
+                try:
+                    name = get_record_name(line[1:].decode())
+                except UnicodeDecodeError:
+                    return None
+
+                if name is None:
+                    return None
+
+                # Record stored as name, length, offset, bases per line and bytes per line
+                record = [name, 0, offset + len(line), 0, 0]
+                record_ended = False
+
+            elif record is not None:
+                content = line.rstrip(b"\r\n")
+
+                # Only blank lines can follow a blank or short line, otherwise bases can't be located by position
+                if len(content) == 0:
+                    record_ended = True
+
+                elif record_ended:
+                    return None
+
+                else:
+                    if record[3] == 0:
+                        record[3] = len(content)
+                        record[4] = len(line)
+
+                    elif len(content) > record[3] or (len(line) > len(content) and len(line) - len(content) != record[4] - record[3]):
+                        return None
+
+                    if len(content) < record[3]:
+                        record_ended = True
+
+                    record[1] = record[1] + len(content)
+
+            offset = offset + len(line)
+
+    if record is not None:
+        entries.append(tuple(record))
+
+    return FastaIndex(path, entries)
+
+def read_fasta_index(path, index_path):
+    entries = []
+    with open(index_path, "r") as file:
+        for line in file:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 5 or not all(field.isdigit() for field in fields[1:5]):
+                return None
+
+            entries.append((fields[0], int(fields[1]), int(fields[2]), int(fields[3]), int(fields[4])))
+
+    return FastaIndex(path, entries)
+
+def get_extension(path):
+    # Compressed files take the extension of the file they contain, with bare ".bgz" files assumed to be FASTA
+    rootname, ext = os.path.splitext(path)
+    if ext not in compressed_exts:
+        return (rootname, ext)
+
+    compressed_ext = ext
+    rootname, ext = os.path.splitext(rootname)
+    if ext == "" and compressed_ext == ".bgz":
+        ext = ".fa"
+
+    return (rootname, ext)
+
+def get_root_name(path):
+    return get_extension(path)[0]
+
+def is_compressed(path):
+    return os.path.splitext(path)[1] in compressed_exts
+
+def is_bgzf(path):
+    # BGZF files are gzip files whose blocks each carry their compressed size in a "BC" extra field
+    with open(path, "rb") as file:
+        header = file.read(16)
+
+    return len(header) == 16 and header[0:4] == b"\x1f\x8b\x08\x04" and header[12:14] == b"BC"
+
+def open_sequence_file(path):
+    if not is_compressed(path):
+        return open(path, "r")
+
+    # BGZF blocks can be decompressed independently, which is only worthwhile with more than one core
+    n_threads = os.cpu_count() or 1
+    if n_threads > 1 and is_bgzf(path):
+        return io.TextIOWrapper(io.BufferedReader(BgzfReader(path, n_threads=n_threads)))
+
+    return gzip.open(path, "rt")
+
 def open_file(root_name, suffix, extension, append_dt):
     datetime_str = dt.datetime.now().strftime("_%Y-%m-%d_%H-%M-%S") if append_dt else ""
     outname = root_name+ suffix + datetime_str + '.' + extension
@@ -198,4 +470,193 @@ def open_file(root_name, suffix, extension, append_dt):
 
         return open(outname, "w", encoding="utf-8")
 
-        
\ No newline at end of file
+
+class FastaIndex():
+    def __init__(self, path, entries):
+        self._path = path
+        self._entries = entries
+        self._lookup = {}
+
+        # Names are looked up in the same form as the headers returned by FileReader, which replaces some characters
+        for (i, entry) in enumerate(entries):
+            self._lookup[entry[0].replace(">", "").replace(",", ";")] = i
+
+        # Names which appear more than once can't be fetched
+        self._unique = len(self._lookup) == len(entries)
+
+    def get_path(self):
+        return self._path
+
+    def get_n_records(self):
+        return len(self._entries)
+
+    def contains(self, name):
+        return self._unique and name in self._lookup
+
+    def get_byte_range(self, name):
+        (raw_name, length, offset, line_bases, line_width) = self._entries[self._lookup[name]]
+
+        if length == 0:
+            return (offset, offset)
+
+        return (offset, offset + (length//line_bases)*line_width + length%line_bases)
+
+    def write(self, index_path):
+        with open(index_path, "w") as file:
+            for entry in self._entries:
+                file.write("%s\t%i\t%i\t%i\t%i\n" % entry)
+
+
+class FastaRanges():
+    # An uncompressed FASTA file split into byte ranges, so worker processes can each read, parse and hash part of the
+    # file.  Each record belongs to the range its header starts in, so ranges don't need to line up with records.
+    def __init__(self, path, repeat_filter="", range_size=1 << 16):
+        self._path = path
+        self._repeat_filter = repeat_filter
+        self._range_size = range_size
+        self._map = None
+        self._n_acc = 0
+        self._n_rej = 0
+
+    def __getstate__(self):
+        # Each process maps the file itself
+        state = self.__dict__.copy()
+        state['_map'] = None
+
+        return state
+
+    def get_path(self):
+        return self._path
+
+    def get_n_accepted(self):
+        return self._n_acc
+
+    def get_n_rejected(self):
+        return self._n_rej
+
+    def add_counts(self, n_acc, n_rej):
+        # Records are counted by whichever process collects the ranges
+        self._n_acc = self._n_acc + n_acc
+        self._n_rej = self._n_rej + n_rej
+
+    def iter_ranges(self):
+        size = os.path.getsize(self._path)
+        for start in range(0, size, self._range_size):
+            yield (start, min(start + self._range_size, size))
+
+    def read_range(self, start, end):
+        # Returns the accepted records whose header starts in the range and the number of rejected records
+        if self._map is None:
+            with open(self._path, "rb") as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (start, end) = (self._get_record_start(start), self._get_record_start(end))
+        if start >= end:
+            return ([], 0)
+
+        # Records are read in the same way as when streaming the whole file
+        reader = FileReader(verbose=False)
+        lines = io.StringIO(self._map[start:end].decode(), newline=None)
+        records = list(reader._iter_fasta_lines(lines, repeat_filter=self._repeat_filter))
+
+        return (records, reader.get_n_rejected())
+
+    def _get_record_start(self, pos):
+        # Position of the first header line starting at or after pos
+        if pos <= 0:
+            return 0
+
+        idx = self._map.find(b"\n>", pos - 1)
+
+        return idx + 1 if idx >= 0 else len(self._map)
+
+
+class BgzfReader(io.RawIOBase):
+    def __init__(self, path, n_threads=1):
+        self._file = open(path, "rb")
+        self._n_threads = n_threads
+        self._executor = ThreadPoolExecutor(max_workers=n_threads)
+        self._blocks = self._iter_blocks()
+        self._buffer = b""
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        # Moving onto the next block once the current one has been used up (empty blocks are skipped)
+        while self._offset >= len(self._buffer):
+            self._buffer = next(self._blocks, None)
+            self._offset = 0
+
+            if self._buffer is None:
+                self._buffer = b""
+                return 0
+
+        n = min(len(b), len(self._buffer) - self._offset)
+        b[0:n] = self._buffer[self._offset:self._offset + n]
+        self._offset = self._offset + n
+
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._executor.shutdown(cancel_futures=True)
+            self._file.close()
+
+        super().close()
+
+    def _iter_blocks(self):
+        # zlib releases the GIL while decompressing, so threads decompress blocks in parallel.  The number of
+        # blocks in flight is limited, so memory use doesn't depend on the file size.
+        pending = deque()
+        while True:
+            block = self._read_block()
+            if block is None:
+                break
+
+            pending.append(self._executor.submit(_decompress_bgzf_block, *block))
+
+            if len(pending) >= 4*self._n_threads:
+                yield pending.popleft().result()
+
+        while len(pending) > 0:
+            yield pending.popleft().result()
+
+    def _read_block(self):
+        header = self._file.read(12)
+        if len(header) == 0:
+            return None
+
+        if len(header) < 12 or header[0:4] != b"\x1f\x8b\x08\x04":
+            raise ValueError("Invalid BGZF block in \"%s\"" % self._file.name)
+
+        # Finding the block size in the extra subfields
+        xlen = struct.unpack("<H", header[10:12])[0]
+        extra = self._file.read(xlen)
+
+        bsize = None
+        pos = 0
+        while pos + 4 <= len(extra):
+            (si, slen) = (extra[pos:pos + 2], struct.unpack("<H", extra[pos + 2:pos + 4])[0])
+            if si == b"BC" and slen == 2:
+                bsize = struct.unpack("<H", extra[pos + 4:pos + 6])[0]
+            pos = pos + 4 + slen
+
+        if bsize is None:
+            raise ValueError("Invalid BGZF block in \"%s\"" % self._file.name)
+
+        cdata = self._file.read(bsize - xlen - 19)
+        (crc, isize) = struct.unpack("<II", self._file.read(8))
+
+        return (cdata, crc, isize)
+
+
+def _decompress_bgzf_block(cdata, crc, isize):
+    data = zlib.decompress(cdata, -15)
+
+    if len(data) != isize or zlib.crc32(data) != crc:
+        raise ValueError("Corrupted BGZF block")
+
+    return data
+
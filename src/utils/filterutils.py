@@ -0,0 +1,100 @@
+import ast
+import operator
+
+
+# Operators permitted in repeat filter expressions
+compare_ops = {ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Eq: operator.eq, ast.NotEq: operator.ne}
+binary_ops = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod}
+unary_ops = {ast.Not: operator.not_, ast.USub: operator.neg, ast.UAdd: operator.pos}
+
+
+class RepeatFilterError(ValueError):
+    # Raised when a repeat filter can't be evaluated for a particular number of repeats (e.g. "10/x>2" with no repeats)
+    pass
+
+
+def compile_repeat_filter(repeat_filter):
+    # An empty filter accepts every sequence
+    if repeat_filter.strip() == "":
+        return None
+
+    try:
+        tree = ast.parse(repeat_filter.strip(), mode="eval")
+    except SyntaxError:
+        raise ValueError("Unable to parse repeat filter \"%s\"" % repeat_filter)
+
+    # The expression is only parsed once, after which each sequence is checked with plain function calls
+    expression = _compile_node(tree.body, repeat_filter.strip())
+
+    return lambda x: _evaluate(expression, repeat_filter.strip(), x)
+
+def _compile_node(node, repeat_filter):
+    if isinstance(node, ast.Name) and node.id == "x":
+        return lambda x: x
+
+    elif isinstance(node, ast.Constant) and type(node.value) in (int, float, bool):
+        value = node.value
+        return lambda x: value
+
+    elif isinstance(node, ast.Compare) and all(type(op) in compare_ops for op in node.ops):
+        left = _compile_node(node.left, repeat_filter)
+        ops = [compare_ops[type(op)] for op in node.ops]
+        rights = [_compile_node(comparator, repeat_filter) for comparator in node.comparators]
+        return lambda x: _compare(left, ops, rights, x)
+
+    elif isinstance(node, ast.BoolOp):
+        values = [_compile_node(value, repeat_filter) for value in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda x: _and(values, x)
+        else:
+            return lambda x: _or(values, x)
+
+    elif isinstance(node, ast.BinOp) and type(node.op) in binary_ops:
+        op = binary_ops[type(node.op)]
+        left = _compile_node(node.left, repeat_filter)
+        right = _compile_node(node.right, repeat_filter)
+        return lambda x: op(left(x), right(x))
+
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in unary_ops:
+        op = unary_ops[type(node.op)]
+        operand = _compile_node(node.operand, repeat_filter)
+        return lambda x: op(operand(x))
+
+    segment = ast.get_source_segment(repeat_filter, node)
+    raise ValueError("Unsupported syntax \"%s\" in repeat filter \"%s\" (only 'x', numbers, arithmetic (+, -, *, /, // and %%), comparisons and 'and'/'or'/'not' are permitted)" % (segment, repeat_filter))
+
+def _evaluate(expression, repeat_filter, x):
+    try:
+        return bool(expression(x))
+    except (ZeroDivisionError, OverflowError) as e:
+        raise RepeatFilterError("Unable to evaluate repeat filter \"%s\" for %i repeats (%s)" % (repeat_filter, x, e))
+
+def _compare(left, ops, rights, x):
+    # Comparisons can be chained (e.g. "3<=x<10"), as in Python
+    value = left(x)
+    for (op, right) in zip(ops, rights):
+        next_value = right(x)
+        if not op(value, next_value):
+            return False
+
+        value = next_value
+
+    return True
+
+def _and(values, x):
+    result = True
+    for value in values:
+        result = value(x)
+        if not result:
+            return result
+
+    return result
+
+def _or(values, x):
+    result = False
+    for value in values:
+        result = value(x)
+        if result:
+            return result
+
+    return result
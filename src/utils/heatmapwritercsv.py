@@ -1,20 +1,37 @@
+from enum import Enum
 from utils import abstractmapwriter as amw
 from utils import fileutils as fu
 
+import numpy as np
 import os
 
 
+class FORMAT(Enum):
+    LONG = 'long'
+    WIDE = 'wide'
+
+    def __str__(self):
+        return str(self.value)
+
+
+# Approximate number of cells formatted at once for wide maps (limits memory use when writing large position ranges)
+block_size = 1 << 20
+
 class HeatMapWriterCSV(amw.AbstractMapWriter):
     ## CONSTRUCTOR
-    
-    def __init__(self, im_dim=800, event_label_decimal_places = 4, sum_show=True, count_show=True):
+
+    def __init__(self, im_dim=800, event_label_decimal_places = 4, sum_show=True, count_show=True, format=FORMAT.WIDE):
         self._im_dim = im_dim
-        
+
         self._number_format = "%%.%if" % event_label_decimal_places
         self._sum_show = sum_show
         self._count_show = count_show
+        self._format = format
 
     def write_map(self, out_path, freq, ref, pos_range, append_dt):
+        # Summarising the events once, so they don't need to be rescanned for each row
+        freq = amw.get_event_matrix(freq)
+
         # Getting pos ranges to plot based on available information
         pos_range = amw.get_double_pos_range(freq, ref, pos_range)
         if pos_range is None:
@@ -23,73 +40,92 @@ class HeatMapWriterCSV(amw.AbstractMapWriter):
         # Creating output CSV document
         root_name = os.path.splitext(out_path)[0]
         file = fu.open_file(root_name, '', 'csv', append_dt)
-                
-        # Determining total events in the given position range
-        sum_events = amw.get_sum_events(pos_range, freq)
-
-        # If showing sum, calculating relevant statistics
-        (freq_t, freq_b) = amw.get_full_sequence_summed_frequency(freq, pos_range)
 
-        # Initialising string
-        str = self._get_header_row(pos_range[0],pos_range[1])
-        file.write(str)
+        # Determining total events in the given position range
+        sum_events = freq.get_sum_events(pos_range)
 
-        # Iterating over each bottom-strand position and adding as a new row
-        for pos_b in range(pos_range[2], pos_range[3]+1):
-            str = self._get_row(freq, pos_b, pos_range[0], pos_range[1], sum_events, freq_b)
-            file.write(str)
+        if self._format is FORMAT.LONG:
+            self._write_long(file, pos_range, freq, sum_events)
+        else:
+            self._write_wide(file, pos_range, freq, sum_events)
 
-        # If necessary, showing the sum row
-        if self._sum_show:
-            str = self._get_sum_row(pos_range[0], pos_range[1], sum_events, freq_t)
-            file.write(str)
-
-        # If necessary, showing the totala event count
+        # If necessary, showing the total event count
         if self._count_show:
             # Adding a blank line
             file.write("\n")
             file.write(f"N = {sum_events}")
 
         file.close()
-               
-    def _get_header_row(self, pos_t_min, pos_t_max):
-        # The first element shows the axes
-        row = "B V : T >"
 
-        # Iterating over each top strand position
-        for pos_t in range(pos_t_min, pos_t_max+1):
-            row = row + "," + str(pos_t)
+    def _write_wide(self, file, pos_range, freq, sum_events):
+        (pos_t_min, pos_t_max, pos_b_min, pos_b_max) = pos_range
+        n_t = pos_t_max-pos_t_min+1
+        n_b = pos_b_max-pos_b_min+1
+        n_cols = n_t+1 if self._sum_show else n_t
 
-        # If showing sum row and column, add sum heading
+        file.write(self._get_header_row(pos_t_min, pos_t_max))
+
+        # Percentage for each event.  Split and non-split events at the same positions are added when filling the grid.
+        (t, b, split, count) = freq.get_event_arrays(pos_range)
+        event_pc = 100*count/sum_events
+
+        # Sorting events by bottom strand position, so each block of rows only needs a slice of them
+        order = np.argsort(b, kind="stable")
+        (t, b, event_pc) = (t[order], b[order], event_pc[order])
+
+        (freq_t, freq_b) = freq.get_summed_frequency(pos_range)
+        sum_pc_b = _get_sum_pc(freq_b, pos_b_min, n_b, sum_events)
+
+        # Each row starts with the bottom strand position, followed by the percentage in each column
+        row_format = "%i" + ("," + self._number_format)*n_cols + "\n"
+
+        rows_per_block = max(1, block_size//n_cols)
+        for block_b_min in range(pos_b_min, pos_b_max+1, rows_per_block):
+            block_b_max = min(block_b_min+rows_per_block-1, pos_b_max)
+            lo = np.searchsorted(b, block_b_min, side="left")
+            hi = np.searchsorted(b, block_b_max, side="right")
+
+            grid = np.zeros((block_b_max-block_b_min+1, n_cols+1))
+            grid[:,0] = np.arange(block_b_min, block_b_max+1)
+            np.add.at(grid, (b[lo:hi]-block_b_min, t[lo:hi]-pos_t_min+1), event_pc[lo:hi])
+
+            if self._sum_show:
+                grid[:,-1] = sum_pc_b[block_b_min-pos_b_min:block_b_max-pos_b_min+1]
+
+            file.write("".join(row_format % tuple(row) for row in grid.tolist()))
+
+        # If necessary, showing the sum row
         if self._sum_show:
-            row = row + ",Sum"
+            sum_pc_t = _get_sum_pc(freq_t, pos_t_min, n_t, sum_events)
+            file.write(("Sum" + ("," + self._number_format)*n_t + "\n") % tuple(sum_pc_t.tolist()))
 
-        # Returning with an end line character
-        return row + "\n"
-    
-    def _get_row(self, freq, pos_b, pos_t_min, pos_t_max, sum_events, freq_b=None):
-        # The first element of the row is the bottom strand index
-        row = str(pos_b)
+    def _write_long(self, file, pos_range, freq, sum_events):
+        # Only events within the range are written (one row each), so sum options don't apply
+        file.write("TOP_POS,BOTTOM_POS,SPLIT_SEQ,COUNT,EVENT_%\n")
+
+        (t, b, split, count) = freq.get_event_arrays(pos_range)
+        order = np.lexsort((split, b, t))
+        event_pc = 100*count[order]/sum_events
 
-        # Iterating over each top-strand position, adding as a new column
-        for pos_t in range(pos_t_min, pos_t_max+1):
-            event_pc = amw.get_event_pc((pos_t,pos_b,True), freq, sum_events) + amw.get_event_pc((pos_t,pos_b,False), freq, sum_events)
-            row = row + "," + str(self._number_format % event_pc)
+        row_format = "%i,%i,%s,%i," + self._number_format + "\n"
+        rows = zip(t[order].tolist(), b[order].tolist(), split[order].tolist(), count[order].tolist(), event_pc.tolist())
+        file.write("".join(row_format % row for row in rows))
+
+    def _get_header_row(self, pos_t_min, pos_t_max):
+        # The first element shows the axes, followed by each top strand position
+        row = "B V : T >," + ",".join(str(pos_t) for pos_t in range(pos_t_min, pos_t_max+1))
 
-        # Adding sum if necessary
+        # If showing sum row and column, add sum heading
         if self._sum_show:
-            event_pc = amw.get_event_pc(pos_b, freq_b, sum_events)
-            row = row + "," + str(self._number_format % event_pc)
+            row = row + ",Sum"
 
+        # Returning with an end line character
         return row + "\n"
 
-    def _get_sum_row(self, pos_t_min, pos_t_max, sum_events, freq_t):
-        # The first element of the row is the word "Sum"
-        row = "Sum"
-
-        # Adding the sum for each columns
-        for pos_t in range(pos_t_min, pos_t_max+1):
-            event_pc = amw.get_event_pc(pos_t, freq_t, sum_events)
-            row = row + "," + str(self._number_format % event_pc)
+def _get_sum_pc(freq, pos_min, n_pos, sum_events):
+    # Percentage of events at each position (from pos_min) in a summed frequency dict
+    sum_pc = np.zeros(n_pos)
+    if len(freq) > 0:
+        sum_pc[np.array(list(freq.keys()), dtype=np.int64)-pos_min] = 100*np.array(list(freq.values()), dtype=np.int64)/sum_events
 
-        return row + "\n"
\ No newline at end of file
+    return sum_pc
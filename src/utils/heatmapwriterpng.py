@@ -0,0 +1,136 @@
+from matplotlib import cm
+from matplotlib import colors
+from PIL import Image
+from utils import abstractmapwriter as amw
+
+import datetime as dt
+import math
+import numpy as np
+import os
+
+
+class HeatMapWriterPNG(amw.AbstractMapWriter):
+    # Raster equivalent of HeatMapWriterSVG.  Each cell is drawn as a square block of pixels, so file size and render
+    # time depend only on the position range, not the number of events.  Where there are more positions than pixels,
+    # each pixel shows the largest count in a square block of cells, so the image is never larger than im_dim.  Labels,
+    # borders and event percentages aren't rendered; the SVG writer should be used where these are needed.
+
+    ## CONSTRUCTOR
+
+    def __init__(self, im_dim=800, grid_opts=(True,1,"gray",1), event_colourmap="plasma", sum_show=True, n_colours=256):
+        # Cells are scaled up to fill im_dim where possible, or combined so the map fits within it
+        self._im_dim = im_dim
+
+        self._grid_show = grid_opts[0]
+        self._grid_size = grid_opts[1]
+        self._grid_colour = grid_opts[2]
+        self._grid_interval = grid_opts[3]
+
+        self._event_colourmap = event_colourmap
+        self._cmap = cm.get_cmap(event_colourmap)
+        self._n_colours = n_colours
+
+        self._sum_show = sum_show
+
+    def write_map(self, out_path, freq, ref, pos_range, append_dt):
+        # Summarising the events once, so they don't need to be rescanned for each part of the map
+        freq = amw.get_event_matrix(freq)
+
+        # Getting pos ranges to plot based on available information
+        pos_range = amw.get_double_pos_range(freq, ref, pos_range)
+        if pos_range is None:
+            return
+
+        root_name = os.path.splitext(out_path)[0]
+        datetime_str = dt.datetime.now().strftime("_%Y-%m-%d_%H-%M-%S") if append_dt else ""
+        outname = root_name+ datetime_str + '.' + 'png'
+
+        (pos_t_min, pos_t_max, pos_b_min, pos_b_max) = pos_range
+        n_t = pos_t_max-pos_t_min+1
+        n_b = pos_b_max-pos_b_min+1
+        # Pixels along each side of a cell and the number of positions along each side of the square block of cells shown
+        # by each pixel (one of these is always 1).  The sum row and column are included, so the image fits within im_dim.
+        n_sum = 1 if self._sum_show else 0
+        n_max = max(n_t, n_b)
+        event_dim = max(1, self._im_dim//(n_max+n_sum))
+        block_dim = math.ceil(n_max/max(1, self._im_dim-n_sum)) if n_max+n_sum > self._im_dim else 1
+
+        # Filling array of palette indices (one per pixel, with rows corresponding to bottom strand positions).  The sum
+        # row and column are added as an extra row and column.  Only colours used in the map are included in the palette,
+        # so the image can be stored with one byte per pixel and there is (usually) space left for the grid colour.
+        lut = amw.get_colourmap_lut(self._cmap, self._n_colours)
+        lut_idx = amw.get_colourmap_index(self._get_counts(pos_range, freq, block_dim), freq.get_max_events(pos_range, self._sum_show), len(lut))
+
+        (used_idx, palette_idx) = np.unique(np.append(lut_idx, 0), return_inverse=True)
+        palette = lut[used_idx]
+        if self._grid_show:
+            palette = np.vstack((palette, _get_rgb(self._grid_colour)))
+
+        im = palette_idx.reshape(-1)[:-1].reshape(lut_idx.shape).astype(np.uint8 if len(palette) <= 256 else np.uint16)
+        if event_dim > 1:
+            im = np.repeat(np.repeat(im, event_dim, axis=0), event_dim, axis=1)
+
+        if self._grid_show:
+            self._add_grid_lines(im, pos_range, event_dim, block_dim, len(palette)-1)
+
+        # Falling back to a full RGB image if the colours don't fit in a palette
+        if len(palette) <= 256:
+            im = Image.fromarray(im)
+            im.putpalette(palette.tobytes())
+        else:
+            im = Image.fromarray(palette[im])
+
+        im.save(outname)
+
+    def _get_counts(self, pos_range, freq, block_dim):
+        # Largest count in each block of cells, with the sum row and column (if shown) added after the last row and
+        # column.  Taking the largest count keeps colours on the same scale as unblocked maps, so isolated events remain
+        # visible.
+        (pos_t_min, pos_t_max, pos_b_min, pos_b_max) = pos_range
+        n_t = math.ceil((pos_t_max-pos_t_min+1)/block_dim)
+        n_b = math.ceil((pos_b_max-pos_b_min+1)/block_dim)
+        n_sum = 1 if self._sum_show else 0
+
+        counts = np.zeros((n_b+n_sum, n_t+n_sum), dtype=np.int64)
+
+        (cells_t, cells_b, cell_counts) = freq.get_cell_arrays(pos_range)
+        np.maximum.at(counts, ((cells_b-pos_b_min)//block_dim, (cells_t-pos_t_min)//block_dim), cell_counts)
+
+        if self._sum_show:
+            (freq_t, freq_b) = freq.get_summed_frequency(pos_range)
+
+            cols = (np.array(list(freq_t.keys()), dtype=np.int64)-pos_t_min)//block_dim
+            np.maximum.at(counts, (np.full(len(freq_t), n_b), cols), np.array(list(freq_t.values()), dtype=np.int64))
+
+            rows = (np.array(list(freq_b.keys()), dtype=np.int64)-pos_b_min)//block_dim
+            np.maximum.at(counts, (rows, np.full(len(freq_b), n_t)), np.array(list(freq_b.values()), dtype=np.int64))
+
+        return counts
+
+    def _add_grid_lines(self, im, pos_range, event_dim, block_dim, grid_idx):
+        (pos_t_min, pos_t_max, pos_b_min, pos_b_max) = pos_range
+
+        # Lines are drawn along the left and top edges of each cell at a grid position (as in the SVG writer), with a
+        # width of at least one pixel
+        grid_w = max(1, int(round(self._grid_size)))
+
+        # Where cells are combined, lines closer together than their width would cover the map, so aren't drawn
+        if block_dim > 1 and self._grid_interval < block_dim*(grid_w+1):
+            return
+
+        grid_pos_t_min = self._grid_interval*math.ceil(pos_t_min/self._grid_interval)
+        for grid_pos_t in range(grid_pos_t_min, pos_t_max+1, self._grid_interval):
+            grid_x = ((grid_pos_t-pos_t_min)//block_dim)*event_dim
+            im[:, grid_x:grid_x+grid_w] = grid_idx
+
+        grid_pos_b_min = self._grid_interval*math.ceil(pos_b_min/self._grid_interval)
+        for grid_pos_b in range(grid_pos_b_min, pos_b_max+1, self._grid_interval):
+            grid_y = ((grid_pos_b-pos_b_min)//block_dim)*event_dim
+            im[grid_y:grid_y+grid_w, :] = grid_idx
+
+def _get_rgb(colour):
+    # Colours can also be given in the SVG "rgb(r,g,b)" form accepted by the other writers
+    if colour.startswith("rgb("):
+        return np.array([int(value) for value in colour[4:-1].split(",")], dtype=np.uint8)
+
+    return (np.array(colors.to_rgb(colour))*255).astype(np.uint8)
@@ -1,16 +1,16 @@
 from matplotlib import cm
 from utils import abstractmapwriter as amw
+from utils import svgstreamwriter as ssw
 
 import datetime as dt
 import math
 import os
-import svgwrite as svg
 
 
 class HeatMapWriterSVG(amw.AbstractMapWriter):
     ## CONSTRUCTOR
 
-    def __init__(self, im_dim=800, font="Arial", rel_pos=(0.1,0.1,0.8), border_opts=(True,1,"black"), axis_label_opts=(True,16,"gray",50), grid_opts=(True,1,"gray",1), grid_label_opts=(True,12,"gray",10,10), event_colourmap="plasma", event_label_opts=(True,10,"invert",1,True), sum_show=True):
+    def __init__(self, im_dim=800, font="Arial", rel_pos=(0.1,0.1,0.8), border_opts=(True,1,"black"), axis_label_opts=(True,16,"gray",50), grid_opts=(True,1,"gray",1), grid_label_opts=(True,12,"gray",10,10), event_colourmap="plasma", event_label_opts=(True,10,"invert",1,True), sum_show=True, n_colours=256):
         self._im_dim = im_dim
 
         self._font = font
@@ -41,6 +41,7 @@ class HeatMapWriterSVG(amw.AbstractMapWriter):
 
         self._event_colourmap = event_colourmap
         self._cmap = cm.get_cmap(event_colourmap)
+        self._n_colours = n_colours
         
         self._event_label_show = event_label_opts[0]
         self._event_label_size = event_label_opts[1]
@@ -51,6 +52,9 @@ class HeatMapWriterSVG(amw.AbstractMapWriter):
         self._sum_show = sum_show
 
     def write_map(self, out_path, freq, ref, pos_range, append_dt):
+        # Summarising the events once, so they don't need to be rescanned for each part of the map
+        freq = amw.get_event_matrix(freq)
+
         # Getting pos ranges to plot based on available information
         pos_range = amw.get_double_pos_range(freq, ref, pos_range)
         if pos_range is None:
@@ -61,8 +65,6 @@ class HeatMapWriterSVG(amw.AbstractMapWriter):
         datetime_str = dt.datetime.now().strftime("_%Y-%m-%d_%H-%M-%S") if append_dt else ""
         outname = root_name+ datetime_str + '.' + 'svg'
         
-        dwg = svg.Drawing(outname, size = ("%spx" % self._im_dim, "%spx" % self._im_dim), **{'shape-rendering':'crispEdges'})
-        
         # Defining limits of heat map
         pos_t_range = pos_range[1]-pos_range[0]
         pos_b_range = pos_range[3]-pos_range[2]
@@ -76,22 +78,35 @@ class HeatMapWriterSVG(amw.AbstractMapWriter):
         map_y2 = map_y1 + self._im_dim*self._map_rel_size*pos_b_rel_size
         map_xy = (map_x1, map_y1, map_x2, map_y2)
 
-        self._add_events(dwg, pos_range, map_xy, freq)
+        # Colours are only calculated once per render, then looked up for each event
+        self._colours = amw.get_colour_strings(self._cmap, self._n_colours)
+        self._inverted_colours = amw.get_colour_strings(self._cmap, self._n_colours, invert=True)
+
+        # Elements are written to file as they're added
+        with ssw.SVGStreamWriter(outname, ("%spx" % self._im_dim, "%spx" % self._im_dim), styles=self._get_styles(), **{'shape-rendering':'crispEdges'}) as dwg:
+            self._add_events(dwg, pos_range, map_xy, freq)
 
-        if self._axis_label_show:
-            self._add_axis_labels(dwg, map_xy)
+            if self._axis_label_show:
+                self._add_axis_labels(dwg, map_xy)
 
-        if self._grid_show:
-            self._add_grid_lines(dwg, pos_range, map_xy)
+            if self._grid_show:
+                self._add_grid_lines(dwg, pos_range, map_xy)
 
-        if self._grid_label_show:
-            self._add_grid_labels(dwg, pos_range, map_xy)
-                
-        if self._border_show:
-            self._add_border(dwg, pos_range, map_xy)
+            if self._grid_label_show:
+                self._add_grid_labels(dwg, pos_range, map_xy)
 
-        # Writing SVG to file
-        dwg.save()
+            if self._border_show:
+                self._add_border(dwg, pos_range, map_xy)
+
+    def _get_styles(self):
+        # Text styles shared by all labels of each type
+        styles = {}
+        styles["axis_label"] = f"text-anchor:middle;font-family:{self._font}"
+        styles["grid_label_t"] = f"text-anchor:start;font-family:{self._font};dominant-baseline:central"
+        styles["grid_label_b"] = f"text-anchor:end;font-family:{self._font};dominant-baseline:central"
+        styles["event_label"] = f"text-anchor:middle;font-family:{self._font};dominant-baseline:central"
+
+        return styles
 
     def _add_axis_labels(self, dwg, map_xy):
         (map_x1, map_y1, map_x2, map_y2) = map_xy
@@ -99,13 +114,13 @@ class HeatMapWriterSVG(amw.AbstractMapWriter):
         # Adding top-strand label
         axis_label_x = (map_x2-map_x1)/2 + map_x1
         axis_label_y = map_y1 - self._axis_label_gap
-        dwg.add(svg.text.Text("Top strand", insert=(axis_label_x,axis_label_y), style=f"text-anchor:middle;font-family:{self._font}", font_size=self._axis_label_size, fill=self._axis_label_colour))
+        dwg.add_text("Top strand", insert=(axis_label_x,axis_label_y), class_="axis_label", font_size=self._axis_label_size, fill=self._axis_label_colour)
 
         # Adding bottom-strand label
         axis_label_x = map_x1 - self._axis_label_gap
         axis_label_y = (map_y2-map_y1)/2 + map_y1
         rot = "rotate(%i,%i,%i)" % (-90,axis_label_x,axis_label_y)
-        dwg.add(svg.text.Text("Bottom strand", insert=(axis_label_x,axis_label_y), transform=rot, style=f"text-anchor:middle;font-family:{self._font}", font_size=self._axis_label_size, fill=self._axis_label_colour))
+        dwg.add_text("Bottom strand", insert=(axis_label_x,axis_label_y), transform=rot, class_="axis_label", font_size=self._axis_label_size, fill=self._axis_label_colour)
 
     def _add_border(self, dwg, pos_range, map_xy):
         (pos_t_min, pos_t_max, pos_b_min, pos_b_max) = pos_range
@@ -114,15 +129,15 @@ class HeatMapWriterSVG(amw.AbstractMapWriter):
         map_h = map_y2-map_y1
 
         # Adding border rectangle
-        dwg.add(svg.shapes.Rect(insert=(map_x1,map_y1), size=(map_w,map_h), fill='none', stroke=self._border_colour, stroke_width=self._border_size))
+        dwg.add_rect(insert=(map_x1,map_y1), size=(map_w,map_h), fill='none', stroke=self._border_colour, stroke_width=self._border_size)
 
         # Adding extra border if sum column and row are to be shown
         if self._sum_show:
             # Determine event size
             event_dim = (map_x2-map_x1)/(pos_t_max-pos_t_min+1)
 
-            dwg.add(svg.shapes.Rect(insert=(map_x1+map_w,map_y1), size=(event_dim,map_h), fill='none', stroke=self._border_colour, stroke_width=self._border_size))
-            dwg.add(svg.shapes.Rect(insert=(map_x1,map_y1+map_h), size=(map_w,event_dim), fill='none', stroke=self._border_colour, stroke_width=self._border_size))
+            dwg.add_rect(insert=(map_x1+map_w,map_y1), size=(event_dim,map_h), fill='none', stroke=self._border_colour, stroke_width=self._border_size)
+            dwg.add_rect(insert=(map_x1,map_y1+map_h), size=(map_w,event_dim), fill='none', stroke=self._border_colour, stroke_width=self._border_size)
         
     def _add_grid_lines(self, dwg, pos_range, map_xy):
         (pos_t_min, pos_t_max, pos_b_min, pos_b_max) = pos_range
@@ -140,7 +155,7 @@ class HeatMapWriterSVG(amw.AbstractMapWriter):
         # Adding vertical grid lines
         for grid_pos_t in range(grid_pos_t_min, grid_pos_t_max, self._grid_interval):
             grid_x = map_x1 + (map_x2-map_x1)*((grid_pos_t-pos_t_min)/(pos_t_max-pos_t_min+1))
-            dwg.add(svg.shapes.Line((grid_x, map_y1), (grid_x, map_y2+event_dim), stroke=self._grid_colour, stroke_width=self._grid_size))
+            dwg.add_line((grid_x, map_y1), (grid_x, map_y2+event_dim), stroke=self._grid_colour, stroke_width=self._grid_size)
 
         # Getting range of horizontal grid lines
         grid_pos_b_min = self._grid_interval*math.ceil(pos_b_min/self._grid_interval)
@@ -151,7 +166,7 @@ class HeatMapWriterSVG(amw.AbstractMapWriter):
         # Adding horizontal grid lines
         for grid_pos_b in range(grid_pos_b_min, grid_pos_b_max, self._grid_interval):
             grid_y = map_y1 + (map_y2-map_y1)*((grid_pos_b-pos_b_min)/(pos_b_max-pos_b_min+1))
-            dwg.add(svg.shapes.Line((map_x1, grid_y), (map_x2+event_dim, grid_y), stroke=self._grid_colour, stroke_width=self._grid_size))
+            dwg.add_line((map_x1, grid_y), (map_x2+event_dim, grid_y), stroke=self._grid_colour, stroke_width=self._grid_size)
 
     def _add_grid_labels(self, dwg, pos_range, map_xy):
         (pos_t_min, pos_t_max, pos_b_min, pos_b_max) = pos_range
@@ -171,7 +186,7 @@ class HeatMapWriterSVG(amw.AbstractMapWriter):
             grid_label_x = map_x1 + (map_x2-map_x1)*(((grid_label_pos_t+0.5)-pos_t_min)/(pos_t_max-pos_t_min+1))
             grid_label_y = map_y1-self._border_size/2-self._grid_label_gap
             rot = "rotate(%i,%i,%i)" % (-90,grid_label_x,grid_label_y)
-            dwg.add(svg.text.Text(str(grid_label_pos_t), insert=(grid_label_x,grid_label_y), transform=rot, style=f"text-anchor:start;font-family:{self._font};dominant-baseline:central", font_size=self._grid_label_size, fill=self._grid_label_colour))
+            dwg.add_text(str(grid_label_pos_t), insert=(grid_label_x,grid_label_y), transform=rot, class_="grid_label_t", font_size=self._grid_label_size, fill=self._grid_label_colour)
 
         # Getting range of horizontal grid label positions
         grid_label_pos_b_min = self._grid_label_interval*math.ceil(pos_b_min/self._grid_label_interval)
@@ -183,7 +198,7 @@ class HeatMapWriterSVG(amw.AbstractMapWriter):
         for grid_label_pos_b in range(grid_label_pos_b_min, grid_label_pos_b_max, self._grid_label_interval):
             grid_label_x = map_x1-self._border_size/2-self._grid_label_gap
             grid_label_y = map_y1 + (map_y2-map_y1)*(((grid_label_pos_b+0.5)-pos_b_min)/(pos_b_max-pos_b_min+1))
-            dwg.add(svg.text.Text(str(grid_label_pos_b), insert=(grid_label_x,grid_label_y), style=f"text-anchor:end;font-family:{self._font};dominant-baseline:central", font_size=self._grid_label_size, fill=self._grid_label_colour))
+            dwg.add_text(str(grid_label_pos_b), insert=(grid_label_x,grid_label_y), class_="grid_label_b", font_size=self._grid_label_size, fill=self._grid_label_colour)
 
         # Adding sum labels if sum column and row are to be shown
         if self._sum_show:
@@ -191,12 +206,12 @@ class HeatMapWriterSVG(amw.AbstractMapWriter):
             grid_label_x = map_x2 + event_dim/2
             grid_label_y = map_y1-self._border_size/2-self._grid_label_gap
             rot = "rotate(%i,%i,%i)" % (-90,grid_label_x,grid_label_y)
-            dwg.add(svg.text.Text("Sum", insert=(grid_label_x,grid_label_y), transform=rot, style=f"text-anchor:start;font-family:{self._font};dominant-baseline:central", font_size=self._grid_label_size, fill=self._grid_label_colour))
+            dwg.add_text("Sum", insert=(grid_label_x,grid_label_y), transform=rot, class_="grid_label_t", font_size=self._grid_label_size, fill=self._grid_label_colour)
 
             # Adding bottom strand sum label
             grid_label_x = map_x1-self._border_size/2-self._grid_label_gap
             grid_label_y = map_y2 + event_dim/2
-            dwg.add(svg.text.Text("Sum", insert=(grid_label_x,grid_label_y), style=f"text-anchor:end;font-family:{self._font};dominant-baseline:central", font_size=self._grid_label_size, fill=self._grid_label_colour))
+            dwg.add_text("Sum", insert=(grid_label_x,grid_label_y), class_="grid_label_b", font_size=self._grid_label_size, fill=self._grid_label_colour)
 
     def _add_events(self, dwg, pos_range, map_xy, freq):
         (pos_t_min, pos_t_max, pos_b_min, pos_b_max) = pos_range
@@ -204,52 +219,63 @@ class HeatMapWriterSVG(amw.AbstractMapWriter):
         event_dim = (map_x2-map_x1)/(pos_t_max-pos_t_min+1)
 
         # Determining total events and maximum number in a cell
-        max_events = amw.get_max_events(pos_range, freq, self._sum_show)
-        sum_events = amw.get_sum_events(pos_range, freq)
+        max_events = freq.get_max_events(pos_range, self._sum_show)
+        sum_events = freq.get_sum_events(pos_range)
+        cell_counts = freq.get_cell_counts(pos_range)
 
         # Adding background
         self._add_background(dwg, pos_range, map_xy)
         
-        # Adding events
-        for pos_t in range(pos_t_min,pos_t_max+1):
-            for pos_b in range(pos_b_min,pos_b_max+1):  
-                event_x1 = map_x1 + (map_x2-map_x1)*((pos_t-pos_t_min)/(pos_t_max-pos_t_min+1))
-                event_y1 = map_y1 + (map_y2-map_y1)*((pos_b-pos_b_min)/(pos_b_max-pos_b_min+1))
+        # Adding events.  Only cells containing events are drawn, unless every cell needs a label (cells are visited in
+        # the same order either way).
+        if self._event_label_show and self._event_label_zeros_show:
+            cells = ((pos_t,pos_b) for pos_t in range(pos_t_min,pos_t_max+1) for pos_b in range(pos_b_min,pos_b_max+1))
+        else:
+            cells = sorted(cell_counts.keys())
 
-                norm_count = amw.get_event_norm_count((pos_t,pos_b,True), freq, max_events) + amw.get_event_norm_count((pos_t,pos_b,False), freq, max_events)
-                event_pc = amw.get_event_pc((pos_t,pos_b,True), freq, sum_events) + amw.get_event_pc((pos_t,pos_b,False), freq, sum_events)
-                if (pos_t,pos_b,True) in freq.keys() or (pos_t,pos_b,False) in freq.keys():                    
-                    self._add_event(dwg, event_x1, event_y1, event_dim, norm_count)
+        for (pos_t,pos_b) in cells:
+            event_x1 = map_x1 + (map_x2-map_x1)*((pos_t-pos_t_min)/(pos_t_max-pos_t_min+1))
+            event_y1 = map_y1 + (map_y2-map_y1)*((pos_b-pos_b_min)/(pos_b_max-pos_b_min+1))
 
-                if self._event_label_show and (((pos_t,pos_b,True) in freq.keys() or ((pos_t,pos_b,False) in freq.keys())) or self._event_label_zeros_show):
-                    self._add_event_label(dwg, event_x1, event_y1, event_dim, norm_count, event_pc)
+            cell_count = cell_counts.get((pos_t,pos_b), (0,0))
+            norm_count = amw.get_cell_norm_count(cell_count, max_events)
+            event_pc = amw.get_cell_pc(cell_count, sum_events)
+            if (pos_t,pos_b) in cell_counts:
+                self._add_event(dwg, event_x1, event_y1, event_dim, norm_count)
+
+            if self._event_label_show and ((pos_t,pos_b) in cell_counts or self._event_label_zeros_show):
+                self._add_event_label(dwg, event_x1, event_y1, event_dim, norm_count, event_pc)
                     
-        # If enabled, showing sum row and column
+        # If enabled, showing sum row and column (again, only visiting positions without events if they're shown)
         if self._sum_show:
-            (freq_t, freq_b) = amw.get_full_sequence_summed_frequency(freq, pos_range)
+            (freq_t, freq_b) = freq.get_summed_frequency(pos_range)
+
+            zeros_show = self._event_label_show and self._event_label_zeros_show
+            positions_t = range(pos_t_min,pos_t_max+1) if zeros_show else sorted(freq_t.keys())
+            positions_b = range(pos_b_min,pos_b_max+1) if zeros_show else sorted(freq_b.keys())
 
-            for pos_t in range(pos_t_min,pos_t_max+1):
+            for pos_t in positions_t:
                 event_x1 = map_x1 + (map_x2-map_x1)*((pos_t-pos_t_min)/(pos_t_max-pos_t_min+1))
                 event_y1 = map_y2
 
                 norm_count = amw.get_event_norm_count(pos_t, freq_t, max_events)
                 event_pc = amw.get_event_pc(pos_t, freq_t, sum_events)
-                if pos_t in freq_t or self._event_label_zeros_show:                    
+                if pos_t in freq_t or zeros_show:
                     self._add_event(dwg, event_x1, event_y1, event_dim, norm_count)
 
-                if self._event_label_show and (pos_t in freq_t or self._event_label_zeros_show):
+                if self._event_label_show and (pos_t in freq_t or zeros_show):
                     self._add_event_label(dwg, event_x1, event_y1, event_dim, norm_count, event_pc)
 
-            for pos_b in range(pos_b_min,pos_b_max+1):
+            for pos_b in positions_b:
                 event_x1 = map_x2
                 event_y1 = map_y1 + (map_y2-map_y1)*((pos_b-pos_b_min)/(pos_b_max-pos_b_min+1))
 
                 norm_count = amw.get_event_norm_count(pos_b, freq_b, max_events)
                 event_pc = amw.get_event_pc(pos_b, freq_b, sum_events)
-                if pos_b in freq_b or self._event_label_zeros_show:
+                if pos_b in freq_b or zeros_show:
                     self._add_event(dwg, event_x1, event_y1, event_dim, norm_count)
 
-                if self._event_label_show and (pos_b in freq_b or self._event_label_zeros_show):
+                if self._event_label_show and (pos_b in freq_b or zeros_show):
                     self._add_event_label(dwg, event_x1, event_y1, event_dim, norm_count, event_pc)
         
     def _add_background(self, dwg, pos_range, map_xy):
@@ -259,30 +285,27 @@ class HeatMapWriterSVG(amw.AbstractMapWriter):
         map_w = map_x2-map_x1
         map_h = map_y2-map_y1
 
-        rgba = self._cmap(0)
-        col = "rgb(%i,%i,%i)" % (rgba[0]*255,rgba[1]*255,rgba[2]*255)
-        dwg.add(svg.shapes.Rect(insert=(map_x1,map_y1), size=(map_w,map_h), fill=col, stroke='none'))
+        col = self._colours[0]
+        dwg.add_rect(insert=(map_x1,map_y1), size=(map_w,map_h), fill=col, stroke='none')
 
         if self._sum_show:
             event_dim = (map_x2-map_x1)/(pos_t_max-pos_t_min+1)
-            dwg.add(svg.shapes.Rect(insert=(map_x1+map_w,map_y1), size=(event_dim,map_h), fill=col, stroke='none'))
-            dwg.add(svg.shapes.Rect(insert=(map_x1,map_y1+map_h), size=(map_w,event_dim), fill=col, stroke='none'))            
+            dwg.add_rect(insert=(map_x1+map_w,map_y1), size=(event_dim,map_h), fill=col, stroke='none')
+            dwg.add_rect(insert=(map_x1,map_y1+map_h), size=(map_w,event_dim), fill=col, stroke='none')
 
     def _add_event(self, dwg, event_x1, event_y1, event_dim, norm_count):
-        rgba = self._cmap(norm_count)
-        col = "rgb(%i,%i,%i)" % (rgba[0]*255,rgba[1]*255,rgba[2]*255)
+        col = self._colours[amw.get_colour_index(norm_count, self._n_colours)]
         
-        dwg.add(svg.shapes.Rect(insert=(event_x1,event_y1), size=(event_dim,event_dim), fill=col, stroke='none'))
+        dwg.add_rect(insert=(event_x1,event_y1), size=(event_dim,event_dim), fill=col, stroke='none')
 
     def _add_event_label(self, dwg, event_x1, event_y1, event_dim, norm_count, event_pc):
         event_label_x = event_x1 + event_dim/2
         event_label_y = event_y1 + event_dim/2
         
         if self._event_label_colour == "invert":
-            rgba = self._cmap(norm_count)
-            col = "rgb(%i,%i,%i)" % (255-(rgba[0]*255),255-(rgba[1]*255),255-(rgba[2]*255))
+            col = self._inverted_colours[amw.get_colour_index(norm_count, self._n_colours)]
         else:
             col = self._event_label_colour
 
-        dwg.add(svg.text.Text(self._event_label_number_format % event_pc, insert=(event_label_x,event_label_y), style=f"text-anchor:middle;font-family:{self._font};dominant-baseline:central", font_size=self._event_label_size, fill=col))
+        dwg.add_text(self._event_label_number_format % event_pc, insert=(event_label_x,event_label_y), class_="event_label", font_size=self._event_label_size, fill=col)
     
@@ -0,0 +1,250 @@
+import itertools
+import multiprocessing as mp
+
+from collections import deque
+from utils import dedupstore as ds
+from utils import errorstore as es
+from utils import sequenceutils as su
+from utils import statsstore as ss
+
+
+# Each worker process keeps its own searcher and sequences, so these only need sending once
+_worker_state = {}
+
+def iter_cleavage_positions(searcher, ref, cass, tests, jobs=1, chunk_size=50, error_store=None, dedup_store=None, ranges=None, result_cache=None, start=0):
+    if dedup_store is None:
+        dedup_store = ds.DedupStore()
+
+    # Worker processes read sequences from uncompressed FASTA files themselves (in which case tests isn't used)
+    if jobs > 1:
+        return _iter_parallel(searcher, ref, cass, tests, jobs, chunk_size, error_store, dedup_store, ranges, result_cache, start)
+
+    # Sequences before the start (e.g. those already processed before resuming) are read, but not searched
+    items = itertools.islice(enumerate(tests), start, None)
+
+    return _iter_serial(searcher, ref, cass, items, error_store, dedup_store, result_cache)
+
+def _iter_serial(searcher, ref, cass, items, error_store, dedup_store, result_cache):
+    for iteration, test in items:
+        _print_progress(searcher, iteration, test)
+
+        # Identical sequences are only searched once, with the stored result reused for any repeats
+        key = ds.get_key(test[0])
+        result = dedup_store.get_result(key)
+        if result is not None:
+            if searcher.get_verbose():
+                print("        Identical to an earlier sequence")
+
+        else:
+            result = _get_cached_result(key, dedup_store, result_cache)
+            if result is not None:
+                if searcher.get_verbose():
+                    print("        Found in result cache")
+
+            else:
+                result = _search(searcher, ref, cass, test[0], key, dedup_store, result_cache)
+
+        yield (iteration, test, _use_result(result, error_store))
+
+def _iter_parallel(searcher, ref, cass, tests, jobs, chunk_size, error_store, dedup_store, ranges, result_cache, start):
+    initargs = (ref, cass, searcher.get_max_gap(), searcher.get_min_quality(), searcher.get_num_bases(), searcher.get_cache_size(), ranges)
+
+    with mp.Pool(processes=jobs, initializer=_init_worker, initargs=initargs) as pool:
+        if ranges is not None:
+            chunks = _iter_range_chunks(pool, ranges, jobs, start)
+        else:
+            chunks = _iter_item_chunks(itertools.islice(enumerate(tests), start, None), chunk_size)
+
+        pending = deque()
+        pending_results = {}
+
+        for (chunk, keys, source) in chunks:
+            # Only searching sequences which haven't already been searched, sent to a worker or stored in the result
+            # cache.  Results which are already known are held with the chunk (with those being searched for an earlier
+            # chunk taken from that chunk once it's collected), so they're still available if removed from the dedup
+            # store in the meantime.
+            new_idx = []
+            chunk_results = {}
+            earlier_results = {}
+            for (i, key) in enumerate(keys):
+                if key in chunk_results or key in earlier_results:
+                    continue
+
+                if key in pending_results:
+                    earlier_results[key] = pending_results[key]
+                    continue
+
+                result = dedup_store.get_result(key, count=False)
+                if result is None and result_cache is not None:
+                    result = result_cache.get_result(key)
+
+                if result is not None:
+                    chunk_results[key] = result
+                else:
+                    new_idx.append(i)
+                    pending_results[key] = chunk_results
+
+            # Workers either search the new sequences sent to them, or read them from the chunk's byte range again
+            if ranges is not None:
+                async_result = pool.apply_async(_search_range, (source, new_idx))
+            else:
+                async_result = pool.apply_async(_search_seqs, ([source[i] for i in new_idx],))
+
+            pending.append((chunk, keys, new_idx, chunk_results, earlier_results, async_result))
+
+            # Limiting the number of chunks in flight, so memory doesn't scale with the number of sequences
+            if len(pending) >= 2*jobs:
+                yield from _collect_chunk(searcher, pending.popleft(), pending_results, error_store, dedup_store, result_cache)
+
+        while len(pending) > 0:
+            yield from _collect_chunk(searcher, pending.popleft(), pending_results, error_store, dedup_store, result_cache)
+
+def _iter_item_chunks(items, chunk_size):
+    # Sequences are hashed here and the new ones sent to the workers
+    for chunk in _get_chunks(items, chunk_size):
+        seqs = [test[0] for (iteration, test) in chunk]
+
+        yield (chunk, [ds.get_key(seq) for seq in seqs], seqs)
+
+def _iter_range_chunks(pool, ranges, jobs, start):
+    # Workers read and hash each byte range, with only the headers and keys sent back.  A limited number of ranges
+    # are read ahead, so memory doesn't scale with the file size.
+    byte_ranges = ranges.iter_ranges()
+    reading = deque()
+    iteration = 0
+
+    while True:
+        while len(reading) < 2*jobs:
+            byte_range = next(byte_ranges, None)
+            if byte_range is None:
+                break
+
+            reading.append((byte_range, pool.apply_async(_read_range, byte_range)))
+
+        if len(reading) == 0:
+            return
+
+        (byte_range, async_result) = reading.popleft()
+        (headers, keys, n_rej) = async_result.get()
+        ranges.add_counts(len(headers), n_rej)
+
+        # Sequences before the start (e.g. those already processed before resuming) are read, but not searched.  The
+        # offset of the first searched sequence is kept, so the worker searching the range can find them again.
+        offset = min(max(0, start - iteration), len(headers))
+        chunk = [(iteration + i, (None, headers[i])) for i in range(offset, len(headers))]
+        iteration = iteration + len(headers)
+
+        if len(chunk) > 0:
+            yield (chunk, keys[offset:], (byte_range, offset))
+
+def _collect_chunk(searcher, pending_chunk, pending_results, error_store, dedup_store, result_cache):
+    (chunk, keys, new_idx, chunk_results, earlier_results, async_result) = pending_chunk
+    (new_results, chunk_stats) = async_result.get()
+
+    searcher.get_stats().merge(chunk_stats)
+
+    for (i, (cleavage_sites, error_label)) in zip(new_idx, new_results):
+        chunk_results[keys[i]] = (cleavage_sites, error_label)
+        pending_results.pop(keys[i])
+
+        if result_cache is not None:
+            result_cache.add_result(keys[i], cleavage_sites, error_label)
+
+    # Chunks are collected in order, so repeats of sequences sent in earlier chunks already have results
+    for ((iteration, test), key) in zip(chunk, keys):
+        _print_progress(searcher, iteration, test)
+
+        result = dedup_store.get_result(key)
+        if result is None:
+            result = chunk_results[key] if key in chunk_results else earlier_results[key][key]
+            dedup_store.add_result(key, *result)
+
+        yield (iteration, test, _use_result(result, error_store))
+
+def _get_cached_result(key, dedup_store, result_cache):
+    # Results from earlier runs are added to the dedup store, so they're treated like any other searched sequence
+    if result_cache is None:
+        return None
+
+    cached_result = result_cache.get_result(key)
+    if cached_result is None:
+        return None
+
+    return dedup_store.add_result(key, *cached_result)
+
+def _search(searcher, ref, cass, seq, key, dedup_store, result_cache):
+    read_error_store = es.ErrorStore()
+    cleavage_sites = searcher.get_cleavage_positions(ref, cass, seq, error_store=read_error_store)
+    error_label = read_error_store.get_error_label()
+
+    if result_cache is not None:
+        result_cache.add_result(key, cleavage_sites, error_label)
+
+    return dedup_store.add_result(key, cleavage_sites, error_label)
+
+def _use_result(result, error_store):
+    (cleavage_sites, error_label) = result
+
+    # Errors are counted for every sequence, including repeats of the same sequence
+    if error_store is not None and error_label is not None:
+        error_store.add_error(error_label)
+
+    return cleavage_sites
+
+def _get_chunks(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+
+    if len(chunk) > 0:
+        yield chunk
+
+def _init_worker(ref, cass, max_gap, min_quality, num_bases, cache_size, ranges):
+    # Messages from worker processes would be interleaved, so workers always run silently
+    _worker_state['searcher'] = su.SequenceSearcher(su.get_aligner(), max_gap=max_gap, min_quality=min_quality, num_bases=num_bases, cache_size=cache_size, verbose=False)
+    _worker_state['ref'] = ref
+    _worker_state['cass'] = cass
+    _worker_state['ranges'] = ranges
+
+def _read_range(start, end):
+    # Sequences are hashed here, so the main process only receives their headers and keys
+    (records, n_rej) = _worker_state['ranges'].read_range(start, end)
+
+    return ([header for (seq, header) in records], [ds.get_key(seq) for (seq, header) in records], n_rej)
+
+def _search_range(source, idx):
+    ((start, end), offset) = source
+
+    # Only the new sequences are searched, after reading the range again
+    (records, n_rej) = _worker_state['ranges'].read_range(start, end)
+
+    return _search_seqs([records[offset + i][0] for i in idx])
+
+def _search_seqs(seqs):
+    searcher = _worker_state['searcher']
+    ref = _worker_state['ref']
+    cass = _worker_state['cass']
+
+    # A fresh stats store is used for each chunk, so the main process can merge them without double counting
+    searcher.set_stats(ss.StatsStore())
+
+    results = []
+    for seq in seqs:
+        error_store = es.ErrorStore()
+        cleavage_sites = searcher.get_cleavage_positions(ref, cass, seq, error_store=error_store)
+        results.append((cleavage_sites, error_store.get_error_label()))
+
+    return (results, searcher.get_stats())
+
+def _print_progress(searcher, iteration, test):
+    if not searcher.get_verbose():
+        return
+
+    if test[1] != "":
+        print("    Processing consensus sequence %i (%s)" % (iteration + 1,test[1]))
+    else:
+        print("    Processing consensus sequence %i" % (iteration + 1))
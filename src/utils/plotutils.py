@@ -2,14 +2,15 @@ from matplotlib.colors import LinearSegmentedColormap
 from pandas import DataFrame
 
 import matplotlib.pyplot as plt
+import numpy as np
 import seaborn as sns
 
 
-def plotFrequency1D(freq, freq_5p, freq_3p, show_percentages=True):
-    # Creating a Pandas DataFrames for the input dictionaries
-    df = DataFrame(data=list(freq.items()), columns=["Sequence", "Events"])
-    df_5p = DataFrame(data=list(freq_5p.items()), columns=["Sequence", "Events"])
-    df_3p = DataFrame(data=list(freq_3p.items()), columns=["Sequence", "Events"])
+def plotFrequency1D(freq, freq_5p, freq_3p, show_percentages=True, nonzero_only=False):
+    # Creating a Pandas DataFrames for the input frequencies (only including observed sequences if nonzero_only is set)
+    df = DataFrame(data=list(freq.get_frequency(nonzero_only=nonzero_only).items()), columns=["Sequence", "Events"])
+    df_5p = DataFrame(data=list(freq_5p.get_frequency(nonzero_only=nonzero_only).items()), columns=["Sequence", "Events"])
+    df_3p = DataFrame(data=list(freq_3p.get_frequency(nonzero_only=nonzero_only).items()), columns=["Sequence", "Events"])
     
     df = df.sort_values(by="Events", ascending=False)
     df_5p = df_5p.sort_values(by="Events", ascending=False)
@@ -52,20 +53,19 @@ def plotFrequency1D(freq, freq_5p, freq_3p, show_percentages=True):
 
     plt.show()
 
-def plotFrequency2D(labels, freq, show_percentages=True):
+def plotFrequency2D(cooccurrence, show_percentages=True, nonzero_only=False):
+    # Only sequences which were observed are shown if nonzero_only is set
+    (labels_t, labels_b, freq) = cooccurrence.get_matrix(nonzero_only=nonzero_only)
+
     units = ""
     if show_percentages:
         units = " %"
-        tot = sum(sum(freq))
-        for i in range(len(freq)):
-            freq[i] = [round(100*val/tot) for val in freq[i]]
+        freq = np.round(100*freq/freq.sum())
 
     cmap = LinearSegmentedColormap.from_list('ne', ['#C6CCD2', 'slategrey'], N=256)
-    ax = sns.heatmap(freq, cmap=cmap, linewidths=1, cbar_kws={'label': 'Events%s' % units})
+    ax = sns.heatmap(freq, cmap=cmap, linewidths=1, xticklabels=labels_b, yticklabels=labels_t, cbar_kws={'label': 'Events%s' % units})
     ax.set_xlabel("Bottom strand dinucleotide")
     ax.set_ylabel("Top strand dinucleotide")
-    ax.set_xticklabels(labels)
-    ax.set_yticklabels(labels,rotation=0) 
+    ax.tick_params(axis='y', rotation=0)
     
     plt.show()
-    
\ No newline at end of file
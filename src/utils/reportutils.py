@@ -1,4 +1,4 @@
-import math
+import itertools
 import numpy as np
 import sys
 
@@ -16,6 +16,97 @@ class LocalMode(Enum):
     FIVE_P = 2
     THREE_P = 3
 
+# Order of nucleotides when local sequences are listed or encoded as integers
+nucleotide_order = "ATGC"
+
+_nucleotide_digits = np.full(256, -1, dtype=np.int64)
+for (digit, nucleotide) in enumerate(nucleotide_order):
+    _nucleotide_digits[ord(nucleotide)] = digit
+
+class LocalSequenceFrequency():
+    # Sparse count of local sequences, only holding those which were observed
+    def __init__(self, n_nt):
+        self._n_nt = n_nt
+        self._counts = {}
+
+    def get_n_nt(self):
+        return self._n_nt
+
+    def add(self, local_seq, count=1):
+        local_seq = str(local_seq)
+        self._counts[local_seq] = self._counts.get(local_seq, 0) + count
+
+    def get_count(self, local_seq):
+        return self._counts.get(str(local_seq), 0)
+
+    def get_total(self):
+        return sum(self._counts.values())
+
+    def get_frequency(self, nonzero_only=True):
+        # Returns a dict of counts in label order.  Since there are 4^n_nt possible sequences, those which weren't
+        # observed are only included on request.
+        if not nonzero_only:
+            return {label: self._counts.get(label, 0) for label in get_local_sequence_labels(self._n_nt)}
+
+        local_seqs = list(self._counts.keys())
+        order = np.argsort(encode_sequences(local_seqs, self._n_nt), kind="stable")
+
+        return {local_seqs[i]: self._counts[local_seqs[i]] for i in order}
+
+    def get_sub_frequency(self, local_mode):
+        # Frequencies for the 5′ or 3′ half of each local sequence
+        if local_mode is LocalMode.BOTH:
+            return self
+
+        n_nt = self._n_nt // 2
+        freq = LocalSequenceFrequency(n_nt)
+        for (local_seq, count) in self._counts.items():
+            freq.add(local_seq[0:n_nt] if local_mode is LocalMode.FIVE_P else local_seq[-n_nt:], count)
+
+        return freq
+
+class SequenceCooccurrence():
+    # Sparse store of top and bottom strand local sequence co-occurrence, holding only the observed pairs (with
+    # sequences encoded as integers)
+    def __init__(self, n_nt, codes_t, codes_b, counts):
+        self._n_nt = n_nt
+        self._codes_t = codes_t
+        self._codes_b = codes_b
+        self._counts = counts
+
+    def get_n_nt(self):
+        return self._n_nt
+
+    def get_total(self):
+        return int(self._counts.sum())
+
+    def get_count(self, local_seq_t, local_seq_b):
+        (code_t, code_b) = encode_sequences([local_seq_t, local_seq_b], self._n_nt)
+
+        return int(self._counts[(self._codes_t == code_t) & (self._codes_b == code_b)].sum())
+
+    def get_nonzero(self):
+        # Returns (top sequence, bottom sequence, count) for each observed pair
+        return [(decode_sequence(code_t, self._n_nt), decode_sequence(code_b, self._n_nt), int(count)) for (code_t, code_b, count) in zip(self._codes_t, self._codes_b, self._counts)]
+
+    def get_matrix(self, nonzero_only=False):
+        # Returns a dense matrix with top strand sequences as rows and bottom strand sequences as columns.  Since this
+        # has 4^n_nt rows and columns, it can be limited to only the sequences which were observed.
+        if nonzero_only:
+            rows = np.unique(self._codes_t)
+            cols = np.unique(self._codes_b)
+        else:
+            rows = np.arange(pow(4,self._n_nt))
+            cols = rows
+
+        freq = np.zeros((len(rows), len(cols)))
+        np.add.at(freq, (np.searchsorted(rows, self._codes_t), np.searchsorted(cols, self._codes_b)), self._counts)
+
+        labels_t = [decode_sequence(code, self._n_nt) for code in rows]
+        labels_b = [decode_sequence(code, self._n_nt) for code in cols]
+
+        return (labels_t, labels_b, freq)
+
 class StdOut(object):
     def __init__(self,root_name,append_dt=False):
         self._out_file = fu.open_file(root_name, '_output', 'txt', append_dt=append_dt)
@@ -45,49 +136,81 @@ def get_full_sequence_frequency(results):
     return freq
 
 def get_local_sequence_frequency(results, strand_mode, local_mode, local_r):
-    n_nt = 2*local_r
+    return get_local_sequence_frequencies(results, strand_mode, local_r)[local_mode.value-1]
 
-    # Initialise frequency store
-    if local_mode is not LocalMode.BOTH:
-        n_nt = math.floor(n_nt / 2)
-        
-    freq = _init_frequency_dict(n_nt)
+def get_local_sequence_frequencies(results, strand_mode, local_r):
+    # Counting the full local sequences in a single pass, with the 5′ and 3′ frequencies derived from these counts.
+    # Returns frequencies in the order of LocalMode (both, 5′ and 3′).
+    freq = LocalSequenceFrequency(2*local_r)
     
     for (cleavage_site_t, cleavage_site_b, split, local_site_t, local_site_b, header) in results.values():
-        if local_mode is LocalMode.FIVE_P:
-            local_site_t = local_site_t[0:n_nt]
-            local_site_b = local_site_b[0:n_nt]
-        elif local_mode is LocalMode.THREE_P:
-            local_site_t = local_site_t[-n_nt:]
-            local_site_b = local_site_b[-n_nt:]
-
-        if strand_mode is StrandMode.TOP:
-            freq[local_site_t] = freq[local_site_t] + 1
-        elif strand_mode is StrandMode.BOTTOM:
-            freq[local_site_b] = freq[local_site_b] + 1
-        elif strand_mode is StrandMode.BOTH:
-            freq[local_site_t] = freq[local_site_t] + 1
-            freq[local_site_b] = freq[local_site_b] + 1
+        _add_local_sequences(freq, local_site_t, local_site_b, strand_mode)
 
-    return freq
+    return (freq, freq.get_sub_frequency(LocalMode.FIVE_P), freq.get_sub_frequency(LocalMode.THREE_P))
 
-def get_sequence_cooccurrence(results, local_r):
-    n_nt = 2*local_r
+def _add_local_sequences(freq, local_site_t, local_site_b, strand_mode, count=1):
+    if strand_mode is StrandMode.TOP:
+        freq.add(local_site_t, count)
+    elif strand_mode is StrandMode.BOTTOM:
+        freq.add(local_site_b, count)
+    elif strand_mode is StrandMode.BOTH:
+        freq.add(local_site_t, count)
+        freq.add(local_site_b, count)
 
-    # Create list of sequences (this is in the order we will use)
-    labels = list(_init_frequency_dict(n_nt).keys())
-        
-    # Creating a 2D Numpy array
-    freq = np.zeros((pow(4, n_nt), pow(4, n_nt)))
+def get_local_sequence_labels(n_nt):
+    # All possible local sequences, in the order they're listed (the same order as used by encode_sequences)
+    return ("".join(nts) for nts in itertools.product(nucleotide_order, repeat=n_nt))
 
-    # Iterating over each result, adding one to the matrix
+def get_sequence_cooccurrence(results, local_r):
+    local_seqs_t = []
+    local_seqs_b = []
     for (cleavage_site_t, cleavage_site_b, split, local_site_t, local_site_b, header) in results.values():
-        idx_top = labels.index(local_site_t)
-        idx_bottom = labels.index(local_site_b)
+        local_seqs_t.append(local_site_t)
+        local_seqs_b.append(local_site_b)
 
-        freq[idx_top, idx_bottom] = freq[idx_top, idx_bottom] + 1
-        
-    return (labels,freq)  
+    return _get_sequence_cooccurrence(local_seqs_t, local_seqs_b, np.ones(len(local_seqs_t), dtype=np.int64), 2*local_r)
+
+def get_sequence_cooccurrence_from_full(ref, freq_full, local_r):
+    local_seqs_t = []
+    local_seqs_b = []
+    for (cleavage_site_t, cleavage_site_b, split) in freq_full.keys():
+        (local_site_t, local_site_b) = su.get_local_sequences(ref, cleavage_site_t, cleavage_site_b, local_r=local_r)
+        local_seqs_t.append(local_site_t)
+        local_seqs_b.append(local_site_b)
+
+    return _get_sequence_cooccurrence(local_seqs_t, local_seqs_b, np.array(list(freq_full.values()), dtype=np.int64), 2*local_r)
+
+def _get_sequence_cooccurrence(local_seqs_t, local_seqs_b, counts, n_nt):
+    codes_t = encode_sequences(local_seqs_t, n_nt)
+    codes_b = encode_sequences(local_seqs_b, n_nt)
+
+    # Sequences containing anything other than A, T, G and C can't be placed in the matrix
+    valid = (codes_t >= 0) & (codes_b >= 0)
+    pairs = np.stack((codes_t[valid], codes_b[valid]), axis=1)
+
+    # Summing the counts for each distinct pair of top and bottom sequences
+    (pairs, inverse) = np.unique(pairs, axis=0, return_inverse=True)
+    counts = np.bincount(inverse.reshape(-1), weights=counts[valid], minlength=len(pairs)).astype(np.int64)
+
+    return SequenceCooccurrence(n_nt, pairs[:,0], pairs[:,1], counts)
+
+def encode_sequences(seqs, n_nt):
+    # Encodes each sequence as a base-4 integer, using the same order as get_local_sequence_labels.  Sequences which can't
+    # be encoded are given a value of -1.
+    seqs = [str(seq) if len(seq) == n_nt else "N"*n_nt for seq in seqs]
+    if len(seqs) == 0 or n_nt == 0:
+        return np.zeros(len(seqs), dtype=np.int64)
+
+    data = np.frombuffer("".join(seqs).encode(), dtype=np.uint8).reshape(-1, n_nt)
+    digits = _nucleotide_digits[data]
+
+    codes = digits @ (4**np.arange(n_nt-1, -1, -1, dtype=np.int64))
+    codes[(digits < 0).any(axis=1)] = -1
+
+    return codes
+
+def decode_sequence(code, n_nt):
+    return "".join(nucleotide_order[(code // pow(4,j)) % 4] for j in range(n_nt-1,-1,-1))
 
 def get_position_frequency(freq):
     freq_t = {}
@@ -130,9 +253,8 @@ def print_full_sequence_frequency(ref, freq, extra_nt = 0, include_seqs=True, of
     print("\n")
 
 def print_local_sequence_frequency(freq, nonzero_only=False, offset=""):   
-    for local_seq in freq.keys():
-        if not nonzero_only or freq.get(local_seq) > 0:
-            print("%s    %s: %i" % (offset,local_seq, freq.get(local_seq)))
+    for (local_seq, count) in freq.get_frequency(nonzero_only=nonzero_only).items():
+        print("%s    %s: %i" % (offset,local_seq, count))
 
     print("\n")
 
@@ -170,22 +292,3 @@ def sort_results(results,ascending=True):
     sorted_results = sorted(results.items(), key=lambda x: x[1], reverse=ascending)
     
     return dict(sorted_results)
-
-def _init_frequency_dict(n_nt):
-    freq = {}
-
-    for i in range(pow(4,n_nt)):
-        st = ""
-        for j in range(n_nt-1,-1,-1):
-            val = math.floor((i/pow(4,j))%4)
-            if val == 0:
-                st = st + "A"
-            elif val == 1:
-                st = st + "T"
-            elif val == 2:
-                st = st + "G"
-            elif val == 3:
-                st = st + "C"
-        freq[st] = 0
-    
-    return freq
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+
+# Included in every key, so results from an incompatible version are never reused
+cache_version = 1
+
+# Maximum number of new results written before they're committed to disk
+commit_interval = 100
+
+# Maximum number of seconds new results are held before they're committed to disk.  Other processes using the same cache
+# (e.g. when processing files in batch) can't write while results are waiting to be committed.
+commit_time = 1.0
+
+# Number of seconds to wait for another process to finish writing, after which the cache is skipped
+busy_timeout = 5
+
+# Number of seconds the cache is skipped for once it's found to be busy, so each lookup doesn't wait for it
+retry_interval = 60
+
+class ResultCache():
+    # The cache only saves repeating searches, so if it can't be used (e.g. it's locked by another process for too long)
+    # results are searched for and kept as normal, with any failed lookups counted as misses
+    def __init__(self, cache_dir, ref, cass, num_bases, min_quality, max_gap):
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._path = os.path.join(cache_dir, "csi_results.sqlite")
+        self._connection = sqlite3.connect(self._path, timeout=busy_timeout)
+        self._warned = False
+        self._skip_reads_until = 0
+        self._skip_writes_until = 0
+
+        # In write-ahead log mode, reading from the cache isn't blocked by other processes writing to it
+        try:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS results (key BLOB PRIMARY KEY, cleavage_site_t INTEGER, cleavage_site_b INTEGER, split INTEGER, error TEXT)")
+        except sqlite3.OperationalError as e:
+            self._skip(e, reads=True)
+
+        # Results depend on the reference, cassette and search parameters as well as the read, so changing any of these
+        # gives different keys
+        params = "%i\n%s\n%s\n%i\n%r\n%i" % (cache_version, str(ref), str(cass), num_bases, min_quality, max_gap)
+        self._params_key = hashlib.sha1(params.encode()).digest()
+
+        self._n_hits = 0
+        self._n_misses = 0
+        self._n_failed = 0
+        self._n_pending = 0
+        self._first_pending = None
+
+    def get_path(self):
+        return self._path
+
+    def get_n_hits(self):
+        return self._n_hits
+
+    def get_n_misses(self):
+        return self._n_misses
+
+    def get_n_failed(self):
+        return self._n_failed
+
+    def get_result(self, seq_key):
+        # Results can be waiting to be committed while earlier results are looked up
+        self._commit_if_due()
+
+        row = None
+        if time.time() >= self._skip_reads_until:
+            try:
+                row = self._connection.execute("SELECT cleavage_site_t, cleavage_site_b, split, error FROM results WHERE key = ?", (self._get_key(seq_key),)).fetchone()
+            except sqlite3.OperationalError as e:
+                self._skip(e, reads=True)
+
+        if row is None:
+            self._n_misses = self._n_misses + 1
+            return None
+
+        self._n_hits = self._n_hits + 1
+
+        (cleavage_site_t, cleavage_site_b, split, error) = row
+
+        return ((cleavage_site_t, cleavage_site_b, bool(split)), error)
+
+    def add_result(self, seq_key, cleavage_sites, error):
+        (cleavage_site_t, cleavage_site_b, split) = cleavage_sites
+
+        # Positions can come from numpy arrays, which SQLite would otherwise store as raw bytes
+        cleavage_site_t = int(cleavage_site_t) if cleavage_site_t is not None else None
+        cleavage_site_b = int(cleavage_site_b) if cleavage_site_b is not None else None
+
+        if time.time() < self._skip_writes_until:
+            self._n_failed = self._n_failed + 1
+            return
+
+        try:
+            self._connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", (self._get_key(seq_key), cleavage_site_t, cleavage_site_b, int(split), error))
+        except sqlite3.OperationalError as e:
+            self._skip(e)
+            self._n_failed = self._n_failed + 1
+            return
+
+        if self._first_pending is None:
+            self._first_pending = time.time()
+        self._n_pending = self._n_pending + 1
+
+        self._commit_if_due()
+
+    def commit(self):
+        try:
+            self._connection.commit()
+        except sqlite3.OperationalError as e:
+            # Results which couldn't be written are dropped, so the cache isn't left locked
+            self._skip(e)
+            self._n_failed = self._n_failed + self._n_pending
+            self._connection.rollback()
+
+        self._n_pending = 0
+        self._first_pending = None
+
+    def close(self):
+        self.commit()
+        self._connection.close()
+
+    def print_counts(self, offset=""):
+        print(f"{offset}Found in result cache:   {self._n_hits}")
+        print(f"{offset}Missing from cache:      {self._n_misses}")
+        print(f"{offset}Not stored (cache busy): {self._n_failed}")
+        print("\n")
+
+    def _commit_if_due(self):
+        if self._n_pending >= commit_interval or (self._first_pending is not None and time.time() - self._first_pending >= commit_time):
+            self.commit()
+
+    def _get_key(self, seq_key):
+        return hashlib.sha1(self._params_key + seq_key).digest()
+
+    def _skip(self, error, reads=False):
+        # Other processes writing to the cache don't stop it being read, so reading is only skipped if that fails
+        self._skip_writes_until = time.time() + retry_interval
+        if reads:
+            self._skip_reads_until = time.time() + retry_interval
+
+        # Only warning once, since the cache is likely to be busy again
+        if not self._warned:
+            print("WARNING: Result cache \"%s\" is unavailable (%s), so some results won't be read from or stored in it" % (self._path, error))
+            self._warned = True
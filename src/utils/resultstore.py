@@ -0,0 +1,100 @@
+from utils import errorstore as es
+from utils import reportutils as ru
+from utils import sequenceutils as su
+
+
+class ResultStore():
+    # Frequencies and error counts are updated as each result is added, so individual results only need to be kept if
+    # they're wanted afterwards
+    def __init__(self, ref, local_r, keep_results=True):
+        self._ref = ref
+        self._local_r = local_r
+        self._keep_results = keep_results
+
+        self._results = {}
+        self._freq_full = {}
+        self._freq_local = ru.LocalSequenceFrequency(2*local_r)
+        self._error_store = es.ErrorStore()
+        self._error_count = 0
+        self._n_sequences = 0
+        self._dedup_counts = (0, 0)
+        self._stats = None
+
+    def add_result(self, iteration, result):
+        (cleavage_site_t, cleavage_site_b, split, local_seq_t, local_seq_b, header) = result
+
+        key = (cleavage_site_t, cleavage_site_b, split)
+        self._freq_full[key] = self._freq_full[key] + 1 if key in self._freq_full else 1
+
+        self._freq_local.add(local_seq_t)
+        self._freq_local.add(local_seq_b)
+
+        if self._keep_results:
+            self._results[iteration] = result
+
+        self._n_sequences = self._n_sequences + 1
+
+    def add_error(self):
+        self._error_count = self._error_count + 1
+        self._n_sequences = self._n_sequences + 1
+
+    def add_frequency(self, freq, error_count):
+        # Adding results which are only available as counts for each event (e.g. read from a summary file).  Events are
+        # kept in the order given, with any found later added after them, so events with equal counts are always
+        # listed in the same order when appending to the same summary file.
+        for (key, count) in freq.items():
+            self._freq_full[key] = self._freq_full[key] + count if key in self._freq_full else count
+
+            (cleavage_site_t, cleavage_site_b, split) = key
+            (local_seq_t, local_seq_b) = su.get_local_sequences(self._ref, cleavage_site_t, cleavage_site_b, local_r=self._local_r)
+            self._freq_local.add(local_seq_t, count)
+            self._freq_local.add(local_seq_b, count)
+
+        self._error_count = self._error_count + error_count
+        self._n_sequences = self._n_sequences + sum(freq.values()) + error_count
+
+    def set_dedup_counts(self, dedup_counts):
+        # The results of identical sequences aren't kept here, just the number of sequences and how many of these reused
+        # an earlier result, so these don't add to the size of checkpoints and state files
+        self._dedup_counts = dedup_counts
+
+    def set_stats(self, stats):
+        self._stats = stats
+
+    def get_results(self):
+        # Individual results, keyed by the index of each sequence in the input (empty unless keep_results is set)
+        return self._results
+
+    def get_freq_full(self):
+        # Sorting results by frequency
+        return ru.sort_results(self._freq_full)
+
+    def get_freq_local(self):
+        return self._freq_local
+
+    def get_freq_5p(self):
+        return self._freq_local.get_sub_frequency(ru.LocalMode.FIVE_P)
+
+    def get_freq_3p(self):
+        return self._freq_local.get_sub_frequency(ru.LocalMode.THREE_P)
+
+    def get_cooccurrence(self):
+        return ru.get_sequence_cooccurrence_from_full(self._ref, self._freq_full, self._local_r)
+
+    def get_error_store(self):
+        return self._error_store
+
+    def get_error_counts(self):
+        return self._error_store.get_store()
+
+    def get_error_count(self):
+        return self._error_count
+
+    def get_n_sequences(self):
+        return self._n_sequences
+
+    def get_dedup_counts(self):
+        return self._dedup_counts
+
+    def get_stats(self):
+        return self._stats
@@ -1,15 +1,23 @@
+import time
+
 from Bio import Align
-from matplotlib.pyplot import minorticks_off
+from collections import OrderedDict
 from enums.ends import Ends
 from enums.orientation import Orientation
+from utils import statsstore as ss
 
 class SequenceSearcher():
-    def __init__(self, aligner, max_gap=10, min_quality=1.0, num_bases=20, verbose=False):
+    def __init__(self, aligner, max_gap=10, min_quality=1.0, num_bases=20, cache_size=10000, verbose=False):
         self._aligner = aligner
         self._max_gap = max_gap
         self._min_quality = min_quality
         self._num_bases = num_bases
+        self._cache_size = cache_size
         self._verbose = verbose
+        self._ref_index = None
+        self._cache = OrderedDict()
+        self._cache_ref = None
+        self._stats = ss.StatsStore()
 
     def get_aligner(self):
         return self._aligner
@@ -35,12 +43,25 @@ class SequenceSearcher():
     def set_num_bases(self, num_bases):
         self._num_bases = num_bases
 
+    def get_cache_size(self):
+        return self._cache_size
+
+    def set_cache_size(self, cache_size):
+        self._cache_size = cache_size
+        self._cache.clear()
+
     def get_verbose(self):
         return self._verbose
 
     def set_verbose(self, verbose):
         self._verbose = verbose
 
+    def get_stats(self):
+        return self._stats
+
+    def set_stats(self, stats):
+        self._stats = stats
+
     def get_cleavage_positions(self, ref, cass, consensus, error_store=None):
         if self._verbose:
             print("        Finding first cassette end in consensus sequence:")
@@ -180,13 +201,11 @@ class SequenceSearcher():
         
         if end is Ends.CASS_START:
             # Checking for "full" cassette end
-            alignments = self._aligner.align(consensus, cass[0: self._num_bases])
-            max_alignment = self._get_max_alignment(alignments,self._min_quality)
+            max_alignment = self._get_max_alignment(consensus, cass[0: self._num_bases], self._min_quality)
 
         elif end is Ends.CASS_END:
             # Checking for "full" cassette end
-            alignments = self._aligner.align(consensus, cass[-self._num_bases ::])
-            max_alignment = self._get_max_alignment(alignments,self._min_quality)
+            max_alignment = self._get_max_alignment(consensus, cass[-self._num_bases ::], self._min_quality)
 
         if max_alignment is None:
             return None
@@ -196,21 +215,26 @@ class SequenceSearcher():
         return max_alignment
 
     def _find_best_target_in_ref(self, ref, consensus, path, search_length, search_offset, min_quality):
-        max_alignment = Align.PairwiseAlignment(
-            target="", query="", path=((0, 0), (0, 0)), score=0.0)
+        # Path positions either side of a gap share the same consensus position, so each position is only searched once
+        cass_positions = list(dict.fromkeys(path[en][0] for en in range(len(path))))
 
-        max_isRC = False
-        max_en = 0
-        for en in range(len(path)): # The last position in the path is definitely the end
-            (alignment, isRC) = self._find_target_in_ref(ref, consensus, path[en][0]-search_offset, search_length, min_quality)
+        # An exact match has the highest possible score, so if any flank position matches exactly the first one is the best
+        (max_alignment, max_isRC, max_cass_pos) = self._anchor_flank_in_index(ref, consensus, cass_positions, search_length, search_offset)
 
-            if alignment is None:
-                continue
+        if max_alignment is None:
+            max_alignment = Align.PairwiseAlignment(
+                target="", query="", path=((0, 0), (0, 0)), score=0.0)
+
+            for cass_pos in cass_positions: # The last position in the path is definitely the end
+                (alignment, isRC) = self._find_target_in_ref(ref, consensus, cass_pos-search_offset, search_length, min_quality)
 
-            if alignment.score > max_alignment.score:
-                max_alignment = alignment
-                max_isRC = isRC
-                max_en = en
+                if alignment is None:
+                    continue
+
+                if alignment.score > max_alignment.score:
+                    max_alignment = alignment
+                    max_isRC = isRC
+                    max_cass_pos = cass_pos
 
         if max_alignment.score == 0 or get_quality(max_alignment) < min_quality:
             return (None, False, 0)
@@ -221,27 +245,78 @@ class SequenceSearcher():
             else:
                 print("            Best score = %.2f (sense)" % max_alignment.score)
 
-        return (max_alignment, max_isRC, path[max_en][0])
+        return (max_alignment, max_isRC, max_cass_pos)
+
+    def _anchor_flank_in_index(self, ref, consensus, cass_positions, search_length, search_offset):
+        ref_index = self._get_ref_index(ref, search_length)
+        if ref_index is None:
+            return (None, False, 0)
+
+        # Checking every flank position against the reference index before any alignment is attempted
+        for cass_pos in cass_positions:
+            consensus_target = get_seq(consensus, cass_pos-search_offset, cass_pos-search_offset+search_length)
+            if consensus_target is None or len(consensus_target) != search_length:
+                continue
+
+            (alignment, isRC) = self._find_target_in_index(ref_index, consensus_target)
+            if alignment is not None:
+                self._stats.index_hit()
+                return (alignment, isRC, cass_pos)
+
+        return (None, False, 0)
 
     def _find_target_in_ref(self, ref, consensus, pos, search_length, min_quality):
         consensus_target = get_seq(consensus, pos, pos+search_length)
         
-        # Adding a repetition to the end of the sequence, incase the target sequence spans the ends
-        len_ref = len(ref)
-        ref = ref + get_seq(ref, 0, search_length)
-        
         if consensus_target is None:
             if self._verbose:
                 print("            No consensus sequence found")
             return (None, False)
 
+        if self._cache_size <= 0:
+            return self._search_target_in_ref(ref, consensus_target, search_length, min_quality)
+
+        # Many reads share the same cassette-adjacent flanks, so recent search results are kept for reuse
+        key = (str(consensus_target), search_length, min_quality)
+        cached = self._get_cached_target(ref, key)
+        if cached is not None:
+            (path, score, isRC) = cached
+            if path is None:
+                return (None, False)
+
+            query = consensus_target.reverse_complement() if isRC else consensus_target
+            return (Align.PairwiseAlignment(target=ref, query=query, path=path, score=score), isRC)
+
+        (max_alignment, isRC) = self._search_target_in_ref(ref, consensus_target, search_length, min_quality)
+        if max_alignment is None:
+            self._add_cached_target(key, (None, 0.0, False))
+        else:
+            self._add_cached_target(key, (max_alignment.path, max_alignment.score, isRC))
+
+        return (max_alignment, isRC)
+
+    def _search_target_in_ref(self, ref, consensus_target, search_length, min_quality):
+        # Exact matches are looked up in the reference k-mer index, so only inexact targets need aligning
+        ref_index = self._get_ref_index(ref, search_length)
+        if ref_index is not None and len(consensus_target) == search_length:
+            (max_alignment, isRC) = self._find_target_in_index(ref_index, consensus_target)
+            if max_alignment is not None:
+                self._stats.index_hit()
+                return (max_alignment, isRC)
+
+            # With a perfect match required, there's nothing left for the aligner to find
+            if min_quality >= 1.0:
+                return (None, False)
+
+        # Adding a repetition to the end of the sequence, incase the target sequence spans the ends
+        len_ref = len(ref)
+        ref = ref + get_seq(ref, 0, search_length)
+
         # Finding consensus target in reference sequence
-        alignments = self._aligner.align(ref, consensus_target)
-        max_alignment = self._get_max_alignment(alignments,min_quality)
+        max_alignment = self._get_max_alignment(ref, consensus_target, min_quality)
 
         # If no matches were found, try the reverse complement of the consensus target
-        alignments_rc = self._aligner.align(ref, consensus_target.reverse_complement())
-        max_alignment_rc = self._get_max_alignment(alignments_rc,min_quality)
+        max_alignment_rc = self._get_max_alignment(ref, consensus_target.reverse_complement(), min_quality)
 
         if max_alignment is None and max_alignment_rc is not None:
             max_alignment_rc.path = remove_path_rollover(max_alignment_rc.path,len_ref)
@@ -261,19 +336,116 @@ class SequenceSearcher():
             max_alignment.path = remove_path_rollover(max_alignment.path,len_ref)
             return (max_alignment, False)
 
-    def _get_max_alignment(self, alignments, min_quality):
-        max_alignment = Align.PairwiseAlignment(
-            target="", query="", path=((0, 0), (0, 0)), score=0.0)
+    def _get_cached_target(self, ref, key):
+        # Cached results are only valid for the reference they were found in
+        if ref is not self._cache_ref:
+            self._cache.clear()
+            self._cache_ref = ref
+
+        if key not in self._cache:
+            self._stats.cache_miss()
+            return None
+
+        self._stats.cache_hit()
+        self._cache.move_to_end(key)
+
+        return self._cache[key]
 
-        for alignment in alignments:
-            if alignment.score > max_alignment.score and get_quality(alignment) >= min_quality:
-                max_alignment = alignment
+    def _add_cached_target(self, key, value):
+        self._cache[key] = value
 
-        if max_alignment.score == 0:
+        # Removing the least recently used result once the cache is full
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+            self._stats.cache_eviction()
+
+    def _find_target_in_index(self, ref_index, consensus_target):
+        # A sense match takes priority, as the aligner only prefers the reverse complement for a higher score
+        isRC = False
+        pos = ref_index.find(consensus_target)
+        if pos is None:
+            consensus_target = consensus_target.reverse_complement()
+            isRC = True
+            pos = ref_index.find(consensus_target)
+
+        if pos is None:
+            return (None, False)
+
+        search_length = len(consensus_target)
+        path = remove_path_rollover(((pos, 0), (pos+search_length, search_length)), len(ref_index.get_seq()))
+        alignment = Align.PairwiseAlignment(
+            target=ref_index.get_seq(), query=consensus_target, path=path, score=float(search_length))
+
+        return (alignment, isRC)
+
+    def _get_ref_index(self, ref, k):
+        if not supports_exact_index(self._aligner):
             return None
 
+        if self._ref_index is None or self._ref_index.get_seq() is not ref or self._ref_index.get_k() != k:
+            self._ref_index = KmerIndex(ref, k)
+
+        return self._ref_index
+
+    def _get_max_alignment(self, target, query, min_quality):
+        start_time = time.perf_counter()
+
+        # Every alignment returned by the aligner has the optimal score, so this can be checked without generating any
+        score = self._aligner.score(target, query)
+        if score == 0 or score / len(query) < min_quality:
+            self._stats.score_rejected()
+            self._stats.enumeration_avoided()
+            self._stats.add_alignment_time(time.perf_counter() - start_time)
+            return None
+
+        # Only the first co-optimal alignment is needed, so there's no need to enumerate the rest
+        max_alignment = next(iter(self._aligner.align(target, query)))
+        self._stats.single_alignment()
+        self._stats.enumeration_avoided()
+        self._stats.add_alignment_time(time.perf_counter() - start_time)
+
         return max_alignment
 
+class KmerIndex():
+    def __init__(self, seq, k):
+        self._seq = seq
+        self._k = k
+        self._positions = {}
+
+        # Adding a repetition to the end of the sequence, so k-mers spanning the ends are also indexed
+        seq_str = str(seq + get_seq(seq, 0, k))
+
+        # Only the first position of each k-mer is stored, since this is the first alignment the aligner reports
+        for pos in range(len(seq)):
+            self._positions.setdefault(seq_str[pos:pos+k], pos)
+
+    def get_seq(self):
+        return self._seq
+
+    def get_k(self):
+        return self._k
+
+    def find(self, target):
+        return self._positions.get(str(target))
+
+def get_aligner():
+    aligner = Align.PairwiseAligner()
+    aligner.mode = 'local'
+    aligner.match_score = 1.0
+    # aligner.mismatch_score = -1.0
+    aligner.gap_score = -1.0
+
+    return aligner
+
+def supports_exact_index(aligner):
+    # Exact matches are only guaranteed to be the sole top-scoring alignments when every mismatch and gap scores less than a match
+    if aligner.mode != 'local' or aligner.substitution_matrix is not None:
+        return False
+
+    gap_scores = (aligner.target_internal_open_gap_score, aligner.target_internal_extend_gap_score, aligner.query_internal_open_gap_score, aligner.query_internal_extend_gap_score)
+
+    return aligner.match_score == 1.0 and aligner.mismatch_score < 1.0 and max(gap_scores) < 0
+
 def get_seq(seq, pos1, pos2):
     seq_len = len(seq)
 
@@ -0,0 +1,51 @@
+class StatsStore():
+    def __init__(self):
+        self._store = {'INDEX_HIT':0,'SCORE_REJECTED':0,'SINGLE_ALIGNMENT':0,'ENUMERATION_AVOIDED':0,'ALIGNMENT_TIME':0.0,'CACHE_HIT':0,'CACHE_MISS':0,'CACHE_EVICTION':0}
+
+    def get_store(self):
+        return self._store
+
+    def index_hit(self):
+        self._increment_counter('INDEX_HIT')
+
+    def score_rejected(self):
+        self._increment_counter('SCORE_REJECTED')
+
+    def single_alignment(self):
+        self._increment_counter('SINGLE_ALIGNMENT')
+
+    def enumeration_avoided(self):
+        self._increment_counter('ENUMERATION_AVOIDED')
+
+    def add_alignment_time(self, time):
+        self._store['ALIGNMENT_TIME'] = self._store['ALIGNMENT_TIME'] + time
+
+    def cache_hit(self):
+        self._increment_counter('CACHE_HIT')
+
+    def cache_miss(self):
+        self._increment_counter('CACHE_MISS')
+
+    def cache_eviction(self):
+        self._increment_counter('CACHE_EVICTION')
+
+    def merge(self, stats_store):
+        for label, count in stats_store.get_store().items():
+            self._store[label] = self._store[label] + count
+
+    def print_counts(self, offset=""):
+        print(f"{offset}Found in reference index:      {self._store['INDEX_HIT']}")
+        print(f"{offset}Rejected on score alone:       {self._store['SCORE_REJECTED']}")
+        print(f"{offset}Single best alignment used:    {self._store['SINGLE_ALIGNMENT']}")
+        print(f"{offset}Enumerations avoided:          {self._store['ENUMERATION_AVOIDED']}")
+        print(f"{offset}Time spent aligning:           {self._store['ALIGNMENT_TIME']:.2f}s")
+        self.print_cache_counts(offset)
+
+    def print_cache_counts(self, offset=""):
+        print(f"{offset}Reference cache hits:          {self._store['CACHE_HIT']}")
+        print(f"{offset}Reference cache misses:        {self._store['CACHE_MISS']}")
+        print(f"{offset}Reference cache evictions:     {self._store['CACHE_EVICTION']}")
+        print("\n")
+
+    def _increment_counter(self, label):
+        self._store[label] = self._store[label] + 1
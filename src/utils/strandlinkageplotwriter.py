@@ -1,12 +1,12 @@
 import datetime as dt
 import math
 import os
-import svgwrite as svg
 
 from enum import Enum
 from matplotlib import cm
 from utils import abstractmapwriter as amw
 from utils import reportutils as ru
+from utils import svgstreamwriter as ssw
 
 
 class DNA_MODE(Enum):
@@ -50,7 +50,8 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
                  event_opts=(0.5, 2, "cool", 0, 100, True, 0.4, 1),
                  hist_opts=(True, 0, 100, 2, "darkgray", 0.16, 0.07, 20, 0),
                  hist_label_opts=(True, 12, "gray", 25, 0.01, HPOS.LEFT, True),
-                 hist_grid_opts=(True, 1, "lightgray", 25)):
+                 hist_grid_opts=(True, 1, "lightgray", 25),
+                 n_colours=256):
 
         self._im_w = im_dims[0]
         self._im_h = im_dims[1]
@@ -127,6 +128,8 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
         self._hist_grid_colour = hist_grid_opts[2]
         self._hist_grid_interval = hist_grid_opts[3]
 
+        self._n_colours = n_colours
+
     ## GETTERS AND SETTERS
 
     def set_dna_mode(self, dna_mode):
@@ -140,20 +143,22 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
                   ref=None,
                   pos_range=None,
                   append_dt=False):
+        # Summarising the events once, so they don't need to be rescanned for each part of the plot
+        events = amw.get_event_matrix(freq)
+        freq = events.get_freq()
+
         if self._event_stack_order == 1:
             freq = ru.sort_results(freq, True)
         elif self._event_stack_order == 2:
             freq = ru.sort_results(freq, False)
 
-        (pos_min, pos_max) = amw.get_single_pos_range(freq, ref, pos_range)
+        (pos_min, pos_max) = amw.get_single_pos_range(events, ref, pos_range)
 
         # Creating output SVG document
         root_name = os.path.splitext(out_path)[0]
         datetime_str = dt.datetime.now().strftime(
             "_%Y-%m-%d_%H-%M-%S") if append_dt else ""
         outname = root_name + datetime_str + '.' + 'svg'
-        dwg = svg.Drawing(outname,
-                          size=("%spx" % self._im_w, "%spx" % self._im_h))
 
         # Defining limits of DNA strands
         map_x1 = self._im_w * self._map_rel_left
@@ -162,36 +167,74 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
         map_y2 = map_y1 + self._im_h * self._map_rel_height
         map_xy = (map_x1, map_y1, map_x2, map_y2)
 
-        if self._grid_show:
-            self._add_grid_lines(dwg, pos_min, pos_max, map_xy)
+        # Colours are only calculated once per render, then looked up for each event
+        self._colours = amw.get_colour_strings(
+            cm.get_cmap(self._event_colourmap), self._n_colours)
 
-        if self._grid_label_show:
-            self._add_grid_labels(dwg, pos_min, pos_max, map_xy)
+        # Elements are written to file as they're added
+        with ssw.SVGStreamWriter(outname,
+                                 ("%spx" % self._im_w, "%spx" % self._im_h),
+                                 styles=self._get_styles(freq, events)) as dwg:
+            if self._grid_show:
+                self._add_grid_lines(dwg, pos_min, pos_max, map_xy)
 
-        if self._end_label_show:
-            self._add_end_labels(dwg, map_xy)
+            if self._grid_label_show:
+                self._add_grid_labels(dwg, pos_min, pos_max, map_xy)
 
-        if self._cbar_show:
-            self._add_cbar(dwg, map_xy, freq)
+            if self._end_label_show:
+                self._add_end_labels(dwg, map_xy)
 
-        if self._hist_show:
-            (freq_t, freq_b) = ru.get_position_frequency(freq)
-            self._add_hist(dwg, pos_min, pos_max, map_xy, freq_t, True)
-            self._add_hist(dwg, pos_min, pos_max, map_xy, freq_b, False)
+            if self._cbar_show:
+                self._add_cbar(dwg, map_xy, events)
 
-        self._add_event_lines(dwg, pos_min, pos_max, map_xy, freq, ref)
+            if self._hist_show:
+                (freq_t, freq_b) = events.get_position_frequency()
+                self._add_hist(dwg, pos_min, pos_max, map_xy, freq_t, True)
+                self._add_hist(dwg, pos_min, pos_max, map_xy, freq_b, False)
 
-        self._add_dna(dwg, pos_min, pos_max, map_xy, ref=ref)
+            self._add_event_lines(dwg, pos_min, pos_max, map_xy, freq, events,
+                                  ref)
 
-        # Writing SVG to file
-        dwg.save()
+            self._add_dna(dwg, pos_min, pos_max, map_xy, ref=ref)
+
+    def _get_styles(self, freq, events):
+        # Styles shared by many labels, lines and histogram bars
+        styles = {}
+        for anchor in ("start", "middle", "end"):
+            styles["label_%s" % anchor] = f"text-anchor:{anchor};font-family:{self._font};dominant-baseline:mathematical"
+
+        # End labels (the bottom labels keep the default baseline when inside the strands)
+        if self._end_label_position == VPOS.INSIDE:
+            baselines = {"top": "hanging", "bottom": ""}
+        else:
+            baselines = {"top": "mathematical", "bottom": "mathematical"}
+
+        for (vpos, baseline) in baselines.items():
+            for anchor in ("start", "end"):
+                style = f"text-anchor:{anchor};font-family:{self._font};font-size:{self._end_label_size}px;fill:{self._end_label_colour}"
+                styles["end_%s_%s" % (vpos, anchor)] = style + (f";dominant-baseline:{baseline}" if baseline != "" else "")
+
+        styles["square"] = "stroke-linecap:square"
+        styles["grid"] = f"stroke:{self._grid_colour};stroke-width:{self._grid_size}"
+        styles["hist"] = f"stroke:none;fill:{self._hist_colour}"
+        styles["hist_grid"] = f"stroke:{self._hist_grid_colour};stroke-width:{self._hist_grid_size}"
+        styles["event"] = "stroke-linecap:square;stroke-opacity:%f" % self._event_opacity
+
+        # One stroke colour class for each colour used by the events
+        if len(freq) > 0:
+            (total, event_min_range, event_range) = self._get_event_range(events)
+            colour_idxs = sorted(set(amw.get_colour_index(((count / total) * 100 - event_min_range) / event_range, self._n_colours) for count in set(freq.values())))
+            for colour_idx in colour_idxs:
+                styles["e%i" % colour_idx] = "stroke:%s" % self._colours[colour_idx]
+
+        return styles
 
     def _add_grid_lines(self, dwg, pos_min, pos_max, map_xy):
         (map_x1, map_y1, map_x2, map_y2) = map_xy
 
         # Adding horizontal grid line
         # grid_yc = (map_y1+map_y2)/2
-        # dwg.add(svg.shapes.Line((map_x1, grid_yc), (map_x2, grid_yc), stroke=self._grid_colour, stroke_width=self._grid_size))
+        # dwg.add_line((map_x1, grid_yc), (map_x2, grid_yc), stroke=self._grid_colour, stroke_width=self._grid_size)
 
         # Getting range of vertical grid lines
         grid_pos_min = self._grid_interval * math.ceil(
@@ -207,26 +250,19 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
                                                    (pos_max - pos_min))
             grid_y1 = map_y1 + self._dna_size / 2 + self._dna_rel_gap*self._im_h
             grid_y2 = map_y2 - self._dna_size / 2 - self._dna_rel_gap*self._im_h
-            dwg.add(
-                svg.shapes.Line((grid_x, grid_y1), (grid_x, grid_y2),
-                                stroke=self._grid_colour,
-                                stroke_width=self._grid_size))
+            dwg.add_line((grid_x, grid_y1), (grid_x, grid_y2), class_="grid")
 
             if self._hist_show:
                 grid_y1 = map_y1 - (self._hist_rel_gap +
                                     self._hist_rel_height) * self._im_h
                 grid_y2 = map_y1 - (self._hist_rel_gap * self._im_h)
-                dwg.add(
-                    svg.shapes.Line((grid_x, grid_y1), (grid_x, grid_y2),
-                                    stroke=self._hist_grid_colour,
-                                    stroke_width=self._hist_grid_size))
+                dwg.add_line((grid_x, grid_y1), (grid_x, grid_y2),
+                             class_="hist_grid")
                 grid_y1 = map_y2 + (self._hist_rel_gap +
                                     self._hist_rel_height) * self._im_h
                 grid_y2 = map_y2 + (self._hist_rel_gap * self._im_h)
-                dwg.add(
-                    svg.shapes.Line((grid_x, grid_y1), (grid_x, grid_y2),
-                                    stroke=self._hist_grid_colour,
-                                    stroke_width=self._hist_grid_size))
+                dwg.add_line((grid_x, grid_y1), (grid_x, grid_y2),
+                             class_="hist_grid")
 
     def _add_grid_labels(self, dwg, pos_min, pos_max, map_xy):
         (map_x1, map_y1, map_x2, map_y2) = map_xy
@@ -251,15 +287,13 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
                 (grid_label_pos - pos_min) / (pos_max - pos_min))
             grid_label_y = map_y1 - self._dna_size / 2 - grid_label_gap
             rot = "rotate(%i,%i,%i)" % (-90, grid_label_x, grid_label_y)
-            dwg.add(
-                svg.text.Text(
-                    str(grid_label_pos),
-                    insert=(grid_label_x, grid_label_y),
-                    transform=rot,
-                    style=
-                    f"text-anchor:start;font-family:{self._font};dominant-baseline:mathematical",
-                    font_size=self._grid_label_size,
-                    fill=self._grid_label_colour))
+            dwg.add_text(
+                str(grid_label_pos),
+                insert=(grid_label_x, grid_label_y),
+                transform=rot,
+                class_="label_start",
+                font_size=self._grid_label_size,
+                fill=self._grid_label_colour)
 
     def _add_dna(self, dwg, pos_min, pos_max, map_xy, ref=None):
         (map_x1, map_y1, map_x2, map_y2) = map_xy
@@ -276,35 +310,29 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
             ref_c = ref.complement()
             for dna_pos in range(pos_min, pos_max + 1):
                 dna_seq_x = map_x1 + dna_pos_interval * (dna_pos - pos_min)
-                dwg.add(
-                    svg.text.Text(
-                        str(ref[dna_pos - 1]),
-                        insert=(dna_seq_x, map_y1),
-                        style=
-                        f"text-anchor:middle;font-family:{self._font};dominant-baseline:mathematical",
-                        font_size=self._dna_size,
-                        fill=self._dna_colour))
-                dwg.add(
-                    svg.text.Text(
-                        str(ref_c[dna_pos - 1]),
-                        insert=(dna_seq_x, map_y2),
-                        style=
-                        f"text-anchor:middle;font-family:{self._font};dominant-baseline:mathematical",
-                        font_size=self._dna_size,
-                        fill=self._dna_colour))
+                dwg.add_text(
+                    str(ref[dna_pos - 1]),
+                    insert=(dna_seq_x, map_y1),
+                    class_="label_middle",
+                    font_size=self._dna_size,
+                    fill=self._dna_colour)
+                dwg.add_text(
+                    str(ref_c[dna_pos - 1]),
+                    insert=(dna_seq_x, map_y2),
+                    class_="label_middle",
+                    font_size=self._dna_size,
+                    fill=self._dna_colour)
 
         elif self._dna_mode is DNA_MODE.LINE:
             # Draw DNA as lines
-            dwg.add(
-                svg.shapes.Line((map_x1, map_y1), (map_x2, map_y1),
-                                stroke=self._dna_colour,
-                                stroke_width=self._dna_size,
-                                style="stroke-linecap:square"))
-            dwg.add(
-                svg.shapes.Line((map_x1, map_y2), (map_x2, map_y2),
-                                stroke=self._dna_colour,
-                                stroke_width=self._dna_size,
-                                style="stroke-linecap:square"))
+            dwg.add_line((map_x1, map_y1), (map_x2, map_y1),
+                         stroke=self._dna_colour,
+                         stroke_width=self._dna_size,
+                         class_="square")
+            dwg.add_line((map_x1, map_y2), (map_x2, map_y2),
+                         stroke=self._dna_colour,
+                         stroke_width=self._dna_size,
+                         class_="square")
 
     def _add_end_labels(self, dwg, map_xy):
         (map_x1, map_y1, map_x2, map_y2) = map_xy
@@ -315,48 +343,16 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
         if self._end_label_position == VPOS.INSIDE:
             end_label_y1 = map_y1 - self._dna_size * 0.4  # + self._end_label_size * 0.75 - self._dna_size / 2
             end_label_y2 = map_y2 + self._dna_size * 0.4  # + self._dna_size / 2
-            top_baseline = "hanging"
-            bottom_baseline = ""
         elif self._end_label_position == VPOS.CENTRE:
             end_label_y1 = map_y1
             end_label_y2 = map_y2
-            top_baseline = "mathematical"
-            bottom_baseline = "mathematical"
-
-        dwg.add(
-            svg.text.Text(
-                "5′",
-                insert=(end_label_x1, end_label_y1),
-                style=
-                f"text-anchor:end;font-family:{self._font};dominant-baseline:{top_baseline}",
-                font_size=self._end_label_size,
-                fill=self._end_label_colour))
-        dwg.add(
-            svg.text.Text(
-                "3′",
-                insert=(end_label_x2, end_label_y1),
-                style=
-                f"text-anchor:start;font-family:{self._font};dominant-baseline:{top_baseline}",
-                font_size=self._end_label_size,
-                fill=self._end_label_colour))
-        dwg.add(
-            svg.text.Text(
-                "3′",
-                insert=(end_label_x1, end_label_y2),
-                style=
-                f"text-anchor:end;font-family:{self._font};dominant-baseline:{bottom_baseline}",
-                font_size=self._end_label_size,
-                fill=self._end_label_colour))
-        dwg.add(
-            svg.text.Text(
-                "5′",
-                insert=(end_label_x2, end_label_y2),
-                style=
-                f"text-anchor:start;font-family:{self._font};dominant-baseline:{bottom_baseline}",
-                font_size=self._end_label_size,
-                fill=self._end_label_colour))
-
-    def _add_cbar(self, dwg, map_xy, freq):
+
+        dwg.add_text("5′", insert=(end_label_x1, end_label_y1), class_="end_top_end")
+        dwg.add_text("3′", insert=(end_label_x2, end_label_y1), class_="end_top_start")
+        dwg.add_text("3′", insert=(end_label_x1, end_label_y2), class_="end_bottom_end")
+        dwg.add_text("5′", insert=(end_label_x2, end_label_y2), class_="end_bottom_start")
+
+    def _add_cbar(self, dwg, map_xy, events):
         (map_x1, map_y1, map_x2, map_y2) = map_xy
 
         cbar_x1 = self._im_w * self._cbar_rel_left + self._cbar_border_size/2
@@ -374,37 +370,32 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
         cbar_h = cbar_y2 - cbar_y1
 
         # Adding cbar lines
-        cmap = cm.get_cmap(self._event_colourmap)
-
         line_offs = cbar_h / 255
         for i in range(0, 255):
             y1 = cbar_y2 - (i + 1) * line_offs if i == 254 else cbar_y2 - (
                 i + 2) * line_offs
             y2 = cbar_y2 - (i) * line_offs
-            rgba = cmap(i / 256)
-            col = "rgb(%i,%i,%i)" % (rgba[0] * 255, rgba[1] * 255,
-                                     rgba[2] * 255)
-            dwg.add(
-                svg.shapes.Rect(insert=(cbar_x1, y1),
-                                size=(cbar_w, y2 - y1),
-                                stroke="none",
-                                fill=col))
+            col = self._colours[amw.get_colour_index(i / 256,
+                                                     self._n_colours)]
+            dwg.add_rect(insert=(cbar_x1, y1),
+                         size=(cbar_w, y2 - y1),
+                         stroke="none",
+                         fill=col)
 
         # Adding border around cbar
-        dwg.add(
-            svg.shapes.Rect(insert=(cbar_x1, cbar_y1),
-                            size=(cbar_w, cbar_h),
-                            stroke="black",
-                            fill="none",
-                            stroke_width=self._cbar_border_size,
-                            style="stroke-linecap:square"))
+        dwg.add_rect(insert=(cbar_x1, cbar_y1),
+                     size=(cbar_w, cbar_h),
+                     stroke="black",
+                     fill="none",
+                     stroke_width=self._cbar_border_size,
+                     class_="square")
 
         if self._cbar_label_show:
             if self._event_min_range == -1 and self._event_max_range == -1:
-                total = sum(freq.values())
+                total = events.get_total()
                 event_min_range = math.floor(
-                    (min(freq.values()) / total) * 100)
-                event_max_range = math.ceil((max(freq.values()) / total) * 100)
+                    (events.get_min_count() / total) * 100)
+                event_max_range = math.ceil((events.get_max_count() / total) * 100)
             else:
                 event_min_range = self._event_min_range
                 event_max_range = self._event_max_range
@@ -420,26 +411,22 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
                                      self._cbar_label_interval):
                 end_label_y = cbar_y2 - cbar_h * (
                     label_value - event_min_range) / event_range
-                dwg.add(
-                    svg.text.Text(
-                        "%i%%" % label_value,
-                        insert=(end_label_x, end_label_y),
-                        style=
-                        f"text-anchor:start;font-family:{self._font};dominant-baseline:mathematical",
-                        font_size=self._cbar_label_size,
-                        fill=self._cbar_label_colour))
+                dwg.add_text(
+                    "%i%%" % label_value,
+                    insert=(end_label_x, end_label_y),
+                    class_="label_start",
+                    font_size=self._cbar_label_size,
+                    fill=self._cbar_label_colour)
 
             # Adding final label (keeping this separate means we still get it, even if it's not on the interval)
             end_label_y = cbar_y2 - cbar_h * (event_max_range -
                                               event_min_range) / event_range
-            dwg.add(
-                svg.text.Text(
-                    "%i%%" % event_max_range,
-                    insert=(end_label_x, end_label_y),
-                    style=
-                    f"text-anchor:start;font-family:{self._font};dominant-baseline:mathematical",
-                    font_size=self._cbar_label_size,
-                    fill=self._cbar_label_colour))
+            dwg.add_text(
+                "%i%%" % event_max_range,
+                insert=(end_label_x, end_label_y),
+                class_="label_start",
+                font_size=self._cbar_label_size,
+                fill=self._cbar_label_colour)
 
     def _add_hist(self, dwg, pos_min, pos_max, map_xy, freq, is_top):
         if len(freq) == 0:
@@ -472,10 +459,7 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
         grid_x1 = map_x1 - self._hist_overhang - self._grid_size/2
         grid_x2 = map_x2 + self._hist_overhang - self._grid_size/2
         grid_y = hist_y2 + self._hist_grid_size / 2 - self._grid_size/2
-        dwg.add(
-            svg.shapes.Line((grid_x1, grid_y), (grid_x2, grid_y),
-                            stroke=self._hist_grid_colour,
-                            stroke_width=self._hist_grid_size))
+        dwg.add_line((grid_x1, grid_y), (grid_x2, grid_y), class_="hist_grid")
 
         # Adding the y-axis
         line_x = ((map_x1 - self._hist_overhang) if self._hist_label_position == HPOS.LEFT else (map_x2 + self._hist_overhang)) - self._grid_size/2
@@ -486,10 +470,7 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
             line_y1 = map_y2 + (self._hist_rel_gap + self._hist_rel_height) * self._im_h - self._grid_size/2
             line_y2 = map_y2 + (self._hist_rel_gap * self._im_h) - self._grid_size/2
         
-        dwg.add(
-            svg.shapes.Line((line_x, line_y1), (line_x, line_y2),
-                            stroke=self._hist_grid_colour,
-                            stroke_width=self._hist_grid_size))
+        dwg.add_line((line_x, line_y1), (line_x, line_y2), class_="hist_grid")
 
         # Adding the grid first, so it's at the bottom of the stack
         if self._hist_grid_show:
@@ -499,18 +480,13 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
                 grid_y = hist_y2 + sign * hist_h * (
                     grid_value -
                     hist_min_range) / hist_range + self._hist_grid_size / 2 - self._grid_size/2
-                dwg.add(
-                    svg.shapes.Line((grid_x1, grid_y), (grid_x2, grid_y),
-                                    stroke=self._hist_grid_colour,
-                                    stroke_width=self._hist_grid_size))
+                dwg.add_line((grid_x1, grid_y), (grid_x2, grid_y),
+                             class_="hist_grid")
 
             grid_y = hist_y2 + sign * hist_h * (
                 hist_max_range -
                 hist_min_range) / hist_range + self._hist_grid_size / 2
-            dwg.add(
-                svg.shapes.Line((grid_x1, grid_y), (grid_x2, grid_y),
-                                stroke=self._hist_grid_colour,
-                                stroke_width=self._hist_grid_size))
+            dwg.add_line((grid_x1, grid_y), (grid_x2, grid_y), class_="hist_grid")
 
         # Iterating over each position, adding the histogram bar
         for pos in range(pos_min-self._hist_bin_width, pos_max + 1):
@@ -538,12 +514,14 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
                 bar_y1 = map_y2 + (self._hist_rel_gap * self._im_h)
                 bar_y2 = map_y2 + (self._hist_rel_gap + self._hist_rel_height *
                                    norm_count) * self._im_h
-                
-            dwg.add(
-                svg.shapes.Rect(insert=(bar_x1, bar_y1),
-                                size=(bar_x2-bar_x1, bar_y2 - bar_y1),
-                                stroke="none",
-                                fill=self._hist_colour))
+
+            # Empty bins (and any narrowed to nothing at the ends of the range) wouldn't be rendered, so aren't written
+            if bar_x2 <= bar_x1 or bar_y2 <= bar_y1:
+                continue
+
+            dwg.add_rect(insert=(bar_x1, bar_y1),
+                         size=(bar_x2-bar_x1, bar_y2 - bar_y1),
+                         class_="hist")
         
         if self._hist_label_show:
             if self._hist_label_position == HPOS.LEFT:
@@ -558,47 +536,32 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
                                      self._hist_label_interval):
                 end_label_y = hist_y2 + sign * hist_h * (
                     label_value - hist_min_range) / hist_range
-                dwg.add(
-                    svg.text.Text(
-                        "%i%%" % label_value,
-                        insert=(label_x, end_label_y),
-                        style=
-                        f"text-anchor:{anchor};font-family:{self._font};dominant-baseline:mathematical",
-                        font_size=self._hist_label_size,
-                        fill=self._hist_label_colour))
+                dwg.add_text(
+                    "%i%%" % label_value,
+                    insert=(label_x, end_label_y),
+                    class_=f"label_{anchor}",
+                    font_size=self._hist_label_size,
+                    fill=self._hist_label_colour)
 
             # Adding final label (keeping this separate means we still get it, even if it's not on the interval)
             end_label_y = hist_y2 + sign * hist_h * (
                 hist_max_range - hist_min_range) / hist_range
-            dwg.add(
-                svg.text.Text(
-                    "%i%%" % hist_max_range,
-                    insert=(label_x, end_label_y),
-                    style=
-                    f"text-anchor:{anchor};font-family:{self._font};dominant-baseline:mathematical",
-                    font_size=self._hist_label_size,
-                    fill=self._hist_label_colour))
-
-    def _add_event_lines(self, dwg, pos_min, pos_max, map_xy, freq, ref):
+            dwg.add_text(
+                "%i%%" % hist_max_range,
+                insert=(label_x, end_label_y),
+                class_=f"label_{anchor}",
+                font_size=self._hist_label_size,
+                fill=self._hist_label_colour)
+
+    def _add_event_lines(self, dwg, pos_min, pos_max, map_xy, freq, events, ref):
         if len(freq) == 0:
             return
 
-        total = sum(freq.values())
-        if self._event_min_range == -1 and self._event_max_range == -1:
-            event_min_range = math.floor((min(freq.values()) / total) * 100)
-            event_max_range = math.ceil((max(freq.values()) / total) * 100)
-        else:
-            event_min_range = self._event_min_range
-            event_max_range = self._event_max_range
-        event_range = event_max_range - event_min_range
-
-        # Preventing divide by zero errors
-        if event_range == 0:
-            event_range = 1
+        (total, event_min_range, event_range) = self._get_event_range(events)
 
         # Getting reference length (or estimating)
         if ref is None:
-            pos_ranges = amw.get_event_pos_range(freq, round=1)
+            pos_ranges = events.get_pos_range(round=1)
             ref_len = max(pos_ranges[1], pos_ranges[3])
         else:
             ref_len = len(ref)
@@ -632,10 +595,26 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
                                           cleavage_site_b, pos_min, pos_max,
                                           map_xy, norm_count)
 
+    def _get_event_range(self, events):
+        # Percentages mapped onto the event colourmap and line widths
+        total = events.get_total()
+        if self._event_min_range == -1 and self._event_max_range == -1:
+            event_min_range = math.floor((events.get_min_count() / total) * 100)
+            event_max_range = math.ceil((events.get_max_count() / total) * 100)
+        else:
+            event_min_range = self._event_min_range
+            event_max_range = self._event_max_range
+        event_range = event_max_range - event_min_range
+
+        # Preventing divide by zero errors
+        if event_range == 0:
+            event_range = 1
+
+        return (total, event_min_range, event_range)
+
     def _add_continuous_line(self, dwg, cleavage_site_t, cleavage_site_b,
                              pos_min, pos_max, map_xy, norm_count):
         (map_x1, map_y1, map_x2, map_y2) = map_xy
-        cmap = cm.get_cmap(self._event_colourmap)
 
         # Adding line (adding width 1 to ensure everything is visible)
         event_width = (self._event_max_size - self._event_min_size
@@ -651,20 +630,15 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
 
         (event_t_x, event_t_y, event_b_x, event_b_y) = self._crop_events_to_range(event_t_x, event_t_y, event_b_x, event_b_y, map_xy)
 
-        rgba = cmap(norm_count)
-        col = "rgb(%i,%i,%i)" % (rgba[0] * 255, rgba[1] * 255, rgba[2] * 255)
+        col_class = "event e%i" % amw.get_colour_index(norm_count, self._n_colours)
 
-        dwg.add(
-            svg.shapes.Line((event_t_x, event_t_y), (event_b_x, event_b_y),
-                            stroke=col,
-                            stroke_width=event_width,
-                            style="stroke-linecap:square;stroke-opacity:%f" %
-                            self._event_opacity))
+        dwg.add_line((event_t_x, event_t_y), (event_b_x, event_b_y),
+                     stroke_width=event_width,
+                     class_=col_class)
 
     def _add_split_line(self, dwg, cleavage_site_t, cleavage_site_b, pos_min,
                         pos_max, map_xy, norm_count, ref_len):
         (map_x1, map_y1, map_x2, map_y2) = map_xy
-        cmap = cm.get_cmap(self._event_colourmap)
 
         # Adding line (adding width 1 to ensure everything is visible)
         event_width = (self._event_max_size - self._event_min_size
@@ -705,21 +679,14 @@ class StrandLinkagePlotWriter(amw.AbstractMapWriter):
                 (cleavage_site_b + 0.5 - pos_min) / (pos_max - pos_min))
             event_b_y2 = map_y2 - self._dna_size / 2 - self._dna_rel_gap*self._im_h
 
-        rgba = cmap(norm_count)
-        col = "rgb(%i,%i,%i)" % (rgba[0] * 255, rgba[1] * 255, rgba[2] * 255)
-
-        dwg.add(
-            svg.shapes.Line((event_t_x1, event_t_y1), (event_t_x2, event_t_y2),
-                            stroke=col,
-                            stroke_width=event_width,
-                            style="stroke-linecap:square;stroke-opacity:%f" %
-                            self._event_opacity))
-        dwg.add(
-            svg.shapes.Line((event_b_x1, event_b_y1), (event_b_x2, event_b_y2),
-                            stroke=col,
-                            stroke_width=event_width,
-                            style="stroke-linecap:square;stroke-opacity:%f" %
-                            self._event_opacity))
+        col_class = "event e%i" % amw.get_colour_index(norm_count, self._n_colours)
+
+        dwg.add_line((event_t_x1, event_t_y1), (event_t_x2, event_t_y2),
+                     stroke_width=event_width,
+                     class_=col_class)
+        dwg.add_line((event_b_x1, event_b_y1), (event_b_x2, event_b_y2),
+                     stroke_width=event_width,
+                     class_=col_class)
 
     def _crop_events_to_range(self, t_x_in, t_y_in, b_x_in, b_y_in, map_xy):
         (map_x1, map_y1, map_x2, map_y2) = map_xy
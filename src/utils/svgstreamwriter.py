@@ -0,0 +1,54 @@
+from xml.sax.saxutils import escape
+from xml.sax.saxutils import quoteattr
+
+
+# Size of the output file buffer (in bytes)
+buffer_size = 1 << 20
+
+class SVGStreamWriter():
+    # Writes SVG elements straight to file as they're added, rather than building the whole document in memory first.
+    # Styles shared by many elements are written once as CSS classes in <defs>, so must all be provided up-front (as a
+    # dict of class names and CSS declarations).  Element attributes are given as keyword arguments, with underscores
+    # converted to hyphens (e.g. stroke_width becomes stroke-width) and "class_" becoming "class".  Elements aren't separated
+    # by line breaks, as these add a byte per element without changing the rendered image.
+    def __init__(self, path, size, styles={}, **attribs):
+        self._path = path
+        self._file = open(path, "w", encoding="utf-8", buffering=buffer_size)
+
+        (width, height) = size
+        self._file.write('<?xml version="1.0" encoding="utf-8" ?>\n')
+        self._file.write('<svg baseProfile="full" height=%s version="1.1" width=%s%s xmlns="http://www.w3.org/2000/svg">\n' % (quoteattr(str(height)), quoteattr(str(width)), _get_attribs(attribs)))
+
+        if len(styles) > 0:
+            self._file.write('<defs><style type="text/css"><![CDATA[\n')
+            for (name, style) in styles.items():
+                self._file.write(".%s{%s}\n" % (name, style))
+            self._file.write(']]></style></defs>\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_path(self):
+        return self._path
+
+    def add_line(self, start, end, **attribs):
+        self._file.write('<line x1="%s" y1="%s" x2="%s" y2="%s"%s />' % (start[0], start[1], end[0], end[1], _get_attribs(attribs)))
+
+    def add_rect(self, insert, size, **attribs):
+        self._file.write('<rect x="%s" y="%s" width="%s" height="%s"%s />' % (insert[0], insert[1], size[0], size[1], _get_attribs(attribs)))
+
+    def add_text(self, text, insert, **attribs):
+        self._file.write('<text x="%s" y="%s"%s>%s</text>' % (insert[0], insert[1], _get_attribs(attribs), escape(text)))
+
+    def close(self):
+        if self._file.closed:
+            return
+
+        self._file.write('\n</svg>\n')
+        self._file.close()
+
+def _get_attribs(attribs):
+    return "".join(" %s=%s" % (name.rstrip("_").replace("_", "-"), quoteattr(str(value))) for (name, value) in attribs.items())